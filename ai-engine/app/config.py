@@ -5,6 +5,7 @@ BI Management AI Engine - Configuration
 
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Any, Dict, List
 import os
 
 
@@ -21,10 +22,129 @@ class Settings(BaseSettings):
     PORT: int = 8000
     
     # Ollama Configuration
-    OLLAMA_HOST: str = "http://localhost:11434"
+    OLLAMA_HOST: str = "http://localhost:11434"  # عدة خوادم: مفصولة بفواصل
     OLLAMA_MODEL: str = "qwen3:8b"  # او llama3.2, deepseek-r1:8b
     OLLAMA_TIMEOUT: int = 120
     
+    # نموذج أصغر يُستخدم عند تجاوز زمن الاستجابة للحد (فارغ = مباشرة للبديل)
+    OLLAMA_DEGRADED_MODEL: str = ""
+    
+    # نموذج صغير (1-3B) للعمليات البسيطة في جدول التوجيه (فارغ = OLLAMA_MODEL)
+    OLLAMA_SMALL_MODEL: str = ""
+    
+    # سحب الخادم من التوزيع مؤقتاً بعد تكرار المهلات
+    OLLAMA_DRAIN_AFTER_TIMEOUTS: int = 3
+    OLLAMA_DRAIN_SECONDS: int = 60
+    
+    # بقاء النموذج في الذاكرة (keep_alive): "30m", "2h", أو -1 للبقاء دائماً
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_KEEP_ALIVE_MODELS: Dict[str, str] = {}  # لكل نموذج: {"qwen3:8b": "-1"}
+    
+    # تحميل النماذج عند التشغيل (الافتراضي: OLLAMA_MODEL فقط)
+    OLLAMA_WARMUP_ENABLED: bool = True
+    OLLAMA_WARMUP_MODELS: List[str] = []
+    
+    # اتصالات HTTP نحو Ollama
+    OLLAMA_MAX_CONNECTIONS: int = 10
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 5
+    OLLAMA_KEEPALIVE_EXPIRY: float = 300.0  # seconds
+    
+    # LLM Response Cache (اختياري)
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_MAX_ENTRIES: int = 1000
+    LLM_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    LLM_CACHE_TTL: int = 3600  # seconds
+    # لا نخزن الردود الأكثر إبداعية - المحادثة تعمل بـ 0.7 فلا تُخزن ردودها إلا بحد 0.7 أو أعلى
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.5
+    LLM_CACHE_PATH: str = ""  # مثال: data/llm_cache.json للحفظ بين التشغيلات
+    LLM_CACHE_SAVE_INTERVAL: int = 300  # ثانية - حفظ دوري على القرص إذا تغير الـ cache
+    
+    # دمج الطلبات المتطابقة المتزامنة
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
+    
+    # فحص الصحة + Circuit Breaker + سلّم التخفيض
+    LLM_HEALTH_INTERVAL: int = 15  # seconds
+    LLM_BREAKER_FAILURES: int = 5  # أخطاء متتالية قبل فتح الدائرة
+    LLM_BREAKER_RESET: int = 30  # seconds قبل الطلب التجريبي
+    LLM_LATENCY_SLO: float = 20.0  # seconds - الحد الأقصى لـ p95
+    LLM_LATENCY_WINDOW: int = 50
+    LLM_LATENCY_MIN_SAMPLES: int = 10
+    LLM_LADDER_COOLDOWN: int = 120  # seconds قبل محاولة الرجوع للأعلى
+    
+    # إعادة استخدام سياق Ollama بين رسائل المحادثة بدل إعادة إرسال السجل
+    LLM_CHAT_REUSE_CONTEXT: bool = True
+    LLM_CONTEXT_MAX_TOKENS: int = 8192  # سياق أطول = نرجع للسجل الكامل
+    
+    # جدولة الطلبات أمام Ollama (أولويات + توزيع عادل)
+    LLM_SCHEDULER_ENABLED: bool = True
+    LLM_MAX_CONCURRENCY: int = 2  # عدد الطلبات المتزامنة نحو Ollama (الحد الابتدائي)
+    
+    # حد تزامن تكيفي (AIMD) حسب زمن استجابة Ollama
+    LLM_ADAPTIVE_CONCURRENCY: bool = True
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 8
+    LLM_CONCURRENCY_TARGET_LATENCY: float = 0.0  # seconds - 0 = LLM_LATENCY_SLO
+    LLM_CONCURRENCY_BACKOFF: float = 0.7  # معامل التخفيض عند تجاوز الهدف
+    
+    # رفض فوري (503 + Retry-After) إذا لن ينتهي الطلب قبل المهلة
+    LLM_SHEDDING_ENABLED: bool = False
+    LLM_SHED_DEADLINE: float = 60.0  # seconds - أو هيدر x-request-deadline
+    LLM_SHED_DEADLINES: Dict[str, float] = {}  # لكل أولوية، مثلاً {"chat": 30}
+    LLM_SHED_MIN_SAMPLES: int = 5  # لا رفض قبل قياس زمن الخدمة
+    
+    # حد توكنات البيانات داخل prompt التحليل (تُقلص بعينة موزعة إذا تجاوزته)
+    ANALYSIS_TOKEN_BUDGET: int = 1500
+    ANALYSIS_TOKEN_BUDGETS: Dict[str, int] = {}  # لكل نوع تحليل، مثلاً {"department": 3000}
+    
+    # توجيه النماذج لكل عملية: {"TaskService.create_task": {"model": "small", "max_tokens": 512, "stop": []}}
+    LLM_ROUTES: Dict[str, Dict[str, Any]] = {}
+    LLM_ROUTE_REQUEST_OVERRIDES: bool = False  # هيدر x-llm-model / x-llm-max-tokens
+    # نماذج إضافية يُسمح بطلبها في الهيدر (نماذج جدول التوجيه مسموحة دائماً)
+    LLM_ROUTE_ALLOWED_MODELS: List[str] = []
+    
+    # ردود جاهزة للأسئلة البسيطة بدون استدعاء النموذج
+    CHAT_QUICK_REPLY_ENABLED: bool = True
+    CHAT_QUICK_REPLY_MIN_CONFIDENCE: float = 0.75  # حد أدنى فوق حد كل نية
+    
+    # Background Jobs
+    LLM_JOB_WORKERS: int = 2
+    LLM_JOB_QUEUE_SIZE: int = 100
+    LLM_JOB_MAX_STORED: int = 1000  # حد النتائج المحفوظة
+    LLM_JOB_RESULT_TTL: int = 3600  # ثانية
+    # المضيفات المسموح إرسال callback_url لها (فارغة = callbacks معطلة)
+    LLM_JOB_CALLBACK_HOSTS: List[str] = []
+    
+    # تحليلات لوحات المتابعة المحسوبة مسبقاً (department / attendance / insights)
+    PRECOMPUTE_ENABLED: bool = False
+    PRECOMPUTE_SECURITY_LEVELS: List[int] = [1, 2, 3, 4, 5]
+    PRECOMPUTE_OFF_PEAK_HOURS: List[int] = [0, 1, 2, 3, 4, 5]  # ساعات (بالتوقيت المحلي) لإعادة الحساب الدوري
+    PRECOMPUTE_REFRESH_AFTER: int = 21600  # ثانية - بعدها تُعاد في ساعات الهدوء وتُعلَّم stale
+    PRECOMPUTE_MAX_AGE: int = 86400  # ثانية - بعدها لا تُقدم النتيجة إطلاقاً
+    PRECOMPUTE_ADHOC_MAX_AGE: int = 900  # ثانية - لنتائج مدخلات لا تطابق مصدراً مسجلاً
+    PRECOMPUTE_ON_CHANGE: bool = True  # إعادة الحساب فور تغير بيانات المصدر
+    PRECOMPUTE_CHECK_INTERVAL: int = 300  # ثانية
+    PRECOMPUTE_MAX_ENTRIES: int = 2000
+    PRECOMPUTE_PATH: str = ""  # مثال: data/precomputed.json للحفظ بين التشغيلات
+    
+    # Embeddings (البحث الدلالي)
+    EMBEDDING_BATCH_SIZE: int = 64  # نصوص لكل دفعة ترميز
+    EMBEDDING_BATCHER_ENABLED: bool = True  # تجميع طلبات الترميز المتزامنة (حتى EMBEDDING_BATCH_SIZE نص)
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # انتظار طلبات أخرى قبل تشغيل الدفعة
+    EMBEDDING_CORPUS_CACHE: int = 4  # مجموعات مستندات تبقى مصفوفاتها في الذاكرة
+    EMBEDDING_CACHE_MAX_BYTES: int = 33554432  # حد cache الـ vectors في الذاكرة (LRU)
+    EMBEDDING_CACHE_DIR: str = ""  # مثال: data/embedding_cache - ملف memory-mapped مشترك بين العمليات
+    EMBEDDING_CACHE_DISK_SLOTS: int = 65536  # vectors في ملف القرص (~100MB لـ 384 بُعد)
+    EMBEDDING_CACHE_QUANTIZATION: str = "float32"  # float16 أو int8 = vectors أكثر بنفس الحد (طبقة الذاكرة)
+    EMBEDDING_INDEXES: List[str] = ["products", "tasks"]  # أسماء الفهارس المسموحة (حروف/أرقام/_/-)
+    EMBEDDING_INDEX_DIR: str = "data/indexes"  # فهارس ANN الدائمة (فارغ = في الذاكرة فقط)
+    EMBEDDING_INDEX_BACKEND: str = "auto"  # auto (hnsw إن وُجدت hnswlib وإلا ivf), hnsw, ivf, flat
+    EMBEDDING_INDEX_NPROBE: int = 8  # قوائم IVF التي يفحصها كل بحث
+    EMBEDDING_INDEX_MIN_TRAIN: int = 2048  # قبلها البحث كامل (دقيق)
+    EMBEDDING_INDEX_HNSW_M: int = 16
+    EMBEDDING_INDEX_EF_SEARCH: int = 64
+    EMBEDDING_INDEX_QUANTIZATION: str = "float32"  # float16 (نصف الذاكرة) أو int8 (الربع تقريباً)
+    EMBEDDING_INDEX_RESCORE: int = 4  # مع الضغط: إعادة حساب أعلى k*N بـ float32 من القرص (0 = بدون نسخة float32)
+    
     # Backend API
     BACKEND_URL: str = "http://localhost:3000/api"
     BACKEND_API_KEY: str = ""
@@ -44,6 +164,17 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/ai_engine.log"
     
+    # Tracing (OTLP JSON): ملف JSON lines و/أو OTLP/HTTP collector
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.1  # نسبة الطلبات المُعاينة بدون traceparent من الـ backend
+    TRACING_FILE: str = "logs/traces.jsonl"  # فارغ = بدون ملف
+    TRACING_FILE_MAX_BYTES: int = 10 * 1024 * 1024  # بعده يُدوّر الملف (traces.jsonl.1, ...)
+    TRACING_FILE_BACKUPS: int = 3  # عدد الملفات المدوّرة المحفوظة
+    TRACING_OTLP_ENDPOINT: str = ""  # مثال: http://localhost:4318/v1/traces
+    TRACING_SERVICE_NAME: str = "ai-engine"
+    TRACING_FLUSH_INTERVAL: float = 5.0  # seconds
+    TRACING_MAX_BUFFER: int = 10000  # spans تنتظر التصدير (الزائد يُهمل)
+    
     # Security Levels for Data Access
     # Level 1: موظف عادي - لا يرى بيانات حساسة
     # Level 2: موظف قديم - يرى بياناته فقط
@@ -62,6 +193,11 @@ class Settings(BaseSettings):
     # Prompts Directory
     PROMPTS_DIR: str = "app/prompts"
     
+    @property
+    def ollama_hosts(self) -> List[str]:
+        """قائمة خوادم Ollama من OLLAMA_HOST"""
+        return [h.strip() for h in self.OLLAMA_HOST.split(",") if h.strip()]
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
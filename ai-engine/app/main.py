@@ -5,7 +5,7 @@ BI Management AI Engine - Main Application
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import time
 from loguru import logger
@@ -16,8 +16,17 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import get_settings
-from app.routes import chat, tasks, analysis
+from app.routes import chat, tasks, analysis, jobs, precompute, search
+from app.models.admission import get_admission_controller
+from app.models.embeddings import get_embedding_service
 from app.models.llm import get_llm
+from app.services.job_service import get_job_service, close_job_service
+from app.services.precompute_service import get_precompute_service, close_precompute_service
+from app.utils.context import set_request_context
+from app.utils.disconnect import CancelOnDisconnectMiddleware
+from app.utils.load_shedding import LoadShedMiddleware
+from app.utils.metrics import get_metrics
+from app.utils.tracing import activate, get_exporter, start_trace
 
 settings = get_settings()
 
@@ -48,23 +57,39 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info("=" * 50)
     
-    # التحقق من Ollama
+    # التحقق من Ollama (get_llm يجري أول فحص ويشغل الفحص الدوري)
     llm = await get_llm()
-    if hasattr(llm, 'check_connection'):
-        connected = await llm.check_connection()
-        if connected:
+    if hasattr(llm, 'get_health'):
+        if llm.get_health()["ollama"] == "connected":
             logger.info("Ollama connected successfully")
             models = await llm.list_models()
             logger.info(f"Available models: {models}")
+            
+            # تحميل النماذج مسبقاً حتى لا يدفع أول طلب زمن التحميل
+            if settings.OLLAMA_WARMUP_ENABLED and hasattr(llm, 'warm_up'):
+                await llm.warm_up()
         else:
-            logger.warning("Ollama not available - using fallback")
+            logger.warning("Ollama not available - using fallback until it recovers")
     else:
         logger.info("Using fallback LLM")
     
+    # عمال المهام في الخلفية
+    await get_job_service()
+    
+    # إعادة حساب تحليلات لوحات المتابعة (عند تغير البيانات وفي ساعات الهدوء)
+    await get_precompute_service()
+    
+    # تصدير الـ traces دورياً
+    get_exporter().start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Engine...")
+    await close_precompute_service()
+    get_embedding_service().close()
+    await close_job_service()
+    await get_exporter().close()
     if hasattr(llm, 'close'):
         await llm.close()
 
@@ -78,6 +103,9 @@ app = FastAPI(
 )
 
 
+# رفض فوري عند امتلاء الطابور - داخل CORS و log_requests حتى يُسجل الـ 503
+app.add_middleware(LoadShedMiddleware, controller=get_admission_controller())
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -93,17 +121,46 @@ app.add_middleware(
 async def log_requests(request: Request, call_next):
     start_time = time.time()
     
-    response = await call_next(request)
+    # معلومات المستخدم للجدولة العادلة (يرسلها الـ backend)
+    set_request_context(
+        route=request.url.path,
+        user_id=request.headers.get("x-user-id"),
+        department=request.headers.get("x-department"),
+        # تجاوز جدول توجيه النماذج لهذا الطلب
+        llm_model=request.headers.get("x-llm-model"),
+        llm_max_tokens=request.headers.get("x-llm-max-tokens")
+    )
+    
+    # span الجذر - المعرف من traceparent أو x-trace-id إن أرسلهما الـ backend
+    root = start_trace(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        trace_id=request.headers.get("x-trace-id"),
+        **{"http.method": request.method, "http.route": request.url.path}
+    )
+    
+    # للمسارات المتدفقة ينتهي الجذر عند بدء الرد، و spans النموذج تكمل بعده
+    with activate(root):
+        response = await call_next(request)
+        root.set(**{"http.status_code": response.status_code})
+    
+    response.headers["x-trace-id"] = root.trace_id
+    response.headers["traceparent"] = root.traceparent
     
     process_time = time.time() - start_time
     logger.info(
         f"{request.method} {request.url.path} "
-        f"- {response.status_code} - {process_time:.3f}s"
+        f"- {response.status_code} - {process_time:.3f}s - trace {root.trace_id}"
     )
     
     return response
 
 
+# إلغاء الطلب (وتوليد Ollama) عند انقطاع العميل - آخر middleware يُضاف
+# هو الأبعد، فيلغي كل ما بداخله
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+
 # Error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -122,6 +179,9 @@ async def global_exception_handler(request: Request, exc: Exception):
 app.include_router(chat.router, prefix="/api/ai")
 app.include_router(tasks.router, prefix="/api/ai")
 app.include_router(analysis.router, prefix="/api/ai")
+app.include_router(jobs.router, prefix="/api/ai")
+app.include_router(precompute.router, prefix="/api/ai")
+app.include_router(search.router, prefix="/api/ai")
 
 
 # مسارات أساسية
@@ -138,20 +198,37 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """فحص صحة الخدمة"""
+    """فحص صحة الخدمة (من الحالة المخزنة - بدون اتصال بـ Ollama)"""
     llm = await get_llm()
     
-    ollama_status = "unknown"
-    if hasattr(llm, 'check_connection'):
-        ollama_status = "connected" if await llm.check_connection() else "disconnected"
+    if hasattr(llm, 'get_health'):
+        health = llm.get_health()
     else:
-        ollama_status = "fallback"
+        health = {"ollama": "fallback"}
     
-    return {
+    result = {
         "status": "healthy",
-        "ollama": ollama_status,
-        "model": settings.OLLAMA_MODEL
+        "model": settings.OLLAMA_MODEL,
+        **health
     }
+    
+    # حالة كل خادم Ollama (الجاري والزمن)
+    if hasattr(llm, 'hosts'):
+        result["hosts"] = llm.hosts.get_stats()
+    
+    return result
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """مقاييس بصيغة Prometheus"""
+    # عمق طابور المهام وعمر أقدم مهمة تُحسب عند القراءة
+    (await get_job_service()).get_stats()
+    
+    return PlainTextResponse(
+        get_metrics().render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 
 @app.get("/api/ai/models")
@@ -166,6 +243,23 @@ async def list_models():
     return {"models": [], "current": "fallback"}
 
 
+@app.get("/api/ai/llm/stats")
+async def llm_stats():
+    """إحصائيات طبقات الـ LLM (cache, ...)"""
+    llm = await get_llm()
+    
+    stats = llm.get_stats() if hasattr(llm, 'get_stats') else {}
+    stats["admission"] = get_admission_controller().get_stats()
+    stats["tracing"] = get_exporter().get_stats()
+    return stats
+
+
+@app.get("/api/ai/embeddings/stats")
+async def embedding_stats():
+    """إحصائيات الـ Embeddings (cache الـ vectors، المصفوفات، الفهارس)"""
+    return get_embedding_service().get_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,3 +1,8 @@
 """AI Models"""
 from .llm import get_llm, OllamaLLM, FallbackLLM
+from .llm_cache import CachedLLM, ResponseCache
+from .single_flight import SingleFlightLLM
+from .scheduler import ScheduledLLM, LLMScheduler
+from .routing import RoutedLLM
 from .embeddings import get_embedding_service, EmbeddingService
+from .vector_index import VectorIndex, SemanticIndex
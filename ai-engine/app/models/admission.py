@@ -0,0 +1,177 @@
+"""
+BI Management AI Engine - Admission Control
+رفض الطلب فوراً (503) إذا كان الطابور أطول مما يمكن إنهاؤه قبل المهلة
+"""
+
+from typing import Dict, Optional, Tuple
+import math
+
+from .scheduler import LLMScheduler, PRIORITY_CLASSES, get_scheduler
+from ..utils.metrics import get_metrics
+from ..config import get_settings
+
+settings = get_settings()
+
+# مسارات POST التي تصل للنموذج وأولويتها في المجدول
+ROUTE_PRIORITIES = {
+    "/api/ai/chat": "chat",
+    "/api/ai/tasks": "task",
+    "/api/ai/analysis": "analysis",
+}
+
+EXPECTED_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+_metrics = get_metrics()
+
+admission_total = _metrics.counter(
+    "ai_admission_total",
+    "Admission decisions for LLM routes (decision=admitted/shed)",
+    ("priority", "decision")
+)
+expected_seconds = _metrics.histogram(
+    "ai_admission_expected_seconds",
+    "Projected completion time (queue wait + service) at admission",
+    EXPECTED_BUCKETS,
+    ("priority",)
+)
+inflight_gauge = _metrics.gauge(
+    "ai_admission_inflight", "Admitted LLM route requests still in progress", ("priority",)
+)
+
+
+class AdmissionController:
+    """
+    يقدر زمن انتهاء الطلب الجديد من حد التزامن الحالي ومتوسط زمن الخدمة:
+
+        ينتظر (ahead - limit + 1) طلباً، وتنتهي limit طلبات كل زمن خدمة
+        expected = max(0, ahead - limit + 1) * service / limit + service
+
+    ahead = الطلبات قبله (الجارية + المنتظرة بأولوية أعلى أو مساوية)، من
+    المجدول أو من الطلبات المقبولة التي لم تصل للمجدول بعد (أيهما أكبر).
+    بدون عينات كافية أو بدون طابور لا يُرفض شيء.
+    """
+
+    def __init__(
+        self,
+        scheduler: LLMScheduler,
+        deadline: float = 60.0,
+        deadlines: Dict[str, float] = None,
+        min_samples: int = 5,
+        enabled: bool = True
+    ):
+        self.scheduler = scheduler
+        self.deadline = deadline
+        self.deadlines = deadlines or {}
+        self.min_samples = min_samples
+        self.enabled = enabled
+
+        self.inflight: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.admitted: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.shed: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+
+    @staticmethod
+    def priority_for(path: str) -> Optional[str]:
+        for prefix, priority in ROUTE_PRIORITIES.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                return priority
+        return None
+
+    def _ahead(self, priority: str) -> int:
+        rank = PRIORITY_CLASSES[priority]
+        inflight = sum(n for name, n in self.inflight.items() if PRIORITY_CLASSES[name] <= rank)
+        return max(inflight, self.scheduler.ahead_of(priority))
+
+    def _estimate(self, priority: str) -> Optional[Tuple[int, float]]:
+        """(عدد الطلبات التي سينتظرها، الزمن المتوقع للإنهاء) - أو None بدون عينات كافية"""
+        limiter = self.scheduler.limiter
+        service = limiter.service_seconds
+        if service is None or limiter.samples < self.min_samples:
+            return None
+
+        limit = self.scheduler.slots
+        waiting = max(0, self._ahead(priority) - limit + 1)
+        return waiting, waiting * service / limit + service
+
+    def expected(self, priority: str) -> Optional[float]:
+        """الزمن المتوقع لإنهاء طلب جديد (أو None بدون عينات كافية)"""
+        estimate = self._estimate(priority)
+        return estimate[1] if estimate else None
+
+    def admit(self, path: str, deadline: float = None) -> Optional[Dict]:
+        """
+        قرار القبول لطلب جديد
+
+        Returns:
+            None إذا لم يكن المسار من مسارات النموذج، وإلا
+            {"priority", "admitted", "expected_seconds", "deadline", "retry_after"}
+        """
+        priority = self.priority_for(path)
+        if priority is None:
+            return None
+
+        deadline = deadline or self.deadlines.get(priority, self.deadline)
+        estimate = self._estimate(priority) if self.enabled else None
+        decision = {
+            "priority": priority,
+            "admitted": True,
+            "expected_seconds": round(estimate[1], 3) if estimate else None,
+            "deadline": deadline,
+            "retry_after": 0,
+        }
+        if estimate:
+            expected_seconds.observe(estimate[1], priority=priority)
+
+        # الطلب الذي لا ينتظر أحداً يُقبل دائماً (حتى لو كانت الخدمة نفسها أطول من المهلة)
+        if estimate and estimate[0] > 0 and estimate[1] > deadline:
+            # بعد هذه المدة يكون الطابور قد نقص بما يكفي لإنهاء الطلب قبل المهلة
+            decision["admitted"] = False
+            decision["retry_after"] = max(1, math.ceil(estimate[1] - deadline))
+            self.shed[priority] += 1
+            admission_total.inc(priority=priority, decision="shed")
+            return decision
+
+        self.admitted[priority] += 1
+        self.inflight[priority] += 1
+        inflight_gauge.set(self.inflight[priority], priority=priority)
+        admission_total.inc(priority=priority, decision="admitted")
+        return decision
+
+    def release(self, priority: str):
+        """انتهاء طلب مقبول"""
+        self.inflight[priority] -= 1
+        inflight_gauge.set(self.inflight[priority], priority=priority)
+
+    def get_stats(self) -> Dict:
+        classes = {}
+        for name in PRIORITY_CLASSES:
+            expected = self.expected(name)
+            total = self.admitted[name] + self.shed[name]
+            classes[name] = {
+                "inflight": self.inflight[name],
+                "admitted": self.admitted[name],
+                "shed": self.shed[name],
+                "shed_rate": round(self.shed[name] / total, 4) if total else 0.0,
+                "expected_seconds": round(expected, 3) if expected is not None else None,
+                "deadline": self.deadlines.get(name, self.deadline),
+            }
+        return {
+            "enabled": self.enabled,
+            "limit": self.scheduler.slots,
+            "classes": classes
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            get_scheduler(),
+            deadline=settings.LLM_SHED_DEADLINE,
+            deadlines=settings.LLM_SHED_DEADLINES,
+            min_samples=settings.LLM_SHED_MIN_SAMPLES,
+            enabled=settings.LLM_SHEDDING_ENABLED
+        )
+    return _controller
@@ -0,0 +1,38 @@
+"""
+BI Management AI Engine - LLM Wrapper Base
+أساس الطبقات التي تغلف نموذج اللغة (Cache, Single-flight, ...)
+"""
+
+from typing import Any, Dict, List
+
+
+class LLMWrapper:
+    """
+    طبقة تغلف LLM آخر وتمرر له كل ما لا تعرّفه بنفسها
+
+    كل طبقة تعيد تعريف generate/chat حسب حاجتها، والباقي
+    (check_connection, list_models, close, ...) يُمرر للطبقة الداخلية.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        # يُستدعى فقط للخصائص غير المعرّفة في الطبقة نفسها
+        return getattr(self.inner, name)
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self.inner.generate(prompt, **kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self.inner.chat(messages, **kwargs)
+
+    def get_stats(self) -> Dict:
+        """إحصائيات الطبقات الداخلية"""
+        if hasattr(self.inner, "get_stats"):
+            return self.inner.get_stats()
+        return {}
+
+    async def close(self):
+        if hasattr(self.inner, "close"):
+            await self.inner.close()
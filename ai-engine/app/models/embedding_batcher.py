@@ -0,0 +1,176 @@
+"""
+BI Management AI Engine - Embedding Micro-Batching
+تجميع طلبات الترميز المتزامنة في دفعة واحدة داخل thread مخصص
+"""
+
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+import queue
+import threading
+import time
+import numpy as np
+from loguru import logger
+
+from ..utils.metrics import get_metrics
+
+_metrics = get_metrics()
+batch_size_histogram = _metrics.histogram(
+    "ai_embedding_batch_size", "Texts per embedding model call",
+    (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+batch_wait_seconds = _metrics.histogram(
+    "ai_embedding_batch_wait_seconds", "Time an encode request waited before its batch started",
+    (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+batch_seconds = _metrics.histogram(
+    "ai_embedding_batch_seconds", "Embedding model time per batch",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+
+class _Request:
+    __slots__ = ("texts", "future", "submitted")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    منفذ ترميز بدفعات ديناميكية
+
+    كل طلب يُضاف لطابور ويرجع Future. الـ thread المخصص يأخذ أول طلب ثم
+    ينتظر حتى max_wait ثانية (من وصول أول طلب) أو حتى max_items نص، ويرمّز
+    الكل باستدعاء واحد للنموذج ثم يوزع الصفوف على Futures أصحابها. النموذج
+    لا يُستدعى إلا من هذا الـ thread.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_items: int = 64,
+        max_wait: float = 0.005
+    ):
+        self.encode_fn = encode_fn
+        self.max_items = max_items
+        self.max_wait = max_wait
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        """إضافة نصوص للدفعة القادمة - النتيجة مصفوفة صف لكل نص"""
+        request = _Request(list(texts))
+        if not request.texts:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+
+        self._ensure_thread()
+        self._queue.put(request)
+        return request.future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """ترميز متزامن (من أي thread) عبر الدفعة المشتركة"""
+        return self.submit(texts).result()
+
+    def _run(self):
+        carry: Optional[_Request] = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            if first is None:
+                return
+
+            batch = [first]
+            count = len(first.texts)
+            deadline = first.submitted + self.max_wait
+            stop = False
+
+            # ما وصل أثناء الدفعة السابقة يُؤخذ فوراً، ثم الانتظار حتى المهلة
+            while count < self.max_items:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                if count + len(request.texts) > self.max_items:
+                    carry = request
+                    break
+                batch.append(request)
+                count += len(request.texts)
+
+            self._execute(batch)
+            if stop:
+                return
+
+    def _execute(self, batch: List[_Request]):
+        # الطلبات الملغاة (انقطع العميل) لا تُرمّز
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        texts: List[str] = []
+        for request in batch:
+            batch_wait_seconds.observe(started - request.submitted)
+            texts.extend(request.texts)
+
+        try:
+            embeddings = self.encode_fn(texts)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+            self.failed_batches += 1
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        batch_seconds.observe(time.perf_counter() - started)
+        batch_size_histogram.observe(len(texts))
+        self.requests += len(batch)
+        self.batches += 1
+        self.items += len(texts)
+        self.largest_batch = max(self.largest_batch, len(texts))
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(embeddings[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def close(self, timeout: float = 5.0):
+        """إيقاف الـ thread بعد إنهاء الطلبات المنتظرة"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def get_stats(self) -> Dict:
+        return {
+            "max_items": self.max_items,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "queued": self._queue.qsize(),
+            "requests": self.requests,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+        }
@@ -3,10 +3,27 @@ BI Management AI Engine - Embeddings
 للبحث الدلالي والـ Vector Search
 """
 
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import os
+import re
 import numpy as np
 from loguru import logger
 
+from .embedding_batcher import EmbeddingBatcher
+from .vector_cache import VectorCache
+from .vector_index import SemanticIndex, normalize_rows, top_k_indices
+from ..config import get_settings
+
+settings = get_settings()
+
+# نموذج متعدد اللغات يدعم العربية
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# اسم الفهرس يصبح اسم مجلد تحت EMBEDDING_INDEX_DIR
+INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
 # Lazy loading for sentence-transformers
 _model = None
 
@@ -17,8 +34,7 @@ def get_embedding_model():
     if _model is None:
         try:
             from sentence_transformers import SentenceTransformer
-            # نموذج متعدد اللغات يدعم العربية
-            _model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            _model = SentenceTransformer(MODEL_NAME)
             logger.info("Embedding model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
@@ -26,19 +42,144 @@ def get_embedding_model():
     return _model
 
 
+class CorpusMatrix:
+    """
+    vectors مطبّعة (float32) لمجموعة نصوص - صف لكل نص بنفس الترتيب
+
+    النصوص الفارغة لا تُرمّز: صفها صفر و valid=False فلا تظهر في النتائج.
+    """
+
+    __slots__ = ("texts", "matrix", "valid")
+
+    def __init__(self, texts: Tuple[str, ...], matrix: np.ndarray, valid: np.ndarray):
+        self.texts = texts
+        self.matrix = matrix
+        self.valid = valid
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes if self.matrix is not None else 0
+
+
 class EmbeddingService:
     """
     خدمة الـ Embeddings للبحث الدلالي
+
+    البحث يرمّز المستندات دفعة واحدة ويحتفظ بمصفوفة مطبّعة لآخر
+    EMBEDDING_CORPUS_CACHE مجموعات، فالاستعلام = ضرب مصفوفة في vector.
+    كل ترميز يمر عبر VectorCache فلا يُعاد ترميز نص سبق ترميزه، والمفقود
+    يُرمّز عبر EmbeddingBatcher الذي يجمع الطلبات المتزامنة في دفعة واحدة.
     """
     
-    def __init__(self):
+    def __init__(self, batch_size: int = None, corpus_cache: int = None, cache: VectorCache = None):
         self.model = None
-        self._vectors_cache = {}
+        if cache is None:
+            cache = VectorCache(
+                max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+                model=MODEL_NAME,
+                directory=settings.EMBEDDING_CACHE_DIR,
+                disk_slots=settings.EMBEDDING_CACHE_DISK_SLOTS,
+                quantization=settings.EMBEDDING_CACHE_QUANTIZATION
+            )
+        self.cache = cache
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.corpus_cache = settings.EMBEDDING_CORPUS_CACHE if corpus_cache is None else corpus_cache
+        self._corpora: "OrderedDict[int, CorpusMatrix]" = OrderedDict()
+        self._indexes: Dict[str, SemanticIndex] = {}
+        self.batcher: Optional[EmbeddingBatcher] = None
+        if settings.EMBEDDING_BATCHER_ENABLED:
+            self.batcher = EmbeddingBatcher(
+                self._run_model,
+                max_items=self.batch_size,
+                max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000
+            )
     
     def _ensure_model(self):
         """التأكد من تحميل النموذج"""
         if self.model is None:
             self.model = get_embedding_model()
+        if self.model is not None and self.cache.dim is None:
+            get_dimension = getattr(self.model, "get_sentence_embedding_dimension", None)
+            if get_dimension is not None:
+                self.cache.set_dimension(get_dimension())
+    
+    def _run_model(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def _lookup(self, texts: Sequence[str]) -> Tuple[List[bytes], List[Optional[np.ndarray]], Dict[bytes, str]]:
+        """(المفاتيح، الموجود في الـ cache، النصوص المفقودة بدون تكرار)"""
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None:
+                missing.setdefault(key, text)
+        return keys, cached, missing
+    
+    def _merge(
+        self,
+        keys: List[bytes],
+        cached: List[Optional[np.ndarray]],
+        missing: Dict[bytes, str],
+        embeddings: Optional[np.ndarray]
+    ) -> np.ndarray:
+        fresh: Dict[bytes, np.ndarray] = {}
+        if missing:
+            self.cache.put_many(list(missing), embeddings)
+            fresh = dict(zip(missing, embeddings))
+        
+        if not keys:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        return np.stack([
+            vector if vector is not None else fresh[key]
+            for key, vector in zip(keys, cached)
+        ])
+    
+    def _encode_cached(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """
+        مصفوفة float32 (غير مطبّعة) صف لكل نص - المفقود من الـ cache
+        يُرمّز مرة واحدة (بدون تكرار) ضمن دفعة مشتركة
+        """
+        self._ensure_model()
+        if self.model is None:
+            return None
+        
+        keys, cached, missing = self._lookup(texts)
+        embeddings = None
+        if missing:
+            try:
+                if self.batcher is not None:
+                    embeddings = self.batcher.encode(list(missing.values()))
+                else:
+                    embeddings = self._run_model(list(missing.values()))
+            except Exception as e:
+                logger.error(f"Encoding error: {e}")
+                return None
+        return self._merge(keys, cached, missing, embeddings)
+    
+    async def _encode_cached_async(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """نفس _encode_cached بدون حجز الـ event loop أثناء تحميل النموذج أو الترميز"""
+        if self.model is None:
+            await asyncio.to_thread(self._ensure_model)
+        else:
+            self._ensure_model()
+        if self.model is None:
+            return None
+        
+        keys, cached, missing = self._lookup(texts)
+        embeddings = None
+        if missing:
+            try:
+                if self.batcher is not None:
+                    embeddings = await asyncio.wrap_future(self.batcher.submit(list(missing.values())))
+                else:
+                    embeddings = await asyncio.to_thread(self._run_model, list(missing.values()))
+            except Exception as e:
+                logger.error(f"Encoding error: {e}")
+                return None
+        return self._merge(keys, cached, missing, embeddings)
     
     def encode(self, text: str) -> Optional[List[float]]:
         """
@@ -50,45 +191,17 @@ class EmbeddingService:
         Returns:
             Vector representation
         """
-        self._ensure_model()
-        
-        if self.model is None:
-            return None
-        
-        try:
-            # Check cache
-            cache_key = hash(text)
-            if cache_key in self._vectors_cache:
-                return self._vectors_cache[cache_key]
-            
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            vector = embedding.tolist()
-            
-            # Cache (limited size)
-            if len(self._vectors_cache) < 1000:
-                self._vectors_cache[cache_key] = vector
-            
-            return vector
-            
-        except Exception as e:
-            logger.error(f"Encoding error: {e}")
-            return None
+        vectors = self._encode_cached([text])
+        return vectors[0].tolist() if vectors is not None else None
     
     def encode_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
         """
         تحويل مجموعة نصوص إلى vectors
         """
-        self._ensure_model()
-        
-        if self.model is None:
-            return [None] * len(texts)
-        
-        try:
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
-            return [emb.tolist() for emb in embeddings]
-        except Exception as e:
-            logger.error(f"Batch encoding error: {e}")
+        vectors = self._encode_cached(texts)
+        if vectors is None:
             return [None] * len(texts)
+        return [vector.tolist() for vector in vectors]
     
     def similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """
@@ -102,6 +215,75 @@ class EmbeddingService:
             logger.error(f"Similarity error: {e}")
             return 0.0
     
+    def _query_vector(self, query: str) -> Optional[np.ndarray]:
+        vectors = self._encode_cached([query])
+        if vectors is None:
+            return None
+        return normalize_rows(vectors[0])
+    
+    def encode_normalized(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        ترميز دفعات (EMBEDDING_BATCH_SIZE) إلى مصفوفة float32 مطبّعة - صف لكل نص
+        """
+        vectors = self._encode_cached(list(texts))
+        return normalize_rows(vectors) if vectors is not None else None
+    
+    async def encode_async(self, text: str) -> Optional[List[float]]:
+        """encode للمسارات غير المتزامنة - ينتظر الدفعة بدون حجز الـ event loop"""
+        vectors = await self._encode_cached_async([text])
+        return vectors[0].tolist() if vectors is not None else None
+    
+    async def encode_normalized_async(self, texts: List[str]) -> Optional[np.ndarray]:
+        """encode_normalized للمسارات غير المتزامنة"""
+        vectors = await self._encode_cached_async(list(texts))
+        return normalize_rows(vectors) if vectors is not None else None
+    
+    def corpus_matrix(self, texts: Sequence[str]) -> Optional[CorpusMatrix]:
+        """
+        مصفوفة vectors مطبّعة للنصوص (من الذاكرة إن سبق ترميز نفس المجموعة)
+        """
+        texts = tuple(texts)
+        key = hash(texts)
+        cached = self._corpora.get(key)
+        if cached is not None and cached.texts == texts:
+            self._corpora.move_to_end(key)
+            return cached
+        
+        self._ensure_model()
+        if self.model is None:
+            return None
+        
+        valid = np.fromiter((bool(t) for t in texts), dtype=bool, count=len(texts))
+        positions = np.flatnonzero(valid)
+        matrix = None
+        if len(positions):
+            embeddings = self.encode_normalized([texts[i] for i in positions])
+            if embeddings is None:
+                return None
+            matrix = np.zeros((len(texts), embeddings.shape[1]), dtype=np.float32)
+            matrix[positions] = embeddings
+        
+        corpus = CorpusMatrix(texts, matrix, valid)
+        if self.corpus_cache > 0:
+            self._corpora[key] = corpus
+            while len(self._corpora) > self.corpus_cache:
+                self._corpora.popitem(last=False)
+        return corpus
+    
+    def _scores(self, query: str, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """cosine similarity بين الاستعلام وكل النصوص (ضرب مصفوفة واحد)"""
+        query_vec = self._query_vector(query)
+        if query_vec is None:
+            return None
+        corpus = self.corpus_matrix(texts)
+        if corpus is None:
+            return None
+        if corpus.matrix is None:
+            return np.full(len(corpus.texts), -np.inf, dtype=np.float32)
+        scores = corpus.matrix @ query_vec
+        scores[~corpus.valid] = -np.inf
+        return scores
+    
     def find_similar(
         self, 
         query: str, 
@@ -123,33 +305,17 @@ class EmbeddingService:
         Returns:
             المستندات المشابهة مع درجة التشابه
         """
-        query_vec = self.encode(query)
-        if query_vec is None:
+        # المستندات بدون نص لا تدخل البحث
+        texts = [doc.get(text_field, "") for doc in documents]
+        
+        scores = self._scores(query, texts)
+        if scores is None:
             return []
         
-        results = []
-        
-        for doc in documents:
-            text = doc.get(text_field, "")
-            if not text:
-                continue
-            
-            doc_vec = self.encode(text)
-            if doc_vec is None:
-                continue
-            
-            score = self.similarity(query_vec, doc_vec)
-            
-            if score >= threshold:
-                results.append({
-                    **doc,
-                    "_similarity_score": score
-                })
-        
-        # ترتيب حسب التشابه
-        results.sort(key=lambda x: x["_similarity_score"], reverse=True)
-        
-        return results[:top_k]
+        return [
+            {**documents[i], "_similarity_score": float(scores[i])}
+            for i in top_k_indices(scores, top_k, threshold)
+        ]
     
     def semantic_search(
         self,
@@ -163,20 +329,66 @@ class EmbeddingService:
         Returns:
             [(index, text, score), ...]
         """
-        query_vec = self.encode(query)
-        if query_vec is None:
+        scores = self._scores(query, corpus)
+        if scores is None:
             return []
         
-        results = []
-        
-        for i, text in enumerate(corpus):
-            doc_vec = self.encode(text)
-            if doc_vec:
-                score = self.similarity(query_vec, doc_vec)
-                results.append((i, text, score))
+        return [(int(i), corpus[i], float(scores[i])) for i in top_k_indices(scores, top_k, -1.0)]
+    
+    # ========== الفهارس الدائمة ==========
+    
+    def get_index(self, name: str) -> SemanticIndex:
+        """
+        فهرس ANN بالاسم (products، tasks، ...) - يُحمّل من EMBEDDING_INDEX_DIR/name إن وُجد
         
-        results.sort(key=lambda x: x[2], reverse=True)
-        return results[:top_k]
+        Raises:
+            KeyError: الاسم غير مسجل في EMBEDDING_INDEXES أو غير صالح
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            if name not in settings.EMBEDDING_INDEXES or not INDEX_NAME_PATTERN.match(name):
+                raise KeyError(f"Unknown index: {name}")
+            path = os.path.join(settings.EMBEDDING_INDEX_DIR, name) if settings.EMBEDDING_INDEX_DIR else ""
+            index = SemanticIndex(
+                name, self, path=path,
+                backend=settings.EMBEDDING_INDEX_BACKEND,
+                nprobe=settings.EMBEDDING_INDEX_NPROBE,
+                min_train=settings.EMBEDDING_INDEX_MIN_TRAIN,
+                hnsw_m=settings.EMBEDDING_INDEX_HNSW_M,
+                ef_search=settings.EMBEDDING_INDEX_EF_SEARCH,
+                quantization=settings.EMBEDDING_INDEX_QUANTIZATION,
+                rescore=settings.EMBEDDING_INDEX_RESCORE
+            )
+            self._indexes[name] = index
+        return index
+    
+    def save_indexes(self):
+        """حفظ الفهارس التي تغيرت وطبقة القرص من الـ cache"""
+        self.cache.flush()
+        for index in self._indexes.values():
+            if index.dirty:
+                try:
+                    index.save()
+                except OSError as e:
+                    logger.error(f"Could not save index {index.name}: {e}")
+    
+    def close(self):
+        """حفظ الفهارس وإيقاف thread الترميز"""
+        self.save_indexes()
+        self.cache.close()
+        if self.batcher is not None:
+            self.batcher.close()
+    
+    def get_stats(self) -> dict:
+        return {
+            "model_loaded": self.model is not None,
+            "cache": self.cache.get_stats(),
+            "batcher": self.batcher.get_stats() if self.batcher is not None else None,
+            "corpora": len(self._corpora),
+            "corpus_rows": sum(len(c.texts) for c in self._corpora.values()),
+            "corpus_bytes": sum(c.nbytes for c in self._corpora.values()),
+            "indexes": {name: index.get_stats() for name, index in self._indexes.items()},
+        }
 
 
 # Singleton
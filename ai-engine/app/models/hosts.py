@@ -0,0 +1,151 @@
+"""
+BI Management AI Engine - Ollama Hosts
+توزيع الطلبات على عدة خوادم Ollama (least outstanding requests)
+"""
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional
+import time
+import httpx
+from loguru import logger
+
+from ..utils.helpers import percentile
+
+
+class OllamaHost:
+    """حالة خادم Ollama واحد"""
+
+    def __init__(self, url: str, latency_samples: int = 200):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.consecutive_timeouts = 0
+        self.draining_until = 0.0
+        self.last_checked: Optional[float] = None
+        self.latencies: Deque[float] = deque(maxlen=latency_samples)
+
+    @property
+    def draining(self) -> bool:
+        return self.draining_until > time.time()
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.draining
+
+    def get_stats(self) -> Dict:
+        latencies = list(self.latencies)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        }
+
+
+class HostPool:
+    """
+    مجموعة خوادم Ollama
+
+    - يُختار الخادم المتاح صاحب أقل طلبات جارية
+    - المحادثة تلتصق بنفس الخادم ليبقى سياقها دافئاً
+    - الخادم الذي تتكرر مهلاته يُسحب من التوزيع مؤقتاً (drain)
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        drain_after_timeouts: int = 3,
+        drain_seconds: int = 60,
+        max_sticky: int = 10000
+    ):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.drain_after_timeouts = drain_after_timeouts
+        self.drain_seconds = drain_seconds
+        self.max_sticky = max_sticky
+        self._sticky: "OrderedDict[str, OllamaHost]" = OrderedDict()
+
+    @property
+    def primary(self) -> OllamaHost:
+        """أول خادم متاح (للعمليات التي لا تحتاج توزيعاً)"""
+        for host in self.hosts:
+            if host.available:
+                return host
+        return self.hosts[0]
+
+    def pick(self, conversation_id: str = None) -> OllamaHost:
+        """اختيار خادم للطلب"""
+        if conversation_id:
+            host = self._sticky.get(conversation_id)
+            if host is not None and host.available:
+                self._sticky.move_to_end(conversation_id)
+                return host
+
+        candidates = [h for h in self.hosts if h.available] or self.hosts
+        host = min(candidates, key=lambda h: h.in_flight)
+
+        if conversation_id:
+            self._sticky[conversation_id] = host
+            self._sticky.move_to_end(conversation_id)
+            while len(self._sticky) > self.max_sticky:
+                self._sticky.popitem(last=False)
+
+        return host
+
+    @asynccontextmanager
+    async def use(self, conversation_id: str = None):
+        """حجز خادم لطلب واحد مع تسجيل زمنه وأخطائه"""
+        host = self.pick(conversation_id)
+        host.in_flight += 1
+        host.requests += 1
+        started = time.monotonic()
+
+        try:
+            yield host
+        except httpx.TimeoutException:
+            self._record_timeout(host)
+            raise
+        except Exception:
+            host.errors += 1
+            raise
+        else:
+            host.consecutive_timeouts = 0
+            host.latencies.append(time.monotonic() - started)
+        finally:
+            host.in_flight -= 1
+
+    def _record_timeout(self, host: OllamaHost):
+        host.timeouts += 1
+        host.consecutive_timeouts += 1
+
+        if host.consecutive_timeouts >= self.drain_after_timeouts and not host.draining:
+            host.draining_until = time.time() + self.drain_seconds
+            logger.warning(f"Draining Ollama host {host.url} for {self.drain_seconds}s")
+
+    async def check_all(self, client: httpx.AsyncClient) -> bool:
+        """فحص كل الخوادم - يرجع True إذا كان أحدها سليماً"""
+        for host in self.hosts:
+            try:
+                response = await client.get(f"{host.url}/api/tags", timeout=5)
+                healthy = response.status_code == 200
+            except Exception as e:
+                logger.error(f"Ollama connection error ({host.url}): {e}")
+                healthy = False
+
+            if healthy and not host.healthy:
+                logger.info(f"Ollama host recovered: {host.url}")
+            host.healthy = healthy
+            host.last_checked = time.time()
+
+        return any(host.healthy for host in self.hosts)
+
+    def get_stats(self) -> List[Dict]:
+        return [host.get_stats() for host in self.hosts]
@@ -0,0 +1,149 @@
+"""
+BI Management AI Engine - Inference Metrics
+مقاييس الاستدلال من حقول التوقيت التي يرجعها Ollama
+"""
+
+from typing import Dict, Optional, Tuple
+
+from ..utils.context import get_context_value
+from ..utils.metrics import get_metrics
+from ..utils.tracing import Span, annotate
+
+NS = 1_000_000_000  # Ollama يرجع الأزمنة بالنانوثانية
+
+LABELS = ("route", "model", "service")
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 100, 200, 500, 1000, 2500)
+
+_metrics = get_metrics()
+
+requests_total = _metrics.counter(
+    "ai_llm_requests_total", "LLM calls to Ollama by outcome", LABELS + ("status",)
+)
+prompt_tokens = _metrics.histogram(
+    "ai_llm_prompt_tokens", "Prompt tokens evaluated per call (prompt_eval_count)", TOKEN_BUCKETS, LABELS
+)
+eval_tokens = _metrics.histogram(
+    "ai_llm_eval_tokens", "Generated tokens per call (eval_count)", TOKEN_BUCKETS, LABELS
+)
+prompt_eval_seconds = _metrics.histogram(
+    "ai_llm_prompt_eval_seconds", "Prompt evaluation time (prompt_eval_duration)", SECONDS_BUCKETS, LABELS
+)
+eval_seconds = _metrics.histogram(
+    "ai_llm_eval_seconds", "Generation time (eval_duration)", SECONDS_BUCKETS, LABELS
+)
+load_seconds = _metrics.histogram(
+    "ai_llm_load_seconds", "Model load time (load_duration)", SECONDS_BUCKETS, LABELS
+)
+total_seconds = _metrics.histogram(
+    "ai_llm_total_seconds", "Total Ollama time (total_duration)", SECONDS_BUCKETS, LABELS
+)
+eval_rate = _metrics.histogram(
+    "ai_llm_eval_tokens_per_second", "Generation speed (eval_count / eval_duration)", RATE_BUCKETS, LABELS
+)
+prompt_rate = _metrics.histogram(
+    "ai_llm_prompt_tokens_per_second", "Prompt evaluation speed", RATE_BUCKETS, LABELS
+)
+cancelled_tokens = _metrics.counter(
+    "ai_llm_cancelled_tokens_total",
+    "Tokens of calls cancelled because the client disconnected "
+    "(kind=wasted: generated before the cancel, kind=saved: expected but never generated)",
+    LABELS + ("kind",)
+)
+
+# متوسط متحرك لعدد التوكنات وسرعة التوليد لكل (نموذج، خدمة) لتقدير أثر الإلغاء
+EWMA_ALPHA = 0.2
+_typical: Dict[Tuple, Dict[str, float]] = {}
+
+
+def _update_typical(model: str, service: Optional[str], count: int, rate: float):
+    entry = _typical.setdefault((model, service), {"eval_count": float(count), "rate": rate})
+    entry["eval_count"] += EWMA_ALPHA * (count - entry["eval_count"])
+    if rate > 0:
+        entry["rate"] = entry["rate"] + EWMA_ALPHA * (rate - entry["rate"]) if entry["rate"] else rate
+
+
+def _labels(model: str, service: str = None) -> Dict:
+    return {
+        "route": get_context_value("route"),
+        "model": model,
+        "service": service,
+    }
+
+
+def record_inference(data: Dict, model: str, service: str = None, span: Span = None):
+    """
+    تسجيل حقول التوقيت من رد Ollama (أو آخر جزء في التدفق)
+
+    span: الـ span الذي تُضاف له الأعداد والأزمنة (الافتراضي الحالي)
+    """
+    labels = _labels(model, service)
+    requests_total.inc(status="ok", **labels)
+
+    # عند إعادة استخدام الـ prompt cache قد لا يرجع Ollama حقول الـ prompt
+    prompt_count = data.get("prompt_eval_count", 0)
+    prompt_duration = data.get("prompt_eval_duration", 0) / NS
+    count = data.get("eval_count", 0)
+    duration = data.get("eval_duration", 0) / NS
+
+    prompt_tokens.observe(prompt_count, **labels)
+    eval_tokens.observe(count, **labels)
+
+    if "prompt_eval_duration" in data:
+        prompt_eval_seconds.observe(prompt_duration, **labels)
+        if prompt_duration > 0:
+            prompt_rate.observe(prompt_count / prompt_duration, **labels)
+    if "eval_duration" in data:
+        eval_seconds.observe(duration, **labels)
+        if duration > 0:
+            eval_rate.observe(count / duration, **labels)
+    if count:
+        _update_typical(model, service, count, count / duration if duration > 0 else 0.0)
+    if "load_duration" in data:
+        load_seconds.observe(data["load_duration"] / NS, **labels)
+    if "total_duration" in data:
+        total_seconds.observe(data["total_duration"] / NS, **labels)
+
+    annotate(span, **{
+        "llm.model": model,
+        "llm.status": "ok",
+        "llm.prompt_tokens": prompt_count,
+        "llm.eval_tokens": count,
+        "llm.load_seconds": data.get("load_duration", 0) / NS,
+        "llm.prompt_eval_seconds": prompt_duration,
+        "llm.eval_seconds": duration,
+    })
+
+
+def record_failure(model: str, status: str, service: str = None, span: Span = None):
+    """تسجيل طلب فاشل (error أو timeout)"""
+    requests_total.inc(status=status, **_labels(model, service))
+    annotate(span, **{"llm.model": model, "llm.status": status})
+
+
+def record_cancelled(
+    model: str,
+    service: str = None,
+    generated: int = None,
+    elapsed: float = 0.0
+):
+    """
+    تسجيل طلب أُلغي لأن العميل قطع الاتصال
+
+    generated: عدد الأجزاء المستلمة في التدفق. للطلبات غير المتدفقة لا نعرف
+    العدد فنقدره من الزمن المنقضي ومتوسط سرعة التوليد.
+    """
+    labels = _labels(model, service)
+    requests_total.inc(status="cancelled", **labels)
+
+    typical = _typical.get((model, service))
+    if typical is None and generated is None:
+        return
+
+    expected = typical["eval_count"] if typical else 0.0
+    if generated is None:
+        generated = round(min(expected, elapsed * typical["rate"]), 1)
+
+    cancelled_tokens.inc(generated, kind="wasted", **labels)
+    cancelled_tokens.inc(round(max(0.0, expected - generated), 1), kind="saved", **labels)
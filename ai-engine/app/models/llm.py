@@ -4,14 +4,27 @@ BI Management AI Engine - LLM Integration
 """
 
 import httpx
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Dict, List, Optional, AsyncGenerator, Union
+import asyncio
+import hashlib
+import inspect
 import json
+import time
 from loguru import logger
 
+from .hosts import HostPool
+from .inference_metrics import record_inference, record_failure, record_cancelled
+from ..utils.tracing import start_span, traced
 from ..config import get_settings
 
 settings = get_settings()
 
+# رسالة المهلة - لا يجوز تخزينها في الـ cache
+TIMEOUT_MESSAGE = "عذراً، استغرق الطلب وقتاً طويلاً. يرجى المحاولة مرة أخرى."
+
+# آخر جزء في التدفق عند فشله - يُعرض للمستخدم ولا يُحفظ في المحادثة
+STREAM_ERROR_MESSAGE = "حدث خطأ أثناء المعالجة"
+
 
 class OllamaLLM:
     """
@@ -20,27 +33,89 @@ class OllamaLLM:
     """
     
     def __init__(self):
-        self.base_url = settings.OLLAMA_HOST
+        self.hosts = HostPool(
+            settings.ollama_hosts,
+            drain_after_timeouts=settings.OLLAMA_DRAIN_AFTER_TIMEOUTS,
+            drain_seconds=settings.OLLAMA_DRAIN_SECONDS
+        )
         self.model = settings.OLLAMA_MODEL
         self.timeout = settings.OLLAMA_TIMEOUT
         self._client = None
     
+    @property
+    def base_url(self) -> str:
+        """عنوان أول خادم متاح"""
+        return self.hosts.primary.url
+    
     @property
     def client(self) -> httpx.AsyncClient:
         if self._client is None:
             self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(self.timeout)
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY
+                )
             )
         return self._client
     
-    async def check_connection(self) -> bool:
-        """التحقق من اتصال Ollama"""
+    def keep_alive(self, model: str = None) -> Union[str, int]:
+        """
+        مدة بقاء النموذج في الذاكرة بعد آخر طلب (keep_alive في Ollama)
+        
+        قيمة رقمية = ثوانٍ، وقيمة سالبة = يبقى محملاً دائماً
+        """
+        model = model or self.model
+        value = settings.OLLAMA_KEEP_ALIVE_MODELS.get(model, settings.OLLAMA_KEEP_ALIVE)
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"Ollama connection error: {e}")
-            return False
+            return int(value)
+        except ValueError:
+            return value
+    
+    async def warm_up(self, models: List[str] = None) -> Dict[str, Optional[float]]:
+        """
+        تحميل النماذج في الذاكرة مسبقاً حتى لا يدفع أول طلب زمن التحميل
+        
+        Returns:
+            {host_url: {model: زمن التحميل بالثواني أو None عند الفشل}}
+        """
+        models = models or settings.OLLAMA_WARMUP_MODELS or [
+            m for m in (self.model, settings.OLLAMA_DEGRADED_MODEL) if m
+        ]
+        results = {}
+        
+        for host in self.hosts.hosts:
+            results[host.url] = {}
+            for model in models:
+                started = time.monotonic()
+                try:
+                    response = await self.client.post(
+                        f"{host.url}/api/generate",
+                        json={
+                            "model": model,
+                            "prompt": "مرحبا",
+                            "stream": False,
+                            "keep_alive": self.keep_alive(model),
+                            "options": {"num_predict": 1}
+                        }
+                    )
+                    if response.status_code == 200:
+                        elapsed = round(time.monotonic() - started, 2)
+                        results[host.url][model] = elapsed
+                        logger.info(f"Model warmed up: {model} on {host.url} ({elapsed}s)")
+                    else:
+                        results[host.url][model] = None
+                        logger.warning(f"Warm-up failed for {model} on {host.url}: {response.status_code}")
+                except Exception as e:
+                    results[host.url][model] = None
+                    logger.warning(f"Warm-up failed for {model} on {host.url}: {e}")
+        
+        return results
+    
+    async def check_connection(self) -> bool:
+        """التحقق من اتصال Ollama (كل الخوادم - يكفي أن يكون أحدها متاحاً)"""
+        return await self.hosts.check_all(self.client)
     
     async def list_models(self) -> List[str]:
         """قائمة النماذج المتوفرة"""
@@ -54,13 +129,17 @@ class OllamaLLM:
             logger.error(f"Error listing models: {e}")
             return []
     
+    @traced("llm.generate")
     async def generate(
         self, 
         prompt: str, 
         system_prompt: str = None,
         temperature: float = 0.7,
         max_tokens: int = 2048,
-        stop: List[str] = None
+        stop: List[str] = None,
+        model: str = None,
+        context: List[int] = None,
+        **hints
     ) -> str:
         """
         توليد نص من النموذج
@@ -71,15 +150,21 @@ class OllamaLLM:
             temperature: درجة الإبداعية (0-1)
             max_tokens: الحد الأقصى للكلمات
             stop: كلمات التوقف
+            model: النموذج (الافتراضي OLLAMA_MODEL)
+            context: سياق Ollama من رد سابق (لتجنب إعادة تقييم المحادثة)
+            hints: معلومات إضافية للطبقات المغلفة (لا تُرسل لـ Ollama)
+                on_context(context, model): يُستدعى بالسياق الجديد بعد الرد
         
         Returns:
             النص المولد
         """
+        started = time.monotonic()
         try:
             payload = {
-                "model": self.model,
+                "model": model or self.model,
                 "prompt": prompt,
                 "stream": False,
+                "keep_alive": self.keep_alive(model),
                 "options": {
                     "temperature": temperature,
                     "num_predict": max_tokens,
@@ -92,44 +177,61 @@ class OllamaLLM:
             if stop:
                 payload["options"]["stop"] = stop
             
-            response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json=payload
-            )
+            if context:
+                payload["context"] = context
+            
+            async with self.hosts.use(hints.get("conversation_id")) as host:
+                response = await self.client.post(
+                    f"{host.url}/api/generate",
+                    json=payload
+                )
             
             if response.status_code == 200:
                 data = response.json()
+                record_inference(data, payload["model"], hints.get("service"))
+                if hints.get("on_context") and data.get("context"):
+                    hints["on_context"](data["context"], payload["model"])
                 return data.get("response", "")
             else:
                 logger.error(f"Ollama error: {response.status_code} - {response.text}")
+                record_failure(payload["model"], "error", hints.get("service"))
                 return ""
                 
+        except asyncio.CancelledError:
+            # العميل قطع الاتصال - إلغاء الطلب يغلق الاتصال بـ Ollama فيتوقف التوليد
+            record_cancelled(model or self.model, hints.get("service"), elapsed=time.monotonic() - started)
+            raise
         except httpx.TimeoutException:
             logger.error("Ollama timeout")
-            return "عذراً، استغرق الطلب وقتاً طويلاً. يرجى المحاولة مرة أخرى."
+            record_failure(model or self.model, "timeout", hints.get("service"))
+            return TIMEOUT_MESSAGE
         except Exception as e:
             logger.error(f"Generate error: {e}")
+            record_failure(model or self.model, "error", hints.get("service"))
             return ""
     
     async def generate_stream(
         self, 
         prompt: str, 
-        system_prompt: str = None
+        system_prompt: str = None,
+        model: str = None
     ) -> AsyncGenerator[str, None]:
         """توليد نص بشكل متدفق (streaming)"""
+        streamed = 0
         try:
             payload = {
-                "model": self.model,
+                "model": model or self.model,
                 "prompt": prompt,
                 "stream": True,
+                "keep_alive": self.keep_alive(model),
             }
             
             if system_prompt:
                 payload["system"] = system_prompt
             
-            async with self.client.stream(
+            async with self.hosts.use() as host, self.client.stream(
                 "POST",
-                f"{self.base_url}/api/generate",
+                f"{host.url}/api/generate",
                 json=payload
             ) as response:
                 async for line in response.aiter_lines():
@@ -137,18 +239,29 @@ class OllamaLLM:
                         try:
                             data = json.loads(line)
                             if "response" in data:
+                                streamed += 1
                                 yield data["response"]
+                            if data.get("done"):
+                                record_inference(data, payload["model"])
                         except json.JSONDecodeError:
                             continue
                             
+        except (asyncio.CancelledError, GeneratorExit):
+            record_cancelled(model or self.model, generated=streamed)
+            raise
         except Exception as e:
             logger.error(f"Stream error: {e}")
-            yield "حدث خطأ أثناء المعالجة"
+            yield STREAM_ERROR_MESSAGE
     
+    @traced("llm.chat")
     async def chat(
         self, 
         messages: List[Dict], 
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        model: str = None,
+        max_tokens: int = None,
+        stop: List[str] = None,
+        **hints
     ) -> str:
         """
         محادثة مع النموذج
@@ -156,36 +269,156 @@ class OllamaLLM:
         Args:
             messages: [{"role": "user/assistant/system", "content": "..."}]
             temperature: درجة الإبداعية
+            model: النموذج (الافتراضي OLLAMA_MODEL)
+            max_tokens: الحد الأقصى للتوكنات (الافتراضي بلا حد)
+            stop: كلمات التوقف
+            hints: معلومات إضافية للطبقات المغلفة (لا تُرسل لـ Ollama)
         
         Returns:
             رد النموذج
         """
+        started = time.monotonic()
         try:
             payload = {
-                "model": self.model,
+                "model": model or self.model,
                 "messages": messages,
                 "stream": False,
+                "keep_alive": self.keep_alive(model),
                 "options": {
                     "temperature": temperature,
                 }
             }
             
-            response = await self.client.post(
-                f"{self.base_url}/api/chat",
-                json=payload
-            )
+            if max_tokens:
+                payload["options"]["num_predict"] = max_tokens
+            
+            if stop:
+                payload["options"]["stop"] = stop
+            
+            async with self.hosts.use(hints.get("conversation_id")) as host:
+                response = await self.client.post(
+                    f"{host.url}/api/chat",
+                    json=payload
+                )
             
             if response.status_code == 200:
                 data = response.json()
+                record_inference(data, payload["model"], hints.get("service"))
                 return data.get("message", {}).get("content", "")
             else:
                 logger.error(f"Chat error: {response.status_code}")
+                record_failure(payload["model"], "error", hints.get("service"))
                 return ""
                 
+        except asyncio.CancelledError:
+            record_cancelled(model or self.model, hints.get("service"), elapsed=time.monotonic() - started)
+            raise
+        except httpx.TimeoutException:
+            logger.error("Ollama chat timeout")
+            record_failure(model or self.model, "timeout", hints.get("service"))
+            return ""
         except Exception as e:
             logger.error(f"Chat error: {e}")
+            record_failure(model or self.model, "error", hints.get("service"))
             return ""
     
+    async def chat_stream(
+        self, 
+        messages: List[Dict], 
+        temperature: float = 0.7,
+        model: str = None,
+        max_tokens: int = None,
+        stop: List[str] = None,
+        **hints
+    ) -> AsyncGenerator[str, None]:
+        """
+        محادثة بشكل متدفق - ترجع أجزاء الرد فور وصولها
+        
+        إغلاق الـ generator (أو إلغاؤه) يغلق اتصال التدفق فيتوقف Ollama عن التوليد
+        """
+        streamed = 0
+        # التدفق يعمل في سياق من يقرأه - span منفصل بدل span حالي
+        stream_span = start_span("llm.chat_stream")
+        try:
+            payload = {
+                "model": model or self.model,
+                "messages": messages,
+                "stream": True,
+                "keep_alive": self.keep_alive(model),
+                "options": {
+                    "temperature": temperature,
+                }
+            }
+            
+            if max_tokens:
+                payload["options"]["num_predict"] = max_tokens
+            
+            if stop:
+                payload["options"]["stop"] = stop
+            
+            async with self.hosts.use(hints.get("conversation_id")) as host, self.client.stream(
+                "POST",
+                f"{host.url}/api/chat",
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Chat stream error: {response.status_code}")
+                    record_failure(payload["model"], "error", hints.get("service"), stream_span)
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        streamed += 1
+                        yield content
+                    if data.get("done"):
+                        record_inference(data, payload["model"], hints.get("service"), stream_span)
+                        break
+                        
+        except (asyncio.CancelledError, GeneratorExit):
+            record_cancelled(model or self.model, hints.get("service"), generated=streamed)
+            stream_span.set(cancelled=True)
+            raise
+        except httpx.TimeoutException:
+            logger.error("Ollama chat stream timeout")
+            record_failure(model or self.model, "timeout", hints.get("service"), stream_span)
+            yield TIMEOUT_MESSAGE
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            record_failure(model or self.model, "error", hints.get("service"), stream_span)
+            yield STREAM_ERROR_MESSAGE
+        finally:
+            stream_span.set(**{"llm.chunks": streamed})
+            stream_span.end()
+    
+    def fingerprint(self, method: str, *args, **kwargs) -> str:
+        """
+        بصمة ثابتة للطلب (لـ cache و single-flight)
+        
+        تشمل النموذج وكل معاملات الطلب بعد تطبيق القيم الافتراضية،
+        ولا تشمل الـ hints لأنها لا تغير الرد.
+        """
+        bound = inspect.signature(getattr(self, method)).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        params.pop("hints", None)
+        params["model"] = params.get("model") or self.model
+        params["method"] = method
+        
+        blob = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    
+    def get_stats(self) -> Dict:
+        """إحصائيات خوادم Ollama"""
+        return {"hosts": self.hosts.get_stats()}
+    
     async def close(self):
         """إغلاق الاتصال"""
         if self._client:
@@ -246,20 +479,49 @@ class FallbackLLM:
             last_message = messages[-1].get("content", "")
             return await self.generate(last_message)
         return "كيف يمكنني مساعدتك؟"
+    
+    async def chat_stream(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        yield await self.chat(messages)
 
 
 # Singleton
 _llm_instance = None
 
 async def get_llm() -> OllamaLLM:
-    """الحصول على instance من LLM"""
+    """
+    الحصول على instance من LLM
+    
+    الترتيب من الخارج للداخل:
+    Routing → Cache → Resilience → Single-flight → Scheduler → Ollama
+    """
     global _llm_instance
     if _llm_instance is None:
-        _llm_instance = OllamaLLM()
+        llm = OllamaLLM()
+        
+        if settings.LLM_SCHEDULER_ENABLED:
+            from .scheduler import ScheduledLLM
+            llm = ScheduledLLM(llm)
+        
+        if settings.LLM_SINGLE_FLIGHT_ENABLED:
+            from .single_flight import SingleFlightLLM
+            llm = SingleFlightLLM(llm)
+        
+        # لا نستبدل Ollama بالبديل نهائياً - الفحص الدوري يقرر كل مرة
+        from .resilience import ResilientLLM
+        llm = ResilientLLM(llm)
+        await llm.probe()
+        if llm.health["ollama"] != "connected":
+            logger.warning("Ollama not available, using fallback until it recovers")
+        llm.start_health_checks()
+        
+        if settings.LLM_CACHE_ENABLED:
+            from .llm_cache import CachedLLM
+            llm = CachedLLM(llm)
+        
+        # التوجيه أولاً حتى تشمل بصمة الـ cache النموذج والحدود المختارة
+        from .routing import RoutedLLM
+        llm = RoutedLLM(llm)
         
-        # التحقق من الاتصال
-        if not await _llm_instance.check_connection():
-            logger.warning("Ollama not available, using fallback")
-            _llm_instance = FallbackLLM()
+        _llm_instance = llm
     
     return _llm_instance
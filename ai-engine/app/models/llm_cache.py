@@ -0,0 +1,260 @@
+"""
+BI Management AI Engine - LLM Response Cache
+تخزين مؤقت لردود النموذج (LRU + TTL) مع حفظ اختياري على القرص
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+from loguru import logger
+
+from .base import LLMWrapper
+from .llm import TIMEOUT_MESSAGE
+from ..utils.tracing import annotate
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class ResponseCache:
+    """
+    Cache بسيط بترتيب LRU مع مدة صلاحية وحد أقصى للحجم بالبايت
+
+    القيمة نص أو أي قيمة JSON. مع path يُحفظ على القرص كل save_interval
+    ثانية إذا تغير (save_due) وعند الإغلاق.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: int = 3600,
+        path: str = "",
+        save_interval: float = 300.0
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self.save_interval = save_interval
+
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._dirty = False
+        self._saved_at = time.time()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def _entry_size(key: str, value: Any) -> int:
+        if not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        return len(key) + len(value.encode("utf-8"))
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, expires_at: float = None):
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        self._dirty = True
+
+        # الإخراج حسب LRU
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def load(self):
+        """تحميل الـ cache من القرص"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not load LLM cache from {self.path}: {e}")
+            return
+
+        now = time.time()
+        for key, value, expires_at in data.get("entries", []):
+            if expires_at > now:
+                self.set(key, value, expires_at)
+
+        self._dirty = False
+        logger.info(f"LLM cache loaded: {len(self._entries)} entries")
+
+    def save_due(self) -> bool:
+        """هل مر save_interval منذ آخر حفظ مع تغييرات لم تُحفظ"""
+        return bool(self.path) and self._dirty and time.time() - self._saved_at >= self.save_interval
+
+    def snapshot(self) -> List:
+        """الإدخالات الصالحة للحفظ - تُؤخذ قبل الكتابة حتى لا تتغير أثناءها"""
+        now = time.time()
+        self._dirty = False
+        self._saved_at = now
+        return [
+            [key, value, expires_at]
+            for key, (value, expires_at, _) in self._entries.items()
+            if expires_at > now
+        ]
+
+    def save(self, entries: List = None):
+        """حفظ الـ cache على القرص (كتابة ذرية)"""
+        if not self.path:
+            return
+        if entries is None:
+            entries = self.snapshot()
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save LLM cache to {self.path}: {e}")
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "persistent": bool(self.path)
+        }
+
+
+class CachedLLM(LLMWrapper):
+    """
+    طبقة cache حول OllamaLLM
+
+    المفتاح بصمة كاملة للطلب (النموذج، النص/الرسائل، تعليمات النظام،
+    درجة الحرارة وباقي الخيارات). الطلبات ذات درجة الحرارة الأعلى من
+    LLM_CACHE_MAX_TEMPERATURE لا تُخزن لأن تنوع الرد مقصود فيها (المحادثة
+    تعمل بـ 0.7، فلا تُخزن ردودها إلا إذا رُفع الحد إليها).
+
+    مع on_context يُخزن سياق Ollama مع الرد ويُعاد للمستدعي عند الإصابة.
+    """
+
+    def __init__(self, inner, cache: ResponseCache = None):
+        super().__init__(inner)
+        self.cache = cache or ResponseCache(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            ttl=settings.LLM_CACHE_TTL,
+            path=settings.LLM_CACHE_PATH,
+            save_interval=settings.LLM_CACHE_SAVE_INTERVAL
+        )
+        self.max_temperature = settings.LLM_CACHE_MAX_TEMPERATURE
+        self.bypassed = 0
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._cached("generate", prompt, kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self._cached("chat", messages, kwargs)
+
+    async def _cached(self, method: str, first_arg, kwargs: Dict) -> str:
+        call = getattr(self.inner, method)
+
+        if kwargs.get("temperature", 0.7) > self.max_temperature:
+            self.bypassed += 1
+            return await call(first_arg, **kwargs)
+
+        key = self.inner.fingerprint(method, first_arg, **kwargs)
+        if key is None:
+            # الطبقة الداخلية لن تستخدم Ollama (مثلاً البديل)
+            self.bypassed += 1
+            return await call(first_arg, **kwargs)
+
+        on_context = kwargs.get("on_context")
+        cached = self.cache.get(key)
+        if isinstance(cached, dict):
+            if on_context:
+                on_context(cached["context"], cached["model"])
+            annotate(**{"llm.cache": "hit"})
+            return cached["response"]
+        if cached is not None and not on_context:
+            annotate(**{"llm.cache": "hit"})
+            return cached
+        # رد مخزن بدون سياق لا يكفي من يحتاج السياق - نحسبه ونخزنه مع السياق
+
+        captured = {}
+        if on_context:
+            def capture(context, model):
+                captured.update(context=context, model=model)
+                on_context(context, model)
+            kwargs = {**kwargs, "on_context": capture}
+
+        response = await call(first_arg, **kwargs)
+
+        # لا نخزن الأخطاء (رد فارغ أو رسالة المهلة)
+        if response and response != TIMEOUT_MESSAGE:
+            self.cache.set(key, {"response": response, **captured} if captured else response)
+            if self.cache.save_due():
+                await asyncio.to_thread(self.cache.save, self.cache.snapshot())
+
+        return response
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        stats["cache"] = {**self.cache.get_stats(), "bypassed": self.bypassed}
+        return stats
+
+    async def close(self):
+        self.cache.save()
+        await super().close()
@@ -0,0 +1,111 @@
+"""
+BI Management AI Engine - Vector Quantization
+تخزين مضغوط للـ vectors: float16 (نصف الحجم) أو int8 بمقياس لكل vector
+(ربع الحجم تقريباً) مع ضرب نقطي تقريبي مباشرة على المصفوفة المضغوطة
+"""
+
+from typing import Optional, Tuple
+import numpy as np
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+def check_quantization(mode: str) -> str:
+    if mode not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {mode} (expected one of {', '.join(QUANTIZATIONS)})")
+    return mode
+
+
+def quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (codes, scales) - scales لكل صف في int8 فقط: x ≈ codes * scale
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=-1) / 127.0
+        safe = np.where(scales > 0, scales, 1.0)
+        codes = np.rint(vectors / safe[..., None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(_DTYPES[mode], copy=False), None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray], mode: str) -> np.ndarray:
+    vectors = codes.astype(np.float32)
+    if mode == "int8":
+        vectors *= scales[..., None]
+    return vectors
+
+
+class QuantizedMatrix:
+    """
+    صفوف vectors بسعة قابلة للزيادة في نمط تخزين واحد
+
+    matrix[rows] يرجع float32 (فك الضغط)، و scores يحسب الضرب النقطي
+    بأجزاء حتى لا تُنسخ المصفوفة كاملة إلى float32.
+    """
+
+    def __init__(self, dim: int, mode: str = "float32", capacity: int = 0):
+        self.dim = dim
+        self.mode = check_quantization(mode)
+        self.codes = np.zeros((capacity, dim), dtype=_DTYPES[mode])
+        self.scales = np.zeros(capacity, dtype=np.float32) if mode == "int8" else None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def grow(self, capacity: int, size: int):
+        """توسيع السعة مع الإبقاء على أول size صف"""
+        codes = np.zeros((capacity, self.dim), dtype=self.codes.dtype)
+        codes[:size] = self.codes[:size]
+        self.codes = codes
+        if self.scales is not None:
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:size] = self.scales[:size]
+            self.scales = scales
+
+    def set(self, rows: np.ndarray, vectors: np.ndarray):
+        codes, scales = quantize(vectors, self.mode)
+        self.codes[rows] = codes
+        if self.scales is not None:
+            self.scales[rows] = scales
+
+    def clear(self, rows: np.ndarray):
+        self.codes[rows] = 0
+        if self.scales is not None:
+            self.scales[rows] = 0.0
+
+    def __getitem__(self, rows) -> np.ndarray:
+        if self.mode == "float32":
+            return self.codes[rows]
+        return dequantize(self.codes[rows], self.scales[rows] if self.scales is not None else None, self.mode)
+
+    def scores(self, query: np.ndarray, rows: np.ndarray = None, size: int = None,
+               block: int = 8192) -> np.ndarray:
+        """
+        ضرب نقطي تقريبي مع query (float32) - لصفوف محددة أو لأول size صف
+        """
+        if self.mode == "float32":
+            return self.codes[rows] @ query if rows is not None else self.codes[:size] @ query
+
+        count = len(rows) if rows is not None else size
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block):
+            part = rows[start:start + block] if rows is not None else slice(start, min(start + block, count))
+            scores[start:start + block] = self.codes[part].astype(np.float32) @ query
+            if self.scales is not None:
+                scores[start:start + block] *= self.scales[part]
+        return scores
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, mode: str) -> "QuantizedMatrix":
+        matrix = cls(vectors.shape[1], mode)
+        matrix.codes, scales = quantize(vectors, mode)
+        if matrix.scales is not None:
+            matrix.scales = scales
+        return matrix
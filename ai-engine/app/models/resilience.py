@@ -0,0 +1,309 @@
+"""
+BI Management AI Engine - LLM Resilience
+فحص صحة دوري + Circuit Breaker + سلّم تخفيض حسب زمن الاستجابة
+"""
+
+from collections import deque
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import AsyncGenerator, Deque, Dict, Iterator, List, Optional
+import asyncio
+import time
+from loguru import logger
+
+from .base import LLMWrapper
+from .llm import FallbackLLM, TIMEOUT_MESSAGE
+from ..utils.helpers import now, percentile
+from ..config import get_settings
+
+settings = get_settings()
+
+# مستويات السلّم التي خدمت استدعاءات النموذج داخل track_served_levels
+_served_levels: ContextVar[Optional[List[str]]] = ContextVar("llm_served_levels", default=None)
+
+
+@contextmanager
+def track_served_levels() -> Iterator[List[str]]:
+    """
+    يجمع مصدر كل رد داخل الكتلة: primary / degraded / fallback، أو failed
+    (رد فارغ أو انتهاء المهلة). الرد من cache الردود لا يُسجل.
+    """
+    levels: List[str] = []
+    token = _served_levels.set(levels)
+    try:
+        yield levels
+    finally:
+        _served_levels.reset(token)
+
+
+def _record_served(level: str):
+    levels = _served_levels.get()
+    if levels is not None:
+        levels.append(level)
+
+
+class CircuitBreaker:
+    """
+    closed: الطلبات تمر
+    open: الطلبات تذهب للبديل حتى انتهاء reset_timeout
+    half_open: طلب تجريبي واحد - نجاحه يغلق الدائرة وفشله يعيد فتحها،
+    وإلغاؤه (انقطاع العميل) يحرر الخانة لطلب تجريبي آخر
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: int = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+
+        return False
+
+    def release(self):
+        """الطلب التجريبي أُلغي قبل أن يُعرف نجاحه"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Circuit breaker closed - Ollama recovered")
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        if self.state != "open":
+            self.trips += 1
+            logger.warning("Circuit breaker opened - using fallback")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips
+        }
+
+
+class ResilientLLM(LLMWrapper):
+    """
+    يختار لكل طلب أحد مستويات السلّم:
+
+    - primary: النموذج الأساسي
+    - degraded: نموذج أصغر (OLLAMA_DEGRADED_MODEL) عند تجاوز p95 للحد
+    - fallback: FallbackLLM عند تجاوز الحد مرة أخرى، أو الدائرة مفتوحة،
+      أو Ollama غير متاح حسب آخر فحص
+
+    فحص الصحة يعمل في الخلفية ويُخزن آخر نتيجة لتقرأها /health فوراً.
+    """
+
+    def __init__(self, inner, fallback: FallbackLLM = None):
+        super().__init__(inner)
+        self.fallback = fallback or FallbackLLM()
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            reset_timeout=settings.LLM_BREAKER_RESET
+        )
+
+        self.levels = ["primary"]
+        if settings.OLLAMA_DEGRADED_MODEL:
+            self.levels.append("degraded")
+        self.levels.append("fallback")
+        self.level = 0
+        self.level_changed_at = time.monotonic()
+
+        self._latencies: Deque[float] = deque(maxlen=settings.LLM_LATENCY_WINDOW)
+        self.fallback_calls = 0
+
+        self.health = {"ollama": "unknown", "checked_at": None}
+        self._health_task: Optional[asyncio.Task] = None
+
+    # ========== التوجيه ==========
+
+    @property
+    def level_name(self) -> str:
+        return self.levels[self.level]
+
+    def _use_fallback(self) -> bool:
+        if self.level_name == "fallback" or self.health["ollama"] == "disconnected":
+            return True
+        return not self.breaker.allow()
+
+    def _route(self, kwargs: Dict) -> Dict:
+        # سياق Ollama خاص بالنموذج الذي أنتجه - لا نغير النموذج معه
+        if self.level_name == "degraded" and not kwargs.get("context"):
+            return {**kwargs, "model": settings.OLLAMA_DEGRADED_MODEL}
+        return kwargs
+
+    def fingerprint(self, method: str, *args, **kwargs) -> Optional[str]:
+        """
+        بصمة تشمل النموذج الفعلي - أو None إذا سيُستخدم البديل
+        (حتى لا يُخزن رد البديل أو النموذج الأصغر مكان رد النموذج الأساسي)
+        """
+        if self.level_name == "fallback" or self.health["ollama"] == "disconnected":
+            return None
+        if self.breaker.state != "closed":
+            return None
+        return self.inner.fingerprint(method, *args, **self._route(kwargs))
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._call("generate", prompt, kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self._call("chat", messages, kwargs)
+
+    async def _call(self, method: str, first_arg, kwargs: Dict) -> str:
+        if self._use_fallback():
+            self.fallback_calls += 1
+            _record_served("fallback")
+            return await getattr(self.fallback, method)(first_arg, **kwargs)
+
+        routed = self._route(kwargs)
+        level = "primary" if routed is kwargs else "degraded"
+        started = time.monotonic()
+        try:
+            response = await getattr(self.inner, method)(first_arg, **routed)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        if not response or response == TIMEOUT_MESSAGE:
+            self.breaker.record_failure()
+            _record_served("failed")
+        else:
+            self.breaker.record_success()
+            self._record_latency(time.monotonic() - started)
+            _record_served(level)
+
+        return response
+
+    async def chat_stream(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        if self._use_fallback():
+            self.fallback_calls += 1
+            async for token in self.fallback.chat_stream(messages, **kwargs):
+                yield token
+            return
+
+        received = False
+        try:
+            async with aclosing(self.inner.chat_stream(messages, **self._route(kwargs))) as stream:
+                async for token in stream:
+                    received = received or (bool(token) and token != TIMEOUT_MESSAGE)
+                    yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            # العميل توقف عن القراءة - لا نجاح ولا فشل
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        if received:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    # ========== سلّم التخفيض ==========
+
+    def _record_latency(self, seconds: float):
+        self._latencies.append(seconds)
+        if len(self._latencies) < settings.LLM_LATENCY_MIN_SAMPLES:
+            return
+
+        p95 = percentile(list(self._latencies), 95)
+        if p95 > settings.LLM_LATENCY_SLO and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1, f"p95 {p95:.1f}s > SLO {settings.LLM_LATENCY_SLO}s")
+
+    def _maybe_step_up(self):
+        """الرجوع درجة للأعلى بعد فترة هدوء إذا تحسن الزمن"""
+        if self.level == 0:
+            return
+        if time.monotonic() - self.level_changed_at < settings.LLM_LADDER_COOLDOWN:
+            return
+
+        latencies = list(self._latencies)
+        # عند البديل لا توجد قياسات - نجرب الدرجة الأعلى بعد فترة الهدوء
+        if not latencies or percentile(latencies, 95) < settings.LLM_LATENCY_SLO / 2:
+            self._set_level(self.level - 1, "latency recovered")
+
+    def _set_level(self, level: int, reason: str):
+        logger.warning(f"LLM ladder: {self.level_name} -> {self.levels[level]} ({reason})")
+        self.level = level
+        self.level_changed_at = time.monotonic()
+        self._latencies.clear()
+
+    # ========== فحص الصحة ==========
+
+    async def probe(self) -> Dict:
+        """فحص واحد لـ Ollama وتحديث الحالة المخزنة"""
+        connected = await self.inner.check_connection()
+        self.health = {
+            "ollama": "connected" if connected else "disconnected",
+            "checked_at": now()
+        }
+        if not connected:
+            self.breaker.open()
+        self._maybe_step_up()
+        return self.health
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe error: {e}")
+            await asyncio.sleep(settings.LLM_HEALTH_INTERVAL)
+
+    def start_health_checks(self):
+        """تشغيل فحص الصحة في الخلفية"""
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def get_health(self) -> Dict:
+        """آخر حالة مخزنة (بدون أي اتصال بـ Ollama)"""
+        return {
+            **self.health,
+            "breaker": self.breaker.state,
+            "level": self.level_name
+        }
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        latencies = list(self._latencies)
+        stats["resilience"] = {
+            **self.get_health(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "latency_p95_s": round(percentile(latencies, 95), 2),
+            "latency_slo_s": settings.LLM_LATENCY_SLO,
+            "fallback_calls": self.fallback_calls
+        }
+        return stats
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        await super().close()
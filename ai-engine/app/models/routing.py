@@ -0,0 +1,211 @@
+"""
+BI Management AI Engine - Model Routing
+جدول توجيه: لكل عملية (خدمة.عملية) نموذج وحد توكنات وكلمات توقف
+"""
+
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncGenerator, Deque, Dict, List, Optional, Tuple
+import time
+from loguru import logger
+
+from .base import LLMWrapper
+from .inference_metrics import SECONDS_BUCKETS
+from ..utils.context import get_context_value
+from ..utils.helpers import percentile
+from ..utils.metrics import get_metrics
+from ..utils.tracing import span
+from ..config import get_settings
+
+settings = get_settings()
+
+# "small" = OLLAMA_SMALL_MODEL، فارغ = OLLAMA_MODEL، max_tokens=None = بلا حد
+# العمليات القصيرة والمقيدة الشكل (JSON، نقاط، تحية) لا تحتاج النموذج الكبير
+DEFAULT_ROUTES: Dict[str, Dict] = {
+    "ChatService.chat": {"model": "", "max_tokens": None, "stop": []},
+    "ChatService.small_talk": {"model": "small", "max_tokens": 128, "stop": []},
+    "TaskService.create_task": {"model": "small", "max_tokens": 512, "stop": []},
+    "AnalysisService.analyze": {"model": "", "max_tokens": 1024, "stop": []},
+    "AnalysisService.insights": {"model": "small", "max_tokens": 384, "stop": []},
+}
+
+ROUTED_KEYS = ("model", "max_tokens", "stop")
+
+operation_seconds = get_metrics().histogram(
+    "ai_llm_operation_seconds",
+    "End-to-end LLM latency per routed operation and model (queue + inference)",
+    SECONDS_BUCKETS,
+    ("operation", "model")
+)
+operation_total = get_metrics().counter(
+    "ai_llm_operation_total",
+    "LLM calls per routed operation, model and override source",
+    ("operation", "model", "source")
+)
+
+
+def build_routes(overrides: Dict[str, Dict] = None) -> Dict[str, Dict]:
+    """الجدول الافتراضي مدموجاً مع LLM_ROUTES (لكل عملية تُدمج الحقول)"""
+    routes = {op: dict(route) for op, route in DEFAULT_ROUTES.items()}
+    for operation, route in (overrides or {}).items():
+        routes[operation] = {**routes.get(operation, {}), **route}
+    return routes
+
+
+def request_overrides() -> Dict:
+    """
+    تجاوز التوجيه للطلب الحالي (هيدر x-llm-model / x-llm-max-tokens) كما أُرسل
+
+    RoutedLLM يقبل منه فقط النماذج المسموحة ويقص max_tokens لحد العملية.
+    """
+    if not settings.LLM_ROUTE_REQUEST_OVERRIDES:
+        return {}
+
+    overrides = {}
+    model = get_context_value("llm_model")
+    if model:
+        overrides["model"] = model
+    try:
+        max_tokens = int(get_context_value("llm_max_tokens") or 0)
+    except ValueError:
+        max_tokens = 0
+    if max_tokens > 0:
+        overrides["max_tokens"] = max_tokens
+    return overrides
+
+
+class RoutedLLM(LLMWrapper):
+    """
+    يكمل model/max_tokens/stop من جدول التوجيه حسب hint الـ operation
+
+    الأولوية: قيمة صريحة من المستدعي ← تجاوز الطلب الحالي ← LLM_ROUTES ← DEFAULT_ROUTES.
+    الطلبات بدون operation تمر كما هي. تجاوز الطلب مقيد بنماذج الجدول و
+    LLM_ROUTE_ALLOWED_MODELS (حتى لا تتضخم تسميات المقاييس ونوافذ الزمن).
+    """
+
+    def __init__(self, inner, routes: Dict[str, Dict] = None):
+        super().__init__(inner)
+        self.routes = build_routes(settings.LLM_ROUTES if routes is None else routes)
+        self.default_model = settings.OLLAMA_MODEL
+        self.allowed_models = {
+            self.default_model,
+            *settings.LLM_ROUTE_ALLOWED_MODELS,
+            *(self._model_name(route.get("model")) for route in self.routes.values()),
+        } - {None}
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def _model_name(self, model: Optional[str]) -> Optional[str]:
+        if model == "small":
+            return settings.OLLAMA_SMALL_MODEL or None
+        return model or None
+
+    def resolve(self, operation: str) -> Dict:
+        """خيارات العملية من الجدول (بدون تجاوزات الطلب)"""
+        route = self.routes.get(operation, {})
+        return {
+            "model": self._model_name(route.get("model")),
+            "max_tokens": route.get("max_tokens"),
+            "stop": list(route.get("stop") or []),
+        }
+
+    def _request_overrides(self, route: Dict) -> Dict:
+        """تجاوز الطلب بعد التقييد: نموذج مسموح فقط، و max_tokens لا يتجاوز حد العملية"""
+        overrides = request_overrides()
+
+        if "model" in overrides:
+            model = self._model_name(overrides["model"])
+            if model in self.allowed_models:
+                overrides["model"] = model
+            else:
+                logger.warning(f"Ignoring x-llm-model override: {overrides['model']!r} is not an allowed model")
+                del overrides["model"]
+
+        if "max_tokens" in overrides and route.get("max_tokens"):
+            overrides["max_tokens"] = min(overrides["max_tokens"], route["max_tokens"])
+        return overrides
+
+    def _apply(self, kwargs: Dict) -> Tuple[Dict, str]:
+        """kwargs بعد التوجيه + مصدر القرار (route / request / caller)"""
+        operation = kwargs.get("operation")
+        if not operation:
+            return kwargs, "caller"
+
+        route = self.resolve(operation)
+        overrides = self._request_overrides(route)
+        source = "request" if overrides else "route"
+
+        routed = dict(kwargs)
+        for key in ROUTED_KEYS:
+            if routed.get(key) is not None:
+                # المستدعي حدد القيمة (مثلاً نموذج سياق المحادثة)
+                if key == "model":
+                    source = "caller"
+                continue
+            value = overrides.get(key, route.get(key))
+            if value:
+                routed[key] = value
+        return routed, source
+
+    def _span_attributes(self, routed: Dict, source: str) -> Dict:
+        return {
+            "llm.operation": routed.get("operation"),
+            "llm.model": routed.get("model") or self.default_model,
+            "llm.max_tokens": routed.get("max_tokens"),
+            "llm.route_source": source,
+        }
+
+    def _observe(self, operation: Optional[str], model: Optional[str], source: str, seconds: float):
+        if not operation:
+            return
+        model = model or self.default_model
+        operation_total.inc(operation=operation, model=model, source=source)
+        operation_seconds.observe(seconds, operation=operation, model=model)
+
+        window = self._latencies.setdefault(
+            (operation, model), deque(maxlen=settings.LLM_LATENCY_WINDOW)
+        )
+        window.append(seconds)
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._call("generate", prompt, kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self._call("chat", messages, kwargs)
+
+    async def _call(self, method: str, first_arg, kwargs: Dict) -> str:
+        routed, source = self._apply(kwargs)
+        started = time.monotonic()
+        with span("llm.request", **self._span_attributes(routed, source)):
+            response = await getattr(self.inner, method)(first_arg, **routed)
+        self._observe(routed.get("operation"), routed.get("model"), source, time.monotonic() - started)
+        return response
+
+    async def chat_stream(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        routed, source = self._apply(kwargs)
+        started = time.monotonic()
+        async with aclosing(self.inner.chat_stream(messages, **routed)) as stream:
+            async for token in stream:
+                yield token
+        self._observe(routed.get("operation"), routed.get("model"), source, time.monotonic() - started)
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        latency = {}
+        for (operation, model), window in self._latencies.items():
+            values = list(window)
+            latency.setdefault(operation, {})[model] = {
+                "samples": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+            }
+        routes = {}
+        for operation in self.routes:
+            route = self.resolve(operation)
+            routes[operation] = {**route, "model": route["model"] or self.default_model}
+        stats["routing"] = {
+            "routes": routes,
+            "request_overrides": settings.LLM_ROUTE_REQUEST_OVERRIDES,
+            "allowed_models": sorted(self.allowed_models),
+            "latency": latency
+        }
+        return stats
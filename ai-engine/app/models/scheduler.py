@@ -0,0 +1,343 @@
+"""
+BI Management AI Engine - LLM Scheduler
+جدولة الطلبات أمام Ollama: أولويات + توزيع عادل بين المستخدمين + حد تزامن تكيفي
+"""
+
+from collections import OrderedDict, deque
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, Deque, Dict, List, Optional
+import asyncio
+import time
+from loguru import logger
+
+from .base import LLMWrapper
+from .llm import TIMEOUT_MESSAGE
+from ..utils.context import get_context_value
+from ..utils.helpers import percentile
+from ..utils.metrics import get_metrics
+from ..utils.tracing import span
+from ..config import get_settings
+
+settings = get_settings()
+
+# الأقل رقماً = الأعلى أولوية
+PRIORITY_CLASSES = {
+    "chat": 0,       # محادثة تفاعلية
+    "task": 1,       # إنشاء المهام
+    "analysis": 2,   # التحليلات والرؤى
+}
+DEFAULT_PRIORITY = "analysis"
+
+concurrency_limit = get_metrics().gauge(
+    "ai_llm_concurrency_limit", "Current adaptive concurrency limit towards Ollama"
+)
+limit_changes = get_metrics().counter(
+    "ai_llm_concurrency_limit_changes_total",
+    "Adaptive limit adjustments (direction=increase/decrease)",
+    ("direction",)
+)
+
+
+class AIMDLimit:
+    """
+    حد تزامن تكيفي (Additive Increase / Multiplicative Decrease)
+
+    - كل طلب ناجح ضمن target يزيد الحد بـ 1/limit (أي +1 تقريباً كل limit طلب)
+    - طلب أبطأ من target أو فاشل يضرب الحد في backoff، مرة واحدة على
+      الأكثر كل زمن خدمة (حتى لا تنهار الدفعة الواحدة بالحد إلى 1)
+
+    يتابع أيضاً متوسط زمن الخدمة (EWMA) لتقدير زمن انتظار الطابور.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 8,
+        target: float = 20.0,
+        backoff: float = 0.7,
+        adaptive: bool = True,
+        alpha: float = 0.2
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.value = float(min(max(initial, self.min_limit), self.max_limit))
+        self.target = target
+        self.backoff = backoff
+        self.adaptive = adaptive
+        self.alpha = alpha
+
+        self.service_seconds: Optional[float] = None
+        self.samples = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        concurrency_limit.set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self.value))
+
+    def record(self, seconds: float, ok: bool, inflight: int = None):
+        """
+        نتيجة طلب واحد نحو Ollama (زمن الخدمة بدون انتظار الطابور)
+
+        inflight: الطلبات الجارية لحظة الانتهاء - لا نزيد حداً غير مستخدم بالكامل
+        """
+        self.samples += 1
+        if ok:
+            if self.service_seconds is None:
+                self.service_seconds = seconds
+            else:
+                self.service_seconds += self.alpha * (seconds - self.service_seconds)
+
+        if not self.adaptive:
+            return
+
+        before = self.limit
+        now = time.monotonic()
+        if not ok or seconds > self.target:
+            cooled = now - self._last_decrease >= (self.service_seconds or seconds)
+            if cooled and self.value > self.min_limit:
+                self.value = max(self.min_limit, self.value * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+                limit_changes.inc(direction="decrease")
+        elif inflight is None or inflight >= self.limit:
+            self.value = min(self.max_limit, self.value + 1 / self.value)
+
+        if self.limit != before:
+            if self.limit > before:
+                self.increases += 1
+                limit_changes.inc(direction="increase")
+            logger.info(f"Adaptive concurrency limit {before} -> {self.limit}")
+        concurrency_limit.set(self.limit)
+
+    def get_stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "value": round(self.value, 2),
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "target_seconds": self.target,
+            "adaptive": self.adaptive,
+            "service_seconds": round(self.service_seconds, 3) if self.service_seconds else None,
+            "samples": self.samples,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class LLMScheduler:
+    """
+    عدد محدود من الخانات المتزامنة نحو Ollama
+
+    - عند الانتظار تُخدم الفئة الأعلى أولوية أولاً
+    - داخل الفئة الواحدة يُوزع الدور بالتناوب (round-robin) بين
+      المستخدمين/الأقسام حتى لا يحتكر مستخدم واحد الطابور
+    - عدد الخانات يتبع AIMDLimit حسب زمن استجابة Ollama الملاحظ
+    """
+
+    def __init__(self, slots: int = 2, wait_samples: int = 500, limit: AIMDLimit = None):
+        self.limiter = limit or AIMDLimit(slots, min_limit=slots, max_limit=slots, adaptive=False)
+        self.running = 0
+
+        # class -> tenant -> deque of futures
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            name: OrderedDict() for name in PRIORITY_CLASSES
+        }
+
+        self._served: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._waits: Dict[str, Deque[float]] = {
+            name: deque(maxlen=wait_samples) for name in PRIORITY_CLASSES
+        }
+        self._max_wait: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+
+    @property
+    def slots(self) -> int:
+        return self.limiter.limit
+
+    def _queued(self, priority: str) -> int:
+        return sum(len(q) for q in self._queues[priority].values())
+
+    def ahead_of(self, priority: str) -> int:
+        """الطلبات التي ستُخدم قبل طلب جديد بهذه الأولوية (الجارية + المنتظرة بأولوية أعلى أو مساوية)"""
+        rank = PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES[DEFAULT_PRIORITY])
+        return self.running + sum(
+            self._queued(name) for name, r in PRIORITY_CLASSES.items() if r <= rank
+        )
+
+    def record(self, seconds: float, ok: bool):
+        """زمن خدمة طلب انتهى - قد يغير الحد فنوزع الخانات من جديد"""
+        self.limiter.record(seconds, ok, self.running)
+        self._dispatch()
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[name] for name in PRIORITY_CLASSES)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = DEFAULT_PRIORITY, tenant: str = "anonymous"):
+        """حجز خانة لطلب واحد نحو Ollama"""
+        if priority not in PRIORITY_CLASSES:
+            priority = DEFAULT_PRIORITY
+
+        started = time.monotonic()
+        with span("llm.queue_wait", priority=priority) as wait_span:
+            await self._acquire(priority, tenant)
+            wait_span.set(**{"queue.limit": self.slots})
+        self._record_wait(priority, time.monotonic() - started)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: str, tenant: str):
+        if self.running < self.slots and not self._has_waiters():
+            self.running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[priority].setdefault(tenant, deque())
+        queue.append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # الخانة مُنحت لحظة الإلغاء - نعيدها
+                self._release()
+            else:
+                self._discard(priority, tenant, future)
+            raise
+
+    def _discard(self, priority: str, tenant: str, future: asyncio.Future):
+        queue = self._queues[priority].get(tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[priority][tenant]
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """منح الخانات الفارغة للمنتظرين حسب الأولوية ثم بالتناوب"""
+        for name in sorted(PRIORITY_CLASSES, key=PRIORITY_CLASSES.get):
+            tenants = self._queues[name]
+            while tenants and self.running < self.slots:
+                tenant, queue = next(iter(tenants.items()))
+                future = queue.popleft()
+
+                # التناوب: المستخدم يعود لآخر الطابور
+                del tenants[tenant]
+                if queue:
+                    tenants[tenant] = queue
+
+                if future.done():
+                    continue
+
+                self.running += 1
+                future.set_result(None)
+
+    def _record_wait(self, priority: str, seconds: float):
+        self._served[priority] += 1
+        self._waits[priority].append(seconds)
+        self._max_wait[priority] = max(self._max_wait[priority], seconds)
+
+    def get_stats(self) -> Dict:
+        classes = {}
+        for name in PRIORITY_CLASSES:
+            waits = list(self._waits[name])
+            classes[name] = {
+                "queued": self._queued(name),
+                "served": self._served[name],
+                "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(percentile(waits, 95) * 1000, 1),
+                "wait_max_ms": round(self._max_wait[name] * 1000, 1),
+            }
+
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "limit": self.limiter.get_stats(),
+            "classes": classes
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """المجدول المشترك (يقرأه التحكم بالقبول لتقدير زمن الانتظار)"""
+    global _scheduler
+    if _scheduler is None:
+        limit = AIMDLimit(
+            settings.LLM_MAX_CONCURRENCY,
+            min_limit=settings.LLM_CONCURRENCY_MIN,
+            max_limit=settings.LLM_CONCURRENCY_MAX,
+            target=settings.LLM_CONCURRENCY_TARGET_LATENCY or settings.LLM_LATENCY_SLO,
+            backoff=settings.LLM_CONCURRENCY_BACKOFF,
+            adaptive=settings.LLM_ADAPTIVE_CONCURRENCY
+        )
+        _scheduler = LLMScheduler(limit=limit)
+    return _scheduler
+
+
+class ScheduledLLM(LLMWrapper):
+    """
+    طبقة تمرر كل طلب عبر LLMScheduler
+
+    الأولوية من hint باسم priority، والمستخدم من user_id/department
+    (أو من سياق الطلب الحالي إذا لم تُمرر)
+    """
+
+    def __init__(self, inner, scheduler: LLMScheduler = None):
+        super().__init__(inner)
+        self.scheduler = scheduler or get_scheduler()
+
+    @staticmethod
+    def _tenant(kwargs: Dict) -> str:
+        return (
+            kwargs.get("user_id")
+            or kwargs.get("department")
+            or get_context_value("user_id")
+            or get_context_value("department")
+            or "anonymous"
+        )
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._call("generate", prompt, kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self._call("chat", messages, kwargs)
+
+    async def _call(self, method: str, first_arg, kwargs: Dict) -> str:
+        async with self.scheduler.slot(kwargs.get("priority", DEFAULT_PRIORITY), self._tenant(kwargs)):
+            started = time.monotonic()
+            response = await getattr(self.inner, method)(first_arg, **kwargs)
+            ok = bool(response) and response != TIMEOUT_MESSAGE
+            self.scheduler.record(time.monotonic() - started, ok)
+            return response
+
+    async def chat_stream(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        # الخانة محجوزة طوال مدة التدفق
+        async with self.scheduler.slot(kwargs.get("priority", DEFAULT_PRIORITY), self._tenant(kwargs)):
+            started = time.monotonic()
+            received = False
+            # aclosing: إغلاق هذا التدفق يغلق التدفق الداخلي فوراً (واتصال Ollama)
+            async with aclosing(self.inner.chat_stream(messages, **kwargs)) as stream:
+                async for token in stream:
+                    received = received or (bool(token) and token != TIMEOUT_MESSAGE)
+                    yield token
+            self.scheduler.record(time.monotonic() - started, received)
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        stats["scheduler"] = self.scheduler.get_stats()
+        return stats
@@ -0,0 +1,107 @@
+"""
+BI Management AI Engine - Single-flight
+دمج الطلبات المتطابقة المتزامنة في طلب واحد لـ Ollama
+"""
+
+import asyncio
+from typing import Dict, List
+from loguru import logger
+
+from .base import LLMWrapper
+from ..utils.tracing import annotate
+
+
+class SingleFlightLLM(LLMWrapper):
+    """
+    إذا وصل طلب مطابق (نفس البصمة) أثناء تنفيذ طلب سابق،
+    ينتظر نفس النتيجة بدل إرسال طلب جديد لـ Ollama
+
+    البصمة لا تشمل الـ hints، لذا يُضاف لها conversation_id (الخادم
+    المثبت للمحادثة)، ويُستدعى on_context لكل منتظر بالسياق الذي رجع
+    للطلب المشترك.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.leaders = 0      # طلبات وصلت فعلاً لـ Ollama
+        self.collapsed = 0    # طلبات انتظرت نتيجة طلب آخر
+        self.max_waiters = 0  # أكبر عدد طلبات على نفس البصمة
+
+        self._waiters: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}  # منتظرون لم يُلغوا بعد
+        self._contexts: Dict[str, Dict] = {}  # key -> سياق Ollama الراجع للطلب المشترك
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._do("generate", prompt, kwargs)
+
+    async def chat(self, messages: List[Dict], **kwargs) -> str:
+        return await self._do("chat", messages, kwargs)
+
+    async def _do(self, method: str, first_arg, kwargs: Dict) -> str:
+        key = self.inner.fingerprint(method, first_arg, **kwargs)
+        if kwargs.get("conversation_id"):
+            key = f"{key}:{kwargs['conversation_id']}"
+        on_context = kwargs.get("on_context")
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            call = getattr(self.inner, method)
+            captured: Dict = {}
+            task = asyncio.ensure_future(call(first_arg, **{
+                **kwargs,
+                "on_context": lambda context, model: captured.update(context=context, model=model)
+            }))
+            self._in_flight[key] = task
+            self._waiters[key] = 0
+            self._active[key] = 0
+            self._contexts[key] = captured
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.collapsed += 1
+            annotate(**{"llm.single_flight": "joined"})
+            logger.debug(f"Single-flight: joined in-flight request {key[:12]}")
+
+        self._waiters[key] += 1
+        self._active[key] += 1
+        self.max_waiters = max(self.max_waiters, self._waiters[key])
+        captured = self._contexts[key]
+
+        # shield: إلغاء أحد المنتظرين لا يلغي الطلب على البقية
+        try:
+            response = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # آخر منتظر غادر (العميل قطع الاتصال) - لا داعي لإكمال التوليد
+            if self._in_flight.get(key) is task:
+                self._active[key] -= 1
+                if self._active[key] == 0:
+                    task.cancel()
+                    # طلب جديد بنفس البصمة يبدأ من جديد بدل الانضمام لطلب ملغى
+                    self._forget(key, task)
+            raise
+
+        if on_context and captured:
+            on_context(captured["context"], captured["model"])
+        return response
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is not task:
+            return
+        self._in_flight.pop(key, None)
+        self._waiters.pop(key, None)
+        self._active.pop(key, None)
+        self._contexts.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        total = self.leaders + self.collapsed
+        stats["single_flight"] = {
+            "in_flight": len(self._in_flight),
+            "upstream_calls": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+            "max_waiters": self.max_waiters
+        }
+        return stats
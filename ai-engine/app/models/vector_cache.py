@@ -0,0 +1,330 @@
+"""
+BI Management AI Engine - Embedding Vector Cache
+تخزين مؤقت لـ vectors النصوص: LRU في الذاكرة بحد بالبايت + طبقة اختيارية
+على القرص (memory-mapped) مشتركة بين العمليات وتبقى بعد إعادة التشغيل
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import threading
+import numpy as np
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows - بدون طبقة القرص
+    fcntl = None
+
+from .quantization import check_quantization, dequantize, quantize
+from ..utils.metrics import get_metrics
+
+KEY_BYTES = 16
+EMPTY_KEY = bytes(KEY_BYTES)
+COUNT_BYTES = 8
+
+lookups_total = get_metrics().counter(
+    "ai_embedding_cache_lookups_total", "Embedding cache lookups (result=memory/disk/miss)", ("result",)
+)
+
+
+def text_key(text: str, model: str = "") -> bytes:
+    """
+    بصمة المحتوى (blake2b 128-bit) - ثابتة بين العمليات بعكس hash() في بايثون
+
+    اسم النموذج جزء من البصمة، فتغيير النموذج لا يعيد vectors قديمة.
+    """
+    return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class DiskVectorStore:
+    """
+    جدول hash بعناوين مفتوحة داخل ملف memory-mapped: خانة = (مفتاح، vector float32)
+
+    كل العمليات التي تفتح نفس الملف ترى كتابات بعضها فوراً (MAP_SHARED).
+    الكتابة تتم تحت flock على ملف .lock المجاور (كاتب واحد بين كل العمليات)،
+    وتصفّر المفتاح ثم تكتب الـ vector ثم المفتاح؛ والقراءة بدون قفل تتحقق من
+    المفتاح قبل النسخ وبعده - فلا تُقرأ خانة نصف مكتوبة. ملف القفل يحمل أيضاً
+    عدد الخانات المستخدمة. عند امتلاء خانات البحث تُستبدل الخانة الأولى
+    (cache وليس تخزيناً دائماً).
+    """
+
+    def __init__(self, directory: str, dim: int, slots: int = 65536, probes: int = 8):
+        self.dim = dim
+        self.slots = slots
+        self.probes = min(probes, slots)
+        self.path = os.path.join(directory, f"vectors-{dim}d-{slots}.bin")
+        self.dtype = np.dtype([("key", f"V{KEY_BYTES}"), ("vector", "<f4", (dim,))])
+
+        if fcntl is None:
+            raise OSError("file locking (fcntl) is not available on this platform")
+
+        os.makedirs(directory, exist_ok=True)
+        size = self.dtype.itemsize * slots
+        if not os.path.exists(self.path):
+            self._create(size)
+        if os.path.getsize(self.path) != size:
+            raise OSError(f"{self.path} has unexpected size (expected {size} bytes)")
+
+        self.table = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(slots,))
+        self.keys = self.table["key"]
+        self.vectors = self.table["vector"]
+
+        self.lock_path = f"{self.path}.lock"
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            # ملف قفل جديد (أو ملف بيانات من إصدار سابق): عدّ الخانات مرة واحدة
+            if os.fstat(self._lock_fd).st_size < COUNT_BYTES:
+                self._write_used(self._scan_used())
+
+    def _create(self, size: int):
+        # إنشاء ذري: أول عملية تربط الملف باسمه، والبقية تستخدمه
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        try:
+            os.link(tmp_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_used(self) -> int:
+        return int.from_bytes(os.pread(self._lock_fd, COUNT_BYTES, 0), "little")
+
+    def _write_used(self, count: int):
+        os.pwrite(self._lock_fd, count.to_bytes(COUNT_BYTES, "little"), 0)
+
+    def _scan_used(self) -> int:
+        raw = self.table.view(np.uint8).reshape(self.slots, -1)
+        return int(np.count_nonzero(raw[:, :KEY_BYTES].any(axis=1)))
+
+    def _home(self, key: bytes) -> int:
+        return int.from_bytes(key[:8], "little") % self.slots
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        home = self._home(key)
+        for i in range(self.probes):
+            slot = (home + i) % self.slots
+            stored = self.keys[slot].tobytes()
+            if stored == EMPTY_KEY:
+                return None
+            if stored == key:
+                vector = np.array(self.vectors[slot])
+                if self.keys[slot].tobytes() != key:
+                    return None  # استُبدلت أثناء القراءة
+                return vector
+        return None
+
+    def put(self, key: bytes, vector: np.ndarray):
+        home = self._home(key)
+        with self._locked():
+            target = home
+            filled = False
+            for i in range(self.probes):
+                slot = (home + i) % self.slots
+                stored = self.keys[slot].tobytes()
+                if stored == key:
+                    return
+                if stored == EMPTY_KEY:
+                    target = slot
+                    filled = True
+                    break
+
+            self.keys[target] = np.void(EMPTY_KEY)
+            self.vectors[target] = vector
+            self.keys[target] = np.void(key)
+            if filled:
+                self._write_used(self._read_used() + 1)
+
+    def used_slots(self) -> int:
+        """عدد الخانات المستخدمة (من ملف القفل - بدون مسح الجدول)"""
+        return self._read_used()
+
+    def flush(self):
+        self.table.flush()
+
+    def close(self):
+        self.table.flush()
+        os.close(self._lock_fd)
+
+
+class VectorCache:
+    """
+    Cache لـ vectors الترميز: المفتاح بصمة النص، والقيمة float32
+
+    الطبقة الأولى LRU في الذاكرة بحد أقصى بالبايت، وتخزن float32 أو
+    float16/int8 (quantization) لتتسع لعدد أكبر. إذا ضُبط directory تُضاف
+    طبقة ثانية على القرص (float32) تُفتح عند معرفة أبعاد النموذج، وما يوجد
+    فيها يُرفع للذاكرة عند القراءة.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        model: str = "",
+        directory: str = "",
+        disk_slots: int = 65536,
+        quantization: str = "float32"
+    ):
+        self.max_bytes = max_bytes
+        self.quantization = check_quantization(quantization)
+        self.model = model
+        self.directory = directory
+        self.disk_slots = disk_slots
+        self.dim: Optional[int] = None
+        self.disk: Optional[DiskVectorStore] = None
+
+        # key -> (codes, scale) - scale في int8 فقط
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, Optional[np.ndarray]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_dimension(self, dim: int):
+        """أبعاد الـ vectors - تفتح طبقة القرص إن كانت مفعّلة"""
+        if self.dim is not None:
+            return
+        self.dim = dim
+        if self.directory and self.disk_slots > 0:
+            try:
+                self.disk = DiskVectorStore(self.directory, dim, self.disk_slots)
+                logger.info(f"Embedding disk cache: {self.disk.path}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Embedding disk cache disabled: {e}")
+
+    def key(self, text: str) -> bytes:
+        return text_key(text, self.model)
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """vector لكل مفتاح أو None"""
+        results: List[Optional[np.ndarray]] = []
+        memory = disk = 0
+        with self._lock:
+            for key in keys:
+                vector = None
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    vector = dequantize(entry[0], entry[1], self.quantization)
+                    memory += 1
+                elif self.disk is not None:
+                    vector = self.disk.get(key)
+                    if vector is not None:
+                        self._store(key, vector)
+                        disk += 1
+                results.append(vector)
+
+            misses = len(keys) - memory - disk
+            self.memory_hits += memory
+            self.disk_hits += disk
+            self.misses += misses
+
+        if memory:
+            lookups_total.inc(memory, result="memory")
+        if disk:
+            lookups_total.inc(disk, result="disk")
+        if misses:
+            lookups_total.inc(misses, result="miss")
+        return results
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(keys) and self.dim is None:
+            self.set_dimension(vectors.shape[1])
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                vector = vector.copy()  # لا نحتفظ بمرجع للمصفوفة كاملة
+                self._store(key, vector)
+                if self.disk is not None:
+                    self.disk.put(key, vector)
+
+    @staticmethod
+    def _entry_size(entry: Tuple[np.ndarray, Optional[np.ndarray]]) -> int:
+        codes, scale = entry
+        return codes.nbytes + (scale.nbytes if scale is not None else 0) + KEY_BYTES
+
+    def _store(self, key: bytes, vector: np.ndarray):
+        if self.quantization == "float32":
+            entry = (vector, None)
+        else:
+            entry = quantize(vector, self.quantization)
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._entry_size(old)
+
+        self._entries[key] = entry
+        self._bytes += size
+
+        # الإخراج حسب LRU
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def flush(self):
+        """كتابة صفحات طبقة القرص المعدّلة"""
+        if self.disk is not None:
+            try:
+                self.disk.flush()
+            except OSError as e:
+                logger.warning(f"Could not flush embedding disk cache: {e}")
+
+    def close(self):
+        """إغلاق طبقة القرص - الطبقة في الذاكرة تبقى تعمل"""
+        with self._lock:
+            disk, self.disk = self.disk, None
+        if disk is not None:
+            try:
+                disk.close()
+            except OSError as e:
+                logger.warning(f"Could not close embedding disk cache: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        stats = {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "quantization": self.quantization,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "persistent": self.disk is not None,
+        }
+        if self.disk is not None:
+            stats["disk"] = {
+                "path": self.disk.path,
+                "slots": self.disk.slots,
+                "used_slots": self.disk.used_slots(),
+            }
+        return stats
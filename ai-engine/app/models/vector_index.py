@@ -0,0 +1,750 @@
+"""
+BI Management AI Engine - Vector Index
+فهرس بحث تقريبي (ANN) دائم لمستندات كثيرة (كتالوج المنتجات، سجل المهام):
+إضافة/تحديث/حذف بمعرف المستند، حفظ وتحميل من القرص، و HNSW إن وُجدت
+hnswlib وإلا IVF بـ numpy فقط
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from loguru import logger
+
+from .quantization import QuantizedMatrix, check_quantization, dequantize
+from ..utils.helpers import percentile
+
+INDEX_VERSION = 1
+BACKENDS = ("auto", "hnsw", "ivf", "flat")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """تطبيع كل صف لطول 1 (الصفوف الصفرية تبقى صفراً) - cosine = ضرب نقطي"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int, threshold: float = None) -> np.ndarray:
+    """
+    فهارس أعلى k درجات مرتبة تنازلياً (argpartition ثم ترتيب k فقط)
+
+    threshold يستبعد ما دونه قبل الاختيار.
+    """
+    candidates = np.flatnonzero(scores >= threshold) if threshold is not None else np.arange(len(scores))
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def hnswlib_available() -> bool:
+    try:
+        import hnswlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _save_npy(path: str, array: np.ndarray):
+    """np.save بكتابة ذرية"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+# ========== Backends (تولد المرشحين فقط - الدرجة النهائية من الـ vectors المخزنة) ==========
+
+class IVFBackend:
+    """
+    Inverted file: k-means كروي يقسم الـ vectors إلى nlist قائمة، والبحث
+    يفحص أقرب nprobe قوائم فقط (~nprobe/nlist من المستندات)
+
+    يُدرَّب عند الوصول لـ min_train مستند ويعاد تدريبه كلما تضاعف العدد
+    retrain_factor مرة؛ قبل ذلك البحث كامل (دقيق).
+    """
+
+    name = "ivf"
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 8, min_train: int = 2048,
+                 retrain_factor: float = 2.0, iterations: int = 8, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self.iterations = iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self.assign = np.full(0, -1, dtype=np.int32)  # قائمة كل صف (-1 = غير مفهرس)
+        self.lists: List[List[int]] = []
+        self._arrays: List[Optional[np.ndarray]] = []  # None = القائمة تغيرت
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _grow(self, capacity: int):
+        if len(self.assign) < capacity:
+            assign = np.full(capacity, -1, dtype=np.int32)
+            assign[:len(self.assign)] = self.assign
+            self.assign = assign
+
+    def _nearest(self, vectors: np.ndarray, block: int = 4096) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block):
+            labels[start:start + block] = np.argmax(vectors[start:start + block] @ self.centroids.T, axis=1)
+        return labels
+
+    def needs_training(self, count: int) -> bool:
+        if not self.trained:
+            return count >= self.min_train
+        return count >= self.trained_size * self.retrain_factor
+
+    def train(self, vectors: np.ndarray, rows: np.ndarray):
+        """k-means على عينة ثم توزيع كل الصفوف على القوائم"""
+        started = time.monotonic()
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(len(rows))))
+        nlist = min(nlist, len(rows))
+
+        sample_rows = rows if len(rows) <= nlist * 32 else rng.choice(rows, nlist * 32, replace=False)
+        sample = vectors[sample_rows]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            self.centroids = centroids
+            labels = self._nearest(sample)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            present = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids = centroids.copy()
+            centroids[present] = normalize_rows(sums)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                # قائمة فارغة تأخذ نقطة عشوائية بدل أن تبقى بلا فائدة
+                centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = len(rows)
+        self.lists = [[] for _ in range(nlist)]
+        self._arrays = [None] * nlist
+        self.assign[:] = -1
+        self.add(vectors, rows)
+        logger.info(f"IVF index trained: {len(rows)} vectors, {nlist} lists in {time.monotonic() - started:.2f}s")
+
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        if not self.trained or len(rows) == 0:
+            return
+        self._grow(int(rows.max()) + 1)
+        self.remove(rows)
+        labels = self._nearest(vectors[rows])
+        self.assign[rows] = labels
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self.lists[label].append(row)
+            self._arrays[label] = None
+
+    def remove(self, rows: np.ndarray):
+        if not self.trained:
+            return
+        rows = rows[rows < len(self.assign)]
+        for label in np.unique(self.assign[rows]).tolist():
+            if label >= 0:
+                self._arrays[label] = None
+        self.assign[rows] = -1
+
+    def _list_array(self, label: int) -> np.ndarray:
+        array = self._arrays[label]
+        if array is None:
+            # إزالة المحذوف والمنقول لقائمة أخرى والمكرر
+            array = np.unique(np.asarray(self.lists[label], dtype=np.int64))
+            array = array[self.assign[array] == label] if len(array) else array
+            self.lists[label] = array.tolist()
+            self._arrays[label] = array
+        return array
+
+    def candidates(self, query: np.ndarray, k: int) -> Optional[np.ndarray]:
+        if not self.trained:
+            return None
+        probe = top_k_indices(self.centroids @ query, self.nprobe)
+        return np.concatenate([self._list_array(label) for label in probe.tolist()])
+
+    def save(self, path: str):
+        if self.trained:
+            _save_npy(os.path.join(path, "centroids.npy"), self.centroids)
+            _save_npy(os.path.join(path, "assign.npy"), self.assign)
+
+    def load(self, path: str, meta: Dict):
+        centroids_path = os.path.join(path, "centroids.npy")
+        if not os.path.exists(centroids_path):
+            return
+        self.centroids = np.load(centroids_path)
+        self.assign = np.load(os.path.join(path, "assign.npy"))
+        self.trained_size = meta.get("trained_size", 0)
+        nlist = len(self.centroids)
+        self.lists = [[] for _ in range(nlist)]
+        self._arrays = [None] * nlist
+        for row in np.flatnonzero(self.assign >= 0).tolist():
+            self.lists[self.assign[row]].append(row)
+
+    def get_stats(self) -> Dict:
+        return {
+            "trained": self.trained,
+            "trained_size": self.trained_size,
+            "nlist": len(self.centroids) if self.trained else 0,
+            "nprobe": self.nprobe,
+        }
+
+
+class HNSWBackend:
+    """HNSW عبر hnswlib (اختياري) - labels = أرقام الصفوف في المخزن"""
+
+    name = "hnsw"
+
+    def __init__(self, dim: int, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        import hnswlib
+
+        self.dim = dim
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=1024, ef_construction=ef_construction, M=m)
+        self.index.set_ef(ef_search)
+        self._deleted = set()
+
+    def needs_training(self, count: int) -> bool:
+        return False
+
+    def train(self, vectors: np.ndarray, rows: np.ndarray):
+        pass
+
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        needed = self.index.get_current_count() + len(rows)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, self.index.get_max_elements() * 2))
+        # label موجود = تحديث الـ vector (ويلغي علامة الحذف)
+        self.index.add_items(vectors[rows], rows)
+        self._deleted.difference_update(rows.tolist())
+
+    def remove(self, rows: np.ndarray):
+        for row in rows.tolist():
+            if row in self._deleted:
+                continue
+            try:
+                self.index.mark_deleted(row)
+                self._deleted.add(row)
+            except RuntimeError:
+                pass  # لم يُضف أصلاً
+
+    def candidates(self, query: np.ndarray, k: int) -> Optional[np.ndarray]:
+        alive = self.index.get_current_count() - len(self._deleted)
+        if alive <= 0:
+            return np.zeros(0, dtype=np.int64)
+        labels, _ = self.index.knn_query(query, k=min(max(k, self.ef_search), alive))
+        return labels[0].astype(np.int64)
+
+    def save(self, path: str):
+        tmp_path = os.path.join(path, "hnsw.bin.tmp")
+        self.index.save_index(tmp_path)
+        os.replace(tmp_path, os.path.join(path, "hnsw.bin"))
+
+    def load(self, path: str, meta: Dict):
+        index_path = os.path.join(path, "hnsw.bin")
+        if os.path.exists(index_path):
+            self.index.load_index(index_path, max_elements=0)
+            self.index.set_ef(self.ef_search)
+            self._deleted = set(meta.get("hnsw_deleted", []))
+
+    def get_stats(self) -> Dict:
+        return {
+            "elements": self.index.get_current_count(),
+            "deleted": len(self._deleted),
+            "m": self.m,
+            "ef_search": self.ef_search,
+        }
+
+
+# ========== الفهرس ==========
+
+class VectorIndex:
+    """
+    vectors مطبّعة بمعرفات نصية، مع backend يقترح المرشحين
+
+    التحديث يعيد استخدام صف المستند، والحذف يحرر الصف لإضافة لاحقة.
+    المرشحون يُرتبون بالضرب النقطي على المصفوفة المخزنة (float32 أو
+    float16 أو int8). مع الضغط و rescore > 0 تُحفظ نسخة float32 أيضاً
+    (تُقرأ من القرص memory-mapped بعد التحميل) ويُعاد حساب أعلى
+    k * rescore مرشح منها بدقة كاملة.
+    """
+
+    def __init__(self, dim: int, backend: str = "auto", nlist: int = 0, nprobe: int = 8,
+                 min_train: int = 2048, hnsw_m: int = 16, ef_construction: int = 200, ef_search: int = 64,
+                 quantization: str = "float32", rescore: int = 4):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown index backend: {backend}")
+        if backend == "auto":
+            backend = "hnsw" if hnswlib_available() else "ivf"
+
+        self.dim = dim
+        self.params = {"nlist": nlist, "nprobe": nprobe, "min_train": min_train, "hnsw_m": hnsw_m,
+                       "ef_construction": ef_construction, "ef_search": ef_search,
+                       "quantization": check_quantization(quantization), "rescore": rescore}
+        self.backend_name = backend
+        self.backend = self._make_backend(backend)
+
+        self.codes = QuantizedMatrix(dim, quantization)
+        self.rescore = rescore
+        self.full: Optional[np.ndarray] = None  # نسخة float32 لإعادة الحساب (مع الضغط فقط)
+        if quantization != "float32" and rescore > 0:
+            self.full = np.zeros((0, dim), dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+
+    def _make_backend(self, backend: str):
+        p = self.params
+        if backend == "hnsw":
+            return HNSWBackend(self.dim, p["hnsw_m"], p["ef_construction"], p["ef_search"])
+        if backend == "ivf":
+            return IVFBackend(self.dim, p["nlist"], p["nprobe"], p["min_train"])
+        return None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def quantization(self) -> str:
+        return self.codes.mode
+
+    @property
+    def vectors(self):
+        """أدق نسخة متوفرة (صفوف float32 عند الفهرسة بالصف)"""
+        return self.full if self.full is not None else self.codes
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.rows
+
+    def _reserve(self, count: int) -> List[int]:
+        """صفوف لمستندات جديدة (المحررة أولاً ثم توسيع المصفوفة)"""
+        rows = [self.free.pop() for _ in range(min(count, len(self.free)))]
+        missing = count - len(rows)
+        if missing:
+            size = len(self.ids)
+            needed = size + missing
+            if needed > len(self.codes):
+                capacity = max(needed, len(self.codes) * 2, 1024)
+                self.codes.grow(capacity, size)
+                if self.full is not None:
+                    full = np.zeros((capacity, self.dim), dtype=np.float32)
+                    full[:size] = self.full[:size]
+                    self.full = full
+                alive = np.zeros(capacity, dtype=bool)
+                alive[:size] = self.alive[:size]
+                self.alive = alive
+            rows.extend(range(size, needed))
+            self.ids.extend([None] * missing)
+        return rows
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray):
+        """إضافة أو تحديث (نفس المعرف = استبدال الـ vector)"""
+        vectors = normalize_rows(vectors).reshape(len(ids), self.dim)
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}  # آخر تكرار يفوز
+        new_ids = [doc_id for doc_id in latest if doc_id not in self.rows]
+        for doc_id, row in zip(new_ids, self._reserve(len(new_ids))):
+            self.rows[doc_id] = row
+            self.ids[row] = doc_id
+
+        rows = np.fromiter((self.rows[doc_id] for doc_id in latest), dtype=np.int64, count=len(latest))
+        vectors = vectors[list(latest.values())]
+        self.codes.set(rows, vectors)
+        if self.full is not None:
+            self.full[rows] = vectors
+        self.alive[rows] = True
+
+        if self.backend is not None:
+            if self.backend.needs_training(len(self.rows)):
+                self.backend.train(self.vectors, np.flatnonzero(self.alive))
+            else:
+                self.backend.add(self.vectors, rows)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        rows = [self.rows.pop(doc_id) for doc_id in ids if doc_id in self.rows]
+        if not rows:
+            return 0
+        rows = np.asarray(rows, dtype=np.int64)
+        self.alive[rows] = False
+        self.codes.clear(rows)
+        if self.full is not None:
+            self.full[rows] = 0.0
+        for row in rows.tolist():
+            self.ids[row] = None
+        self.free.extend(rows.tolist())
+        if self.backend is not None:
+            self.backend.remove(rows)
+        return len(rows)
+
+    def get_vector(self, doc_id: str) -> Optional[np.ndarray]:
+        row = self.rows.get(doc_id)
+        return self.vectors[row] if row is not None else None
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray, k: int, threshold: float) -> List[Tuple[str, float]]:
+        return [(self.ids[rows[i]], float(scores[i])) for i in top_k_indices(scores, k, threshold)]
+
+    def exact_search(self, query: np.ndarray, k: int = 5, threshold: float = None) -> List[Tuple[str, float]]:
+        """بحث كامل (brute force) بأدق نسخة متوفرة - مرجع قياس الدقة"""
+        query = normalize_rows(query)
+        size = len(self.ids)
+        if self.full is not None:
+            scores = self.full[:size] @ query
+        else:
+            scores = self.codes.scores(query, size=size)
+        scores[~self.alive[:size]] = -np.inf
+        return self._results(np.arange(size), scores, k, -1.0 if threshold is None else threshold)
+
+    def search(self, query: np.ndarray, k: int = 5, threshold: float = None) -> List[Tuple[str, float]]:
+        """
+        أقرب k مستندات [(id, score)] - تقريبي عبر الـ backend إن كان جاهزاً
+        """
+        query = normalize_rows(query)
+        candidates = self.backend.candidates(query, k) if self.backend is not None else None
+        if candidates is None:
+            if self.quantization == "float32":
+                return self.exact_search(query, k, threshold)
+            candidates = np.flatnonzero(self.alive[:len(self.ids)])
+
+        candidates = candidates[self.alive[candidates]]
+        scores = self.codes.scores(query, candidates)
+        if self.full is not None and self.rescore > 0 and len(candidates) > k:
+            # ترتيب تقريبي على المضغوط ثم إعادة حساب الأفضل بـ float32
+            candidates = candidates[top_k_indices(scores, k * self.rescore)]
+            scores = self.full[candidates] @ query
+        return self._results(candidates, scores, k, -1.0 if threshold is None else threshold)
+
+    def evaluate(self, queries: np.ndarray, k: int = 10, reference: "VectorIndex" = None) -> Dict:
+        """
+        recall@k وزمن البحث التقريبي مقابل البحث الكامل
+
+        reference: فهرس float32 للمقارنة (لقياس أثر الضغط بدون نسخة float32)
+        """
+        reference = reference if reference is not None else self
+        recalls, ann_ms, exact_ms = [], [], []
+        for query in np.atleast_2d(queries):
+            started = time.perf_counter()
+            approximate = self.search(query, k)
+            ann_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            exact = reference.exact_search(query, k)
+            exact_ms.append((time.perf_counter() - started) * 1000)
+
+            if exact:
+                expected = {doc_id for doc_id, _ in exact}
+                recalls.append(len(expected & {doc_id for doc_id, _ in approximate}) / len(expected))
+
+        return {
+            "backend": self.backend_name,
+            "quantization": self.quantization,
+            "rescore": self.rescore if self.full is not None else 0,
+            "documents": len(self),
+            "queries": len(ann_ms),
+            "k": k,
+            "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+            "ann_ms": {"p50": round(percentile(ann_ms, 50), 3), "p95": round(percentile(ann_ms, 95), 3)},
+            "exact_ms": {"p50": round(percentile(exact_ms, 50), 3), "p95": round(percentile(exact_ms, 95), 3)},
+        }
+
+    # ========== الحفظ ==========
+
+    def save(self, path: str):
+        """
+        حفظ في مجلد: index.json + vectors.npy (float32) + codes.npy/scales.npy
+        (المضغوط) + ملفات الـ backend
+        """
+        os.makedirs(path, exist_ok=True)
+        size = len(self.ids)
+        if self.quantization == "float32":
+            _save_npy(os.path.join(path, "vectors.npy"), self.codes.codes[:size])
+        else:
+            # بالسعة كاملة: بعد التحميل تبقى نسخة float32 مربوطة بالملف حتى تمتلئ
+            _save_npy(os.path.join(path, "codes.npy"), self.codes.codes)
+            if self.codes.scales is not None:
+                _save_npy(os.path.join(path, "scales.npy"), self.codes.scales)
+            if self.full is not None:
+                _save_npy(os.path.join(path, "vectors.npy"), self.full)
+        if self.backend is not None:
+            self.backend.save(path)
+
+        meta = {
+            "version": INDEX_VERSION,
+            "dim": self.dim,
+            "backend": self.backend_name,
+            "params": self.params,
+            "ids": self.ids,
+            "quantization": self.quantization,
+            "rescore_vectors": self.full is not None,
+            "trained_size": getattr(self.backend, "trained_size", 0),
+            "hnsw_deleted": sorted(getattr(self.backend, "_deleted", ())),
+        }
+        tmp_path = os.path.join(path, "index.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path: str, backend: str = None, quantization: str = None, rescore: int = None) -> "VectorIndex":
+        """
+        تحميل فهرس محفوظ (backend أو ضغط مختلف عن المحفوظ = إعادة بناء من الـ vectors)
+        """
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version: {meta.get('version')}")
+
+        saved_backend = meta["backend"]
+        wanted = backend if backend and backend != "auto" else saved_backend
+        if wanted == "hnsw" and not hnswlib_available():
+            logger.warning("hnswlib not installed - rebuilding index with the numpy IVF backend")
+            wanted = "ivf"
+
+        params = dict(meta.get("params", {}))
+        if quantization:
+            params["quantization"] = quantization
+        if rescore is not None:
+            params["rescore"] = rescore
+        index = cls(meta["dim"], backend=wanted, **params)
+
+        saved_mode = meta.get("quantization", "float32")
+        full = codes = scales = None
+        if saved_mode == "float32":
+            full = np.load(os.path.join(path, "vectors.npy")).astype(np.float32, copy=False)
+        else:
+            codes = np.load(os.path.join(path, "codes.npy"))
+            if saved_mode == "int8":
+                scales = np.load(os.path.join(path, "scales.npy"))
+            if meta.get("rescore_vectors"):
+                # copy-on-write: الصفحات تُقرأ من الملف عند الحاجة ولا تُكتب عليه
+                full = np.load(os.path.join(path, "vectors.npy"), mmap_mode="c")
+
+        if saved_mode == index.quantization:
+            if saved_mode == "float32":
+                index.codes.codes = full
+            else:
+                index.codes.codes, index.codes.scales = codes, scales
+        else:
+            source = full if full is not None else dequantize(codes, scales, saved_mode)
+            index.codes = QuantizedMatrix.from_vectors(source, index.quantization)
+
+        if index.full is not None:
+            if full is not None:
+                index.full = full
+            else:
+                logger.warning(f"No float32 vectors saved in {path} - rescoring disabled until reindexed")
+                index.full = None
+
+        index.ids = list(meta["ids"])
+        index.alive = np.zeros(len(index.codes), dtype=bool)
+        index.alive[:len(index.ids)] = [doc_id is not None for doc_id in index.ids]
+        index.rows = {doc_id: row for row, doc_id in enumerate(index.ids) if doc_id is not None}
+        index.free = [row for row, doc_id in enumerate(index.ids) if doc_id is None]
+
+        if index.backend is not None:
+            if wanted == saved_backend:
+                index.backend.load(path, meta)
+            elif len(index.rows):
+                alive_rows = np.flatnonzero(index.alive)
+                if wanted == "ivf" and index.backend.needs_training(len(alive_rows)):
+                    index.backend.train(index.vectors, alive_rows)
+                else:
+                    index.backend.add(index.vectors, alive_rows)
+        return index
+
+    def get_stats(self) -> Dict:
+        stats = {
+            "backend": self.backend_name,
+            "dim": self.dim,
+            "documents": len(self),
+            "capacity": len(self.codes),
+            "free_rows": len(self.free),
+            "quantization": self.quantization,
+            "vector_bytes": self.codes.nbytes,
+            "rescore": self.rescore if self.full is not None else 0,
+            "rescore_bytes": self.full.nbytes if self.full is not None else 0,
+            "rescore_mapped": isinstance(self.full, np.memmap),
+        }
+        if self.backend is not None:
+            stats.update(self.backend.get_stats())
+        return stats
+
+
+class SemanticIndex:
+    """
+    فهرس مستندات نصية فوق EmbeddingService
+
+    upsert يرمّز فقط المستندات الجديدة أو التي تغير نصها (بصمة sha1)،
+    و search يرجع نفس شكل find_similar: المستند + _similarity_score.
+    المسارات تستدعيه من عدة threads، فكل قراءة/تعديل للفهرس تحت _lock
+    (الترميز نفسه خارجه).
+    """
+
+    def __init__(self, name: str, service, path: str = "", backend: str = "auto", **params):
+        self.name = name
+        self.service = service
+        self.path = path
+        self.backend = backend
+        self.params = params
+        self.index: Optional[VectorIndex] = None
+        self.documents: Dict[str, Dict] = {}
+        self.text_hashes: Dict[str, str] = {}
+        self.dirty = False
+        self._lock = threading.RLock()
+
+        if path and os.path.exists(os.path.join(path, "index.json")):
+            self.load()
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def upsert(self, documents: List[Dict], text_field: str = "text", id_field: str = "id") -> Dict:
+        """
+        إضافة/تحديث مستندات - المستند بدون نص يُحذف من الفهرس
+
+        لا يتغير شيء إذا فشل الترميز، فإعادة المحاولة ترمّز نفس المستندات.
+
+        Returns:
+            {"added", "updated", "unchanged", "removed"}
+        """
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        pending: Dict[str, Tuple[Dict, str]] = {}
+        to_encode: Dict[str, str] = {}
+        empty = []
+
+        with self._lock:
+            for doc in documents:
+                doc_id = str(doc[id_field])
+                text = doc.get(text_field) or ""
+                if not text:
+                    empty.append(doc_id)
+                    continue
+                text_hash = self._text_hash(text)
+                pending[doc_id] = (doc, text_hash)
+                if self.text_hashes.get(doc_id) == text_hash and doc_id not in to_encode:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if doc_id in self.text_hashes or doc_id in to_encode else "added"] += 1
+                to_encode[doc_id] = text
+
+        vectors = None
+        if to_encode:
+            vectors = self.service.encode_normalized(list(to_encode.values()))
+            if vectors is None:
+                raise RuntimeError("Embedding model is not available")
+
+        with self._lock:
+            if vectors is not None:
+                if self.index is None:
+                    self.index = VectorIndex(vectors.shape[1], backend=self.backend, **self.params)
+                self.index.upsert(list(to_encode.keys()), vectors)
+            for doc_id, (doc, text_hash) in pending.items():
+                self.documents[doc_id] = doc
+                self.text_hashes[doc_id] = text_hash
+            counts["removed"] = self.delete(empty)
+            self.dirty = True
+        return counts
+
+    def delete(self, ids: Iterable[str]) -> int:
+        ids = [str(doc_id) for doc_id in ids]
+        with self._lock:
+            for doc_id in ids:
+                self.documents.pop(doc_id, None)
+                self.text_hashes.pop(doc_id, None)
+            removed = self.index.delete(ids) if self.index is not None else 0
+            if removed:
+                self.dirty = True
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.index) if self.index is not None else 0
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.5, exact: bool = False) -> List[Dict]:
+        if not len(self):
+            return []
+        vector = self.service.encode_normalized([query])
+        if vector is None:
+            raise RuntimeError("Embedding model is not available")
+        return self.search_vector(vector[0], top_k, threshold, exact)
+
+    def search_vector(self, vector: np.ndarray, top_k: int = 5, threshold: float = 0.5,
+                      exact: bool = False) -> List[Dict]:
+        """البحث بـ vector استعلام مطبّع (رُمّز مسبقاً)"""
+        with self._lock:
+            if self.index is None or not len(self.index):
+                return []
+            search = self.index.exact_search if exact else self.index.search
+            return [
+                {**self.documents[doc_id], "_similarity_score": score}
+                for doc_id, score in search(vector, top_k, threshold)
+            ]
+
+    def evaluate(self, queries: List[str], k: int = 10) -> Dict:
+        """recall@k والزمن مقابل البحث الكامل لاستعلامات نصية"""
+        if not len(self) or not queries:
+            return {"documents": 0, "queries": 0}
+        vectors = self.service.encode_normalized(queries)
+        if vectors is None:
+            raise RuntimeError("Embedding model is not available")
+        with self._lock:
+            return self.index.evaluate(vectors, k)
+
+    def save(self):
+        with self._lock:
+            if not self.path or self.index is None:
+                return
+            self.index.save(self.path)
+            tmp_path = os.path.join(self.path, "documents.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"documents": self.documents, "text_hashes": self.text_hashes}, f,
+                          ensure_ascii=False, default=str)
+            os.replace(tmp_path, os.path.join(self.path, "documents.json"))
+            self.dirty = False
+
+    def load(self):
+        try:
+            index = VectorIndex.load(
+                self.path, backend=self.backend,
+                quantization=self.params.get("quantization"), rescore=self.params.get("rescore")
+            )
+            with open(os.path.join(self.path, "documents.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load index {self.name} from {self.path}: {e}")
+            return
+        with self._lock:
+            self.index = index
+            self.documents = data.get("documents", {})
+            self.text_hashes = data.get("text_hashes", {})
+        logger.info(f"Loaded index {self.name}: {len(index)} documents ({index.backend_name})")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {"name": self.name, "persistent": bool(self.path), "unsaved_changes": self.dirty}
+            if self.index is not None:
+                stats.update(self.index.get_stats())
+            else:
+                stats["documents"] = 0
+            return stats
@@ -1,2 +1,2 @@
 """API Routes"""
-from . import chat, tasks, analysis
+from . import chat, tasks, analysis, jobs, precompute, search
@@ -1,15 +1,21 @@
 """
 BI Management AI Engine - Analysis Routes
 مسارات التحليل
+
+المسارات /department و /attendance و /insights تمر بخدمة الحساب المسبق:
+الرد هو نتيجة التحليل نفسها مع مفتاح إضافي precomputed =
+{hit, input_hash, generated_at, age_seconds, stale}. المفتاح لا يظهر إذا
+كان PRECOMPUTE_ENABLED معطلاً.
 """
 
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Query
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from loguru import logger
 import json
 
 from ..services.analysis_service import get_analysis_service
+from ..services.precompute_service import get_precompute_service
 
 router = APIRouter(prefix="/analysis", tags=["Analysis"])
 
@@ -27,6 +33,11 @@ class PerformanceRequest(BaseModel):
     period: str = Field("month", description="الفترة: week, month, year")
 
 
+class DepartmentRequest(BaseModel):
+    """طلب تحليل قسم"""
+    department_data: Dict[str, Any]
+
+
 class AttendanceRequest(BaseModel):
     """طلب تحليل حضور"""
     attendance_data: List[Dict[str, Any]]
@@ -107,25 +118,50 @@ async def analyze_performance(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/department")
+async def analyze_department(
+    request: DepartmentRequest,
+    x_security_level: str = Header("1"),
+    refresh: bool = Query(False, description="تجاهل النتيجة المحسوبة مسبقاً")
+):
+    """
+    تحليل أداء قسم (يُقدم من النتائج المحسوبة مسبقاً إن وُجدت لنفس البيانات)
+
+    - **department_data**: بيانات القسم كما تُمرر إلى analyze_department
+    - الرد: {analysis, analysis_type, data_points, ...} + precomputed
+    """
+    try:
+        security_level = get_security_level(x_security_level)
+        
+        precompute = await get_precompute_service()
+        return await precompute.get_or_compute(
+            "department", request.model_dump(), security_level, refresh=refresh
+        )
+        
+    except Exception as e:
+        logger.error(f"Department analysis error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/attendance")
 async def analyze_attendance(
     request: AttendanceRequest,
-    x_security_level: str = Header("1")
+    x_security_level: str = Header("1"),
+    refresh: bool = Query(False, description="تجاهل النتيجة المحسوبة مسبقاً")
 ):
     """
-    تحليل اتجاهات الحضور
+    تحليل اتجاهات الحضور (يُقدم من النتائج المحسوبة مسبقاً إن وُجدت لنفس البيانات)
+
+    - الرد: {analysis, analysis_type, data_points, ...} + precomputed
     """
     try:
         security_level = get_security_level(x_security_level)
         
-        analysis_service = await get_analysis_service()
-        result = await analysis_service.analyze_attendance_trends(
-            attendance_data=request.attendance_data,
-            user_security_level=security_level
+        precompute = await get_precompute_service()
+        return await precompute.get_or_compute(
+            "attendance", request.model_dump(), security_level, refresh=refresh
         )
         
-        return result
-        
     except Exception as e:
         logger.error(f"Attendance analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -158,26 +194,22 @@ async def analyze_workload(
 @router.post("/insights")
 async def generate_insights(
     request: InsightsRequest,
-    x_security_level: str = Header("1")
+    x_security_level: str = Header("1"),
+    refresh: bool = Query(False, description="تجاهل النتيجة المحسوبة مسبقاً")
 ):
     """
-    توليد رؤى من البيانات
+    توليد رؤى من البيانات (يُقدم من النتائج المحسوبة مسبقاً إن وُجدت لنفس البيانات)
+
+    - الرد: {insights, count} كما كان + precomputed
     """
     try:
         security_level = get_security_level(x_security_level)
         
-        analysis_service = await get_analysis_service()
-        insights = await analysis_service.generate_insights(
-            data_type=request.data_type,
-            data=request.data,
-            user_security_level=security_level
+        precompute = await get_precompute_service()
+        return await precompute.get_or_compute(
+            "insights", request.model_dump(), security_level, refresh=refresh
         )
         
-        return {
-            "insights": insights,
-            "count": len(insights)
-        }
-        
     except Exception as e:
         logger.error(f"Insights generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
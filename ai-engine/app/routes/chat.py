@@ -4,9 +4,12 @@ BI Management AI Engine - Chat Routes
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from loguru import logger
+from contextlib import aclosing
+import json
 
 from ..services.chat_service import get_chat_service
 from ..utils.helpers import generate_id
@@ -37,6 +40,22 @@ class ChatResponse(BaseModel):
     suggestions: List[str]
     blocked: bool = False
     reason: Optional[str] = None
+    quick_reply: Optional[str] = None  # النية إذا أجيب بدون النموذج
+
+
+def parse_user_info(x_user_info: Optional[str], user_id: str) -> Dict:
+    """قراءة معلومات المستخدم من الهيدر أو استخدام القيم الافتراضية"""
+    if x_user_info:
+        try:
+            return json.loads(x_user_info)
+        except:
+            pass
+    
+    return {
+        "id": user_id,
+        "full_name": "موظف",
+        "security_level": 1
+    }
 
 
 @router.post("", response_model=ChatResponse)
@@ -52,23 +71,7 @@ async def chat(
     - **conversation_id**: معرف محادثة سابقة (اختياري)
     """
     try:
-        # Parse user info from header or use defaults
-        import json
-        if x_user_info:
-            try:
-                user_info = json.loads(x_user_info)
-            except:
-                user_info = {
-                    "id": request.user_id,
-                    "full_name": "موظف",
-                    "security_level": 1
-                }
-        else:
-            user_info = {
-                "id": request.user_id,
-                "full_name": "موظف",
-                "security_level": 1
-            }
+        user_info = parse_user_info(x_user_info, request.user_id)
         
         chat_service = await get_chat_service()
         result = await chat_service.chat(
@@ -85,6 +88,55 @@ async def chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    x_user_info: str = Header(None, description="JSON encoded user info")
+):
+    """
+    إرسال رسالة للمساعد الذكي مع استلام الرد بشكل متدفق (SSE)
+    
+    الأحداث:
+    - **start**: معرف المحادثة
+    - **token**: جزء من الرد (منظف أمنياً)
+    - **done**: الرد الكامل والاقتراحات (نفس شكل /chat)
+    - **error**: خطأ أثناء المعالجة
+    """
+    user_info = parse_user_info(x_user_info, request.user_id)
+    chat_service = await get_chat_service()
+    
+    async def event_source():
+        events = chat_service.chat_stream(
+            user_id=request.user_id,
+            message=request.message,
+            user_info=user_info,
+            conversation_id=request.conversation_id
+        )
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    name = event.pop("event")
+                    yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/quick-replies/stats")
+async def quick_reply_stats():
+    """
+    إحصائيات الردود الجاهزة (نسبة الإصابة لكل نية)
+    """
+    chat_service = await get_chat_service()
+    return chat_service.quick_replies.get_stats()
+
+
 @router.get("/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """
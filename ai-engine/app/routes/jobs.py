@@ -0,0 +1,109 @@
+"""
+BI Management AI Engine - Job Routes
+مسارات المهام الخلفية (تحليل / رؤى / إنشاء مهمة بدون انتظار)
+"""
+
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import Optional, Dict, Any
+from loguru import logger
+
+from ..services.job_service import get_job_service, check_callback_url, JobQueueFull, JOB_KINDS
+from .analysis import (
+    get_security_level, AnalysisRequest, DepartmentRequest, PerformanceRequest,
+    AttendanceRequest, WorkloadRequest, InsightsRequest
+)
+from .tasks import TaskCreateRequest
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+class JobSubmitRequest(BaseModel):
+    """طلب مهمة خلفية"""
+    kind: str = Field(..., description=f"نوع المهمة: {', '.join(JOB_KINDS)}")
+    payload: Dict[str, Any] = Field(..., description="نفس جسم طلب المسار المتزامن")
+    callback_url: Optional[str] = Field(None, description="رابط يستلم النتيجة عند الانتهاء")
+
+    @field_validator("callback_url")
+    @classmethod
+    def _check_callback_url(cls, value: Optional[str]) -> Optional[str]:
+        return check_callback_url(value) if value else value
+
+
+# جسم كل نوع = جسم المسار المتزامن المقابل
+JOB_PAYLOADS = {
+    "analysis": AnalysisRequest,
+    "department": DepartmentRequest,
+    "performance": PerformanceRequest,
+    "attendance": AttendanceRequest,
+    "workload": WorkloadRequest,
+    "insights": InsightsRequest,
+    "task": TaskCreateRequest,
+}
+
+
+def validate_payload(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """التحقق من payload عند الإرسال (422) بدل فشل المهمة لاحقاً"""
+    try:
+        return JOB_PAYLOADS[kind].model_validate(payload).model_dump()
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", "payload", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+
+
+@router.post("", status_code=202)
+async def submit_job(
+    request: JobSubmitRequest,
+    x_security_level: str = Header("1")
+):
+    """
+    إرسال مهمة للتنفيذ في الخلفية - يرجع رقم المهمة فوراً
+
+    - **kind**: analysis, department, performance, attendance, workload, insights, task
+    - **payload**: مثل جسم /analysis/* أو /tasks/create
+    - **callback_url**: اختياري - يُرسل له سجل المهمة بعد الانتهاء (مضيفات LLM_JOB_CALLBACK_HOSTS فقط)
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}")
+    payload = validate_payload(request.kind, request.payload)
+
+    try:
+        job_service = await get_job_service()
+        return job_service.submit(
+            kind=request.kind,
+            payload=payload,
+            security_level=get_security_level(x_security_level),
+            callback_url=request.callback_url
+        )
+
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="طابور المهام ممتلئ، حاول لاحقاً",
+            headers={"Retry-After": "30"}
+        )
+    except Exception as e:
+        logger.error(f"Job submit error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def job_stats():
+    """عمق الطابور وعمر أقدم مهمة"""
+    job_service = await get_job_service()
+    return job_service.get_stats()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """حالة المهمة ونتيجتها"""
+    job_service = await get_job_service()
+    job = job_service.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة أو انتهت صلاحيتها")
+
+    return job
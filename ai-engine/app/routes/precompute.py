@@ -0,0 +1,93 @@
+"""
+BI Management AI Engine - Precompute Routes
+مسارات التحليلات المحسوبة مسبقاً: الـ backend يرسل بيانات كل قسم، ولوحات
+المتابعة تقرأ النتيجة الجاهزة فوراً
+"""
+
+from fastapi import APIRouter, HTTPException, Header, Query
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+from loguru import logger
+
+from ..services.precompute_service import get_precompute_service, PRECOMPUTE_KINDS
+from .analysis import get_security_level
+
+router = APIRouter(prefix="/precompute", tags=["Precompute"])
+
+
+class RefreshRequest(BaseModel):
+    """طلب إعادة حساب"""
+    kind: Optional[str] = Field(None, description=f"النوع: {', '.join(PRECOMPUTE_KINDS)} (فارغ = الكل)")
+    department: Optional[str] = Field(None, description="القسم (فارغ = الكل)")
+
+
+@router.put("/sources/{kind}/{department}")
+async def set_source(kind: str, department: str, payload: Dict[str, Any]):
+    """
+    تسجيل/تحديث بيانات قسم - إذا تغيرت تُعاد التحليلات لكل مستويات الأمان
+
+    - **kind**: department, attendance, insights
+    - **payload**: نفس جسم /analysis/{kind}
+    """
+    try:
+        precompute = await get_precompute_service()
+        return precompute.set_source(kind, department, payload)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Precompute source error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/sources/{kind}/{department}")
+async def remove_source(kind: str, department: str):
+    """إيقاف الحساب المسبق لقسم"""
+    precompute = await get_precompute_service()
+    if not precompute.remove_source(kind, department):
+        raise HTTPException(status_code=404, detail="Source not found")
+    return {"removed": True}
+
+
+@router.post("/refresh", status_code=202)
+async def refresh(request: RefreshRequest):
+    """جدولة إعادة حساب فورية (بدون انتظار ساعات الهدوء)"""
+    if request.kind and request.kind not in PRECOMPUTE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown precompute kind: {request.kind}")
+
+    precompute = await get_precompute_service()
+    return {"scheduled": precompute.schedule(request.kind, request.department, reason="refresh")}
+
+
+@router.get("/stats")
+async def precompute_stats():
+    """حالة المصادر وعمر نتائجها ونسبة الإصابة"""
+    precompute = await get_precompute_service()
+    return precompute.get_stats()
+
+
+@router.get("/{kind}/{department}")
+async def get_precomputed(
+    kind: str,
+    department: str,
+    x_security_level: str = Header("1"),
+    refresh: bool = Query(False, description="إعادة الحساب الآن قبل الرد")
+):
+    """
+    آخر نتيجة لقسم حسب مستوى الأمان، مع precomputed:
+    generated_at و age_seconds و stale (تغيرت البيانات أو النتيجة قديمة)
+    """
+    if kind not in PRECOMPUTE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown precompute kind: {kind}")
+
+    try:
+        precompute = await get_precompute_service()
+        result = await precompute.get(kind, department, get_security_level(x_security_level), refresh=refresh)
+
+    except Exception as e:
+        logger.error(f"Precompute read error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return result
@@ -0,0 +1,133 @@
+"""
+BI Management AI Engine - Semantic Search Routes
+مسارات فهارس البحث الدلالي (المنتجات، المهام، ...): إضافة/تحديث/حذف
+المستندات بالمعرف والبحث فيها
+"""
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any
+from loguru import logger
+import asyncio
+
+from ..models.embeddings import get_embedding_service
+from ..models.vector_index import SemanticIndex
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+def get_index(name: str) -> SemanticIndex:
+    """الفهرس بالاسم - 404 إذا لم يكن في EMBEDDING_INDEXES"""
+    try:
+        return get_embedding_service().get_index(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown index: {name}")
+
+
+class UpsertRequest(BaseModel):
+    """مستندات للإضافة أو التحديث"""
+    documents: List[Dict[str, Any]] = Field(..., description="كل مستند فيه id_field و text_field")
+    text_field: str = Field("text", description="الحقل النصي الذي يُرمّز")
+    id_field: str = Field("id", description="حقل المعرف")
+
+
+class SearchRequest(BaseModel):
+    """طلب بحث"""
+    query: str
+    top_k: int = Field(5, ge=1, le=100)
+    threshold: float = Field(0.5, description="الحد الأدنى للتشابه")
+    exact: bool = Field(False, description="بحث كامل بدل التقريبي")
+
+
+class EvaluateRequest(BaseModel):
+    """استعلامات لقياس دقة الفهرس"""
+    queries: List[str]
+    k: int = Field(10, ge=1, le=100)
+
+
+@router.put("/{index}/documents")
+async def upsert_documents(index: str, request: UpsertRequest):
+    """
+    إضافة/تحديث مستندات - تُرمّز فقط الجديدة أو التي تغير نصها
+    """
+    missing = [i for i, doc in enumerate(request.documents) if request.id_field not in doc]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Documents without '{request.id_field}': {missing[:10]}")
+
+    semantic_index = get_index(index)
+    try:
+        # الترميز يحجز المعالج - خارج الـ event loop
+        return await asyncio.to_thread(
+            semantic_index.upsert, request.documents, request.text_field, request.id_field
+        )
+
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Index upsert error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/{index}/documents/{doc_id}")
+async def delete_document(index: str, doc_id: str):
+    """حذف مستند من الفهرس"""
+    semantic_index = get_index(index)
+    # قد ينتظر قفل الفهرس أثناء upsert/save - خارج الـ event loop
+    if not await asyncio.to_thread(semantic_index.delete, [doc_id]):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"removed": True}
+
+
+@router.post("/{index}")
+async def search(index: str, request: SearchRequest):
+    """
+    بحث دلالي - يرجع المستندات مع _similarity_score
+    """
+    semantic_index = get_index(index)
+    try:
+        if not len(semantic_index):
+            return {"results": [], "count": 0}
+
+        # ترميز الاستعلام ينضم لدفعة الطلبات المتزامنة، والبحث نفسه في thread
+        vector = await get_embedding_service().encode_normalized_async([request.query])
+        if vector is None:
+            raise RuntimeError("Embedding model is not available")
+        results = await asyncio.to_thread(
+            semantic_index.search_vector, vector[0], request.top_k, request.threshold, request.exact
+        )
+        return {"results": results, "count": len(results)}
+
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{index}/save")
+async def save_index(index: str):
+    """حفظ الفهرس على القرص الآن (يُحفظ أيضاً عند إيقاف الخدمة)"""
+    semantic_index = get_index(index)
+    try:
+        await asyncio.to_thread(semantic_index.save)
+    except OSError as e:
+        logger.error(f"Index save error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return semantic_index.get_stats()
+
+
+@router.post("/{index}/evaluate")
+async def evaluate_index(index: str, request: EvaluateRequest):
+    """recall@k وزمن البحث التقريبي مقابل البحث الكامل"""
+    semantic_index = get_index(index)
+    try:
+        return await asyncio.to_thread(semantic_index.evaluate, request.queries, request.k)
+
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/{index}/stats")
+async def index_stats(index: str):
+    """حجم الفهرس ونوعه"""
+    return get_index(index).get_stats()
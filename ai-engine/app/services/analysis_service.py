@@ -3,17 +3,27 @@ BI Management AI Engine - Analysis Service
 خدمة تحليل البيانات
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
 import os
 from loguru import logger
 
 from ..models.llm import get_llm
 from ..utils.security import get_security_service
+from ..utils.prompt_data import serialize_for_prompt
+from ..utils.tracing import annotate, span, traced
 from ..config import get_settings
 
 settings = get_settings()
 
+# مفاتيح تُحجب قيمتها (جزء من اسم المفتاح) لمستويات الأمان أقل من 5
+SENSITIVE_FIELDS = [
+    "salary", "راتب",
+    "purchase_price", "سعر_الشراء",
+    "profit_margin", "هامش_الربح",
+    "cost", "تكلفة"
+]
+
 
 class AnalysisService:
     """
@@ -44,7 +54,8 @@ class AnalysisService:
         data: Any,
         analysis_type: str,
         user_security_level: int,
-        context: Dict = None
+        context: Dict = None,
+        operation: str = "AnalysisService.analyze"
     ) -> Dict:
         """
         تحليل بيانات مع مراعاة مستوى الأمان
@@ -54,6 +65,7 @@ class AnalysisService:
             analysis_type: نوع التحليل (performance, attendance, tasks, etc.)
             user_security_level: مستوى أمان المستخدم
             context: سياق إضافي
+            operation: العملية في جدول توجيه النماذج
         
         Returns:
             نتائج التحليل
@@ -61,26 +73,72 @@ class AnalysisService:
         # تنظيف البيانات من المعلومات الحساسة حسب مستوى الأمان
         cleaned_data = self._sanitize_data(data, user_security_level, analysis_type)
         
-        prompt = self.prompt_template.format(
-            security_level=user_security_level,
-            analysis_type=analysis_type,
-            data=json.dumps(cleaned_data, ensure_ascii=False, indent=2),
-            context=json.dumps(context or {}, ensure_ascii=False)
-        )
+        prompt, data_info = self._build_prompt(cleaned_data, analysis_type, user_security_level, context)
+        if data_info["truncated"]:
+            logger.info(
+                f"Analysis data sampled for {analysis_type}: "
+                f"{data_info['kept_items']}/{data_info['items']} items"
+            )
         
         llm = await get_llm()
-        response = await llm.generate(prompt, temperature=0.5)
+        response = await llm.generate(
+            prompt,
+            temperature=0.5,
+            priority="analysis",
+            service="AnalysisService",
+            operation=operation
+        )
         
         # تنظيف الرد أيضاً
-        response = self.security.sanitize_response(response, user_security_level)
+        with span("security.sanitize_response"):
+            response = self.security.sanitize_response(response, user_security_level)
         
         return {
             "analysis": response,
             "analysis_type": analysis_type,
             "data_points": len(cleaned_data) if isinstance(cleaned_data, list) else 1,
-            "security_level_applied": user_security_level
+            "security_level_applied": user_security_level,
+            "truncated": data_info["truncated"],
+            "prompt_data": data_info
         }
     
+    @traced("analysis.build_prompt")
+    def _build_prompt(
+        self,
+        cleaned_data: Any,
+        analysis_type: str,
+        security_level: int,
+        context: Dict = None
+    ) -> Tuple[str, Dict]:
+        """
+        بناء الـ prompt - التعليمات الثابتة أولاً والبيانات في النهاية
+        حتى تبقى بدايته مشتركة بين كل الطلبات
+        
+        Returns:
+            (الـ prompt، معلومات تقليص البيانات)
+        """
+        data, data_info = serialize_for_prompt(cleaned_data, self._token_budget(analysis_type))
+        prompt = self.prompt_template.format(
+            security_level=security_level,
+            analysis_type=analysis_type,
+            context=json.dumps(context or {}, ensure_ascii=False, separators=(",", ":")),
+            data=data
+        )
+        annotate(**{
+            "prompt.estimated_tokens": data_info["estimated_tokens"],
+            "prompt.items": data_info["items"],
+            "prompt.kept_items": data_info["kept_items"],
+        })
+        return prompt, data_info
+    
+    def _token_budget(self, analysis_type: str) -> int:
+        """حد التوكنات للنوع (insights_tasks ← insights ← الافتراضي)"""
+        budgets = settings.ANALYSIS_TOKEN_BUDGETS
+        if analysis_type in budgets:
+            return budgets[analysis_type]
+        return budgets.get(analysis_type.split("_")[0], settings.ANALYSIS_TOKEN_BUDGET)
+    
+    @traced("security.sanitize_data")
     def _sanitize_data(
         self, 
         data: Any, 
@@ -90,22 +148,15 @@ class AnalysisService:
         """
         تنظيف البيانات حسب مستوى الأمان
         """
-        sensitive_fields = [
-            "salary", "راتب",
-            "purchase_price", "سعر_الشراء",
-            "profit_margin", "هامش_الربح",
-            "cost", "تكلفة"
-        ]
-        
         # Level 5 يرى كل شيء
         if security_level >= 5:
             return data
         
         # للمستويات الأقل، أخفِ البيانات الحساسة
         if isinstance(data, dict):
-            return self._clean_dict(data, sensitive_fields, security_level)
+            return self._clean_dict(data, SENSITIVE_FIELDS, security_level)
         elif isinstance(data, list):
-            return [self._clean_dict(item, sensitive_fields, security_level) 
+            return [self._clean_dict(item, SENSITIVE_FIELDS, security_level) 
                    if isinstance(item, dict) else item for item in data]
         
         return data
@@ -241,7 +292,8 @@ class AnalysisService:
         result = await self.analyze(
             data=data,
             analysis_type=f"insights_{data_type}",
-            user_security_level=user_security_level
+            user_security_level=user_security_level,
+            operation="AnalysisService.insights"
         )
         
         # استخراج النقاط الرئيسية
@@ -0,0 +1,309 @@
+"""
+BI Management AI Engine - Job Service
+تنفيذ التحليلات وإنشاء المهام في الخلفية (بدل إبقاء اتصال HTTP مفتوحاً)
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import asyncio
+import time
+import httpx
+from loguru import logger
+
+from .analysis_service import get_analysis_service
+from .task_service import get_task_service
+from ..utils.context import get_request_context, reset_request_context, set_request_context
+from ..utils.helpers import generate_id, now
+from ..utils.metrics import get_metrics
+from ..utils.tracing import current_span, get_trace_id, span
+from ..config import get_settings
+
+settings = get_settings()
+
+_metrics = get_metrics()
+jobs_total = _metrics.counter("ai_jobs_total", "Finished background jobs", ("kind", "status"))
+job_seconds = _metrics.histogram(
+    "ai_job_seconds", "Background job run time", (1, 2.5, 5, 10, 20, 30, 60, 120, 300), ("kind",)
+)
+job_queue_seconds = _metrics.histogram(
+    "ai_job_queue_seconds", "Time a job waited before a worker picked it up",
+    (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300), ("kind",)
+)
+queue_depth = _metrics.gauge("ai_job_queue_depth", "Jobs waiting for a worker")
+oldest_queued = _metrics.gauge("ai_job_oldest_queued_seconds", "Age of the oldest waiting job")
+running_jobs = _metrics.gauge("ai_job_running", "Jobs currently running")
+
+JOB_KINDS = ["analysis", "department", "performance", "attendance", "workload", "insights", "task"]
+
+
+class JobQueueFull(Exception):
+    """الطابور ممتلئ"""
+
+
+def check_callback_url(url: str) -> str:
+    """
+    callback_url يجب أن يكون http(s) إلى مضيف في LLM_JOB_CALLBACK_HOSTS
+    (حتى لا تُستخدم المهام لطلب عناوين داخلية)
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an absolute http(s) URL")
+    allowed = {host.lower() for host in settings.LLM_JOB_CALLBACK_HOSTS}
+    if parts.hostname.lower() not in allowed:
+        raise ValueError(f"callback_url host is not allowed: {parts.hostname}")
+    return url
+
+
+class JobService:
+    """
+    طابور مهام في الذاكرة مع عدد ثابت من العمال
+
+    النتائج تُحفظ في مخزن محدود الحجم وتُحذف بعد LLM_JOB_RESULT_TTL،
+    ويمكن قراءتها بالاستعلام أو استلامها عبر callback_url.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 100,
+        max_jobs: int = 1000,
+        result_ttl: int = 3600
+    ):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+            logger.info(f"Job workers started: {self.workers}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    # ========== الإرسال والقراءة ==========
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        security_level: int = 1,
+        callback_url: str = None
+    ) -> Dict:
+        """إضافة مهمة للطابور - يرجع سجل المهمة فوراً"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if callback_url:
+            check_callback_url(callback_url)
+
+        self._purge()
+
+        job = {
+            "id": generate_id(),
+            "kind": kind,
+            "status": "queued",
+            "created_at": now(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "callback_url": callback_url,
+            "_payload": payload,
+            "_security_level": security_level,
+            # سياق الطلب (المستخدم/القسم) للجدولة العادلة داخل العامل
+            "_context": dict(get_request_context()),
+            "_span": current_span(),
+            "trace_id": get_trace_id(),
+            "_queued_at": time.monotonic(),
+            "_expires_at": None,
+        }
+
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Job queue is full")
+
+        self.jobs[job["id"]] = job
+        return self.public(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self._purge()
+        job = self.jobs.get(job_id)
+        return self.public(job) if job else None
+
+    @staticmethod
+    def public(job: Dict) -> Dict:
+        """سجل المهمة بدون الحقول الداخلية"""
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def _purge(self):
+        """حذف النتائج المنتهية صلاحيتها ثم الأقدم إذا تجاوز المخزن حده"""
+        current = time.monotonic()
+        for job_id in [j["id"] for j in self.jobs.values()
+                       if j["_expires_at"] and j["_expires_at"] <= current]:
+            del self.jobs[job_id]
+
+        finished = [j["id"] for j in self.jobs.values() if j["_expires_at"]]
+        while len(self.jobs) >= self.max_jobs and finished:
+            del self.jobs[finished.pop(0)]
+
+    # ========== التنفيذ ==========
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} error: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Dict):
+        job["status"] = "running"
+        job["started_at"] = now()
+        job_queue_seconds.observe(time.monotonic() - job["_queued_at"], kind=job["kind"])
+        # سياق المهمة لهذا التنفيذ فقط - لا يبقى المستخدم/القسم للمهمة التالية في نفس العامل
+        token = set_request_context(**job["_context"])
+
+        started = time.monotonic()
+        try:
+            # يكمل trace الطلب الذي أرسل المهمة
+            with span(f"job {job['kind']}", parent=job["_span"], **{"job.id": job["id"]}) as job_span:
+                try:
+                    job["result"] = await self.execute(job["kind"], job["_payload"], job["_security_level"])
+                    job["status"] = "completed"
+                except Exception as e:
+                    logger.error(f"Job {job['id']} ({job['kind']}) failed: {e}")
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+                job_span.set(**{"job.status": job["status"]})
+        finally:
+            reset_request_context(token)
+
+        job["finished_at"] = now()
+        job["_expires_at"] = time.monotonic() + self.result_ttl
+        job_seconds.observe(time.monotonic() - started, kind=job["kind"])
+        jobs_total.inc(kind=job["kind"], status=job["status"])
+
+        if job["callback_url"]:
+            await self._callback(job)
+
+    async def execute(self, kind: str, payload: Dict, security_level: int) -> Any:
+        """تنفيذ عمل من نوع kind مباشرة (بدون الطابور) - جسم الطلب كما في المسار المتزامن"""
+        if kind == "task":
+            task_service = await get_task_service()
+            return await task_service.create_task_from_description(
+                description=payload["description"],
+                context=payload.get("context")
+            )
+
+        analysis_service = await get_analysis_service()
+
+        if kind == "analysis":
+            return await analysis_service.analyze(
+                data=payload["data"],
+                analysis_type=payload["analysis_type"],
+                user_security_level=security_level,
+                context=payload.get("context")
+            )
+        if kind == "department":
+            return await analysis_service.analyze_department(
+                department_data=payload["department_data"],
+                user_security_level=security_level
+            )
+        if kind == "performance":
+            return await analysis_service.analyze_performance(
+                employee_data=payload["employee_data"],
+                period=payload.get("period", "month"),
+                user_security_level=security_level
+            )
+        if kind == "attendance":
+            return await analysis_service.analyze_attendance_trends(
+                attendance_data=payload["attendance_data"],
+                user_security_level=security_level
+            )
+        if kind == "workload":
+            return await analysis_service.analyze_tasks_workload(
+                tasks_data=payload["tasks_data"],
+                user_security_level=security_level
+            )
+        if kind == "insights":
+            insights = await analysis_service.generate_insights(
+                data_type=payload["data_type"],
+                data=payload["data"],
+                user_security_level=security_level
+            )
+            return {"insights": insights, "count": len(insights)}
+
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    async def _callback(self, job: Dict):
+        """إرسال النتيجة لـ callback_url"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(10))
+        try:
+            await self._client.post(job["callback_url"], json=self.public(job))
+        except Exception as e:
+            logger.warning(f"Job {job['id']} callback failed: {e}")
+
+    # ========== الإحصائيات ==========
+
+    def get_stats(self) -> Dict:
+        current = time.monotonic()
+        queued = [j for j in self.jobs.values() if j["status"] == "queued"]
+        by_status: Dict[str, int] = {}
+        for job in self.jobs.values():
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+
+        oldest = max((current - j["_queued_at"] for j in queued), default=0.0)
+
+        # تحديث المقاييس عند كل قراءة (يستدعيها /metrics)
+        queue_depth.set(self.queue.qsize())
+        oldest_queued.set(round(oldest, 3))
+        running_jobs.set(by_status.get("running", 0))
+
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "oldest_queued_seconds": round(oldest, 1),
+            "stored": len(self.jobs),
+            "by_status": by_status
+        }
+
+
+# Singleton
+_job_service = None
+
+async def get_job_service() -> JobService:
+    global _job_service
+    if _job_service is None:
+        _job_service = JobService(
+            workers=settings.LLM_JOB_WORKERS,
+            queue_size=settings.LLM_JOB_QUEUE_SIZE,
+            max_jobs=settings.LLM_JOB_MAX_STORED,
+            result_ttl=settings.LLM_JOB_RESULT_TTL
+        )
+        _job_service.start()
+    return _job_service
+
+
+async def close_job_service():
+    global _job_service
+    if _job_service is not None:
+        await _job_service.stop()
+        _job_service = None
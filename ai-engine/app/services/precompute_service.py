@@ -0,0 +1,535 @@
+"""
+BI Management AI Engine - Precompute Service
+تحليلات لوحات المتابعة محسوبة مسبقاً: تُعاد في أوقات الهدوء أو عند تغير
+البيانات، لكل قسم ولكل مستوى أمان، وتُقدم فوراً مع عمرها
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import time
+from loguru import logger
+
+from .job_service import get_job_service
+from ..models.resilience import track_served_levels
+from ..utils.context import set_request_context
+from ..utils.helpers import now
+from ..utils.metrics import get_metrics
+from ..config import get_settings
+
+settings = get_settings()
+
+# الأنواع التي تطلبها لوحات المتابعة عند فتح الصفحة وحقول جسم الطلب المطلوبة
+PRECOMPUTE_KINDS: Dict[str, Tuple[str, ...]] = {
+    "department": ("department_data",),
+    "attendance": ("attendance_data",),
+    "insights": ("data_type", "data"),
+}
+
+_metrics = get_metrics()
+lookups_total = _metrics.counter(
+    "ai_precompute_lookups_total", "Precomputed result lookups (result=hit/stale/miss)", ("kind", "result")
+)
+regenerations_total = _metrics.counter(
+    "ai_precompute_regenerations_total",
+    "Precomputed analyses regenerated (reason=change/schedule/refresh, status=ok/failed)",
+    ("kind", "reason", "status")
+)
+regeneration_seconds = _metrics.histogram(
+    "ai_precompute_regeneration_seconds", "Time to regenerate one (source, security level) result",
+    (1, 2.5, 5, 10, 20, 30, 60, 120, 300), ("kind",)
+)
+pending_gauge = _metrics.gauge("ai_precompute_pending", "Sources waiting for regeneration")
+
+
+def input_hash(kind: str, payload: Dict) -> str:
+    """بصمة المدخلات (ترتيب المفاتيح لا يهم)"""
+    canonical = json.dumps(
+        {"kind": kind, "payload": payload},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PrecomputeService:
+    """
+    مخزن نتائج التحليل مفهرس بـ (النوع، مستوى الأمان، بصمة المدخلات)
+
+    - المصادر: آخر بيانات لكل (نوع، قسم) يرسلها الـ backend؛ تغير البصمة
+      يجدول إعادة الحساب لكل مستويات الأمان فوراً
+    - في ساعات الهدوء تُعاد النتائج الأقدم من refresh_after
+    - مسارات /analysis/* تبحث بالبصمة: نفس البيانات = رد فوري بدون النموذج؛
+      مدخلات لا تطابق مصدراً مسجلاً تبقى adhoc_max_age فقط
+    - لا يُخزن إلا رد النموذج الأساسي غير الفارغ (لا البديل ولا النموذج
+      الأصغر ولا المهلة) حتى لا يُقدم تحليل سيئ طوال max_age
+    """
+
+    def __init__(
+        self,
+        levels: List[int] = None,
+        refresh_after: int = 21600,
+        max_age: int = 86400,
+        off_peak_hours: List[int] = None,
+        interval: int = 300,
+        max_entries: int = 2000,
+        path: str = "",
+        on_change: bool = True,
+        enabled: bool = True,
+        adhoc_max_age: int = 900
+    ):
+        self.levels = sorted(set(levels or [1, 2, 3, 4, 5]))
+        self.refresh_after = refresh_after
+        self.max_age = max_age
+        self.off_peak_hours = set(off_peak_hours if off_peak_hours is not None else range(0, 6))
+        self.interval = interval
+        self.max_entries = max_entries
+        self.path = path
+        self.on_change = on_change
+        self.enabled = enabled
+        self.adhoc_max_age = adhoc_max_age
+
+        # "kind:department" -> {"kind", "department", "payload", "input_hash", "updated_at", "latest": {level: key}}
+        self.sources: Dict[str, Dict] = {}
+        # "kind:level:hash" -> {"result", "input_hash", "generated_at", "_generated", "seconds", "max_age"?}
+        self.results: "OrderedDict[str, Dict]" = OrderedDict()
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Dict[str, str] = {}  # source key -> reason
+        self._inflight: Dict[str, asyncio.Task] = {}  # result key -> حساب جارٍ
+        self._tasks: List[asyncio.Task] = []
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.regenerated = 0
+        self.failures = 0
+        self.rejected = 0  # نتائج لم تُخزن (بديل/نموذج أصغر/رد فارغ)
+
+    @staticmethod
+    def _source_key(kind: str, department: str) -> str:
+        return f"{kind}:{department}"
+
+    @staticmethod
+    def _result_key(kind: str, level: int, digest: str) -> str:
+        return f"{kind}:{level}:{digest}"
+
+    @staticmethod
+    def validate(kind: str, payload: Dict):
+        """ValueError إذا كان النوع غير مدعوم أو ينقص الجسم حقل مطلوب"""
+        if kind not in PRECOMPUTE_KINDS:
+            raise ValueError(f"Unknown precompute kind: {kind}")
+        missing = [field for field in PRECOMPUTE_KINDS[kind] if field not in payload]
+        if missing:
+            raise ValueError(f"Missing fields for {kind}: {', '.join(missing)}")
+
+    def start(self):
+        if not self._tasks:
+            self.load()
+            self._tasks = [asyncio.create_task(self._worker()), asyncio.create_task(self._loop())]
+            logger.info(
+                f"Precompute scheduler started: {len(self.sources)} sources, "
+                f"off-peak hours {sorted(self.off_peak_hours)}"
+            )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.save()
+
+    # ========== المصادر ==========
+
+    def set_source(self, kind: str, department: str, payload: Dict) -> Dict:
+        """تسجيل/تحديث بيانات مصدر - يجدول إعادة الحساب إذا تغيرت البصمة"""
+        self.validate(kind, payload)
+        key = self._source_key(kind, department)
+        digest = input_hash(kind, payload)
+
+        source = self.sources.get(key)
+        changed = source is None or source["input_hash"] != digest
+        if changed:
+            self.sources[key] = {
+                "kind": kind,
+                "department": department,
+                "payload": payload,
+                "input_hash": digest,
+                "updated_at": now(),
+                # النتائج السابقة تبقى تُقدم (stale) حتى تكتمل الجديدة
+                "latest": dict(source["latest"]) if source else {},
+            }
+
+        scheduled = changed and self.on_change and self.schedule(kind, department, reason="change") > 0
+        return {
+            "kind": kind,
+            "department": department,
+            "input_hash": digest,
+            "changed": changed,
+            "scheduled": scheduled
+        }
+
+    def remove_source(self, kind: str, department: str) -> bool:
+        return self.sources.pop(self._source_key(kind, department), None) is not None
+
+    def schedule(self, kind: str = None, department: str = None, reason: str = "refresh") -> int:
+        """جدولة إعادة حساب المصادر المطابقة (كل المستويات) - يرجع عدد المصادر المضافة"""
+        if not self._tasks:
+            # المجدول متوقف (PRECOMPUTE_ENABLED=false) - الحساب عند الطلب فقط
+            return 0
+        count = 0
+        for key, source in self.sources.items():
+            if kind and source["kind"] != kind:
+                continue
+            if department and source["department"] != department:
+                continue
+            if key in self._pending:
+                continue
+            self._pending[key] = reason
+            self._queue.put_nowait(key)
+            count += 1
+        pending_gauge.set(len(self._pending))
+        return count
+
+    # ========== المخزن ==========
+
+    def _age(self, entry: Dict) -> float:
+        return max(0.0, time.time() - entry["_generated"])
+
+    def _metadata(self, entry: Dict, hit: bool, current_hash: str = None) -> Dict:
+        age = self._age(entry)
+        outdated = current_hash is not None and current_hash != entry["input_hash"]
+        return {
+            "hit": hit,
+            "input_hash": entry["input_hash"][:16],
+            "generated_at": entry["generated_at"],
+            "age_seconds": int(age),
+            "stale": outdated or age > self.refresh_after,
+        }
+
+    def _is_source(self, kind: str, digest: str) -> bool:
+        return any(s["kind"] == kind and s["input_hash"] == digest for s in self.sources.values())
+
+    @staticmethod
+    def _usable(result: Any, levels: List[str]) -> bool:
+        """الرد من النموذج الأساسي فقط (levels فارغة = من cache الردود) وغير فارغ"""
+        if not levels or any(level != "primary" for level in levels):
+            return False
+        if isinstance(result, dict):
+            return bool(result.get("analysis") or result.get("insights"))
+        return bool(result)
+
+    @staticmethod
+    def _entry(result: Any, digest: str, seconds: float) -> Dict:
+        return {
+            "result": result,
+            "input_hash": digest,
+            "generated_at": now(),
+            "_generated": time.time(),
+            "seconds": round(seconds, 3),
+        }
+
+    def _store(self, kind: str, level: int, digest: str, entry: Dict, max_age: int = None):
+        key = self._result_key(kind, level, digest)
+        if max_age is not None:
+            entry["max_age"] = max_age
+        self.results[key] = entry
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+    def _expired(self, entry: Dict) -> bool:
+        return self._age(entry) > entry.get("max_age", self.max_age)
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        entry = self.results.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self.results[key]
+            return None
+        self.results.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _with_metadata(result: Any, metadata: Dict) -> Dict:
+        response = dict(result) if isinstance(result, dict) else {"result": result}
+        response["precomputed"] = metadata
+        return response
+
+    async def _compute(self, kind: str, payload: Dict, level: int, digest: str, max_age: int = None) -> Dict:
+        """
+        حساب النتيجة وتخزينها - الطلبات المتزامنة لنفس المفتاح تنتظر نفس الحساب
+
+        النتيجة التي لا تصلح للتخزين تُرجع مع "_stored": False.
+        """
+        key = self._result_key(kind, level, digest)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute_and_store(kind, payload, level, digest, max_age))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # انقطاع أحد المنتظرين لا يلغي الحساب على الباقين
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, kind: str, payload: Dict, level: int, digest: str,
+                                 max_age: int = None) -> Dict:
+        started = time.monotonic()
+        job_service = await get_job_service()
+        with track_served_levels() as levels:
+            result = await job_service.execute(kind, payload, level)
+        entry = self._entry(result, digest, time.monotonic() - started)
+
+        if not self._usable(result, levels):
+            self.rejected += 1
+            logger.warning(
+                f"Precompute {kind} (level {level}) not stored: "
+                f"served by {', '.join(levels) or 'response cache'}"
+            )
+            entry["_stored"] = False
+            return entry
+
+        self._store(kind, level, digest, entry, max_age)
+        return entry
+
+    async def get_or_compute(self, kind: str, payload: Dict, security_level: int, refresh: bool = False) -> Dict:
+        """
+        نتيجة مسار /analysis/* - من المخزن إن سبق حسابها لنفس البيانات والمستوى
+
+        refresh=True يتجاهل المخزن ويحسب من جديد (ويحدّث المخزن).
+        مدخلات لا تطابق مصدراً مسجلاً تُخزن adhoc_max_age ثانية فقط.
+        إذا كان الحساب المسبق معطلاً تُحسب النتيجة مباشرة بدون المخزن.
+        """
+        if not self.enabled:
+            job_service = await get_job_service()
+            return await job_service.execute(kind, payload, security_level)
+
+        digest = input_hash(kind, payload)
+        key = self._result_key(kind, security_level, digest)
+
+        entry = None if refresh else self._lookup(key)
+        if entry is not None:
+            metadata = self._metadata(entry, hit=True)
+            self._count(kind, "stale" if metadata["stale"] else "hit")
+            return self._with_metadata(entry["result"], metadata)
+
+        self._count(kind, "miss")
+        max_age = None if self._is_source(kind, digest) else self.adhoc_max_age
+        entry = await self._compute(kind, payload, security_level, digest, max_age)
+        return self._with_metadata(entry["result"], self._metadata(entry, hit=False))
+
+    async def get(self, kind: str, department: str, security_level: int, refresh: bool = False) -> Optional[Dict]:
+        """
+        آخر نتيجة لمصدر مسجل (None إذا لم يُسجل)
+
+        إذا كانت البيانات تغيرت ولم تُحسب بعد تُرجع النتيجة السابقة مع stale=True؛
+        بدون أي نتيجة (أو مع refresh) تُحسب الآن.
+        """
+        source = self.sources.get(self._source_key(kind, department))
+        if source is None:
+            return None
+
+        entry = None
+        if not refresh:
+            latest = source["latest"].get(str(security_level))
+            entry = self._lookup(latest) if latest else None
+
+        if entry is not None:
+            metadata = self._metadata(entry, hit=True, current_hash=source["input_hash"])
+            self._count(kind, "stale" if metadata["stale"] else "hit")
+            return self._with_metadata(entry["result"], metadata)
+
+        self._count(kind, "miss")
+        entry = await self._regenerate(source, security_level, "refresh" if refresh else "change")
+        return self._with_metadata(entry["result"], self._metadata(entry, hit=False))
+
+    def _count(self, kind: str, result: str):
+        if result == "hit":
+            self.hits += 1
+        elif result == "stale":
+            self.stale_hits += 1
+        else:
+            self.misses += 1
+        lookups_total.inc(kind=kind, result=result)
+
+    # ========== إعادة الحساب ==========
+
+    def is_off_peak(self, moment: datetime = None) -> bool:
+        return (moment or datetime.now()).hour in self.off_peak_hours
+
+    def _needs_refresh(self, source: Dict) -> bool:
+        for level in self.levels:
+            latest = source["latest"].get(str(level))
+            entry = self.results.get(latest) if latest else None
+            if entry is None or entry["input_hash"] != source["input_hash"]:
+                return True
+            if self._age(entry) > self.refresh_after:
+                return True
+        return False
+
+    async def _regenerate(self, source: Dict, level: int, reason: str) -> Dict:
+        kind = source["kind"]
+        digest = source["input_hash"]
+        try:
+            entry = await self._compute(kind, source["payload"], level, digest)
+        except Exception:
+            self.failures += 1
+            regenerations_total.inc(kind=kind, reason=reason, status="failed")
+            raise
+
+        if not entry.get("_stored", True):
+            # النتيجة السابقة (إن وُجدت) تبقى تُقدم حتى تنجح إعادة الحساب
+            self.failures += 1
+            regenerations_total.inc(kind=kind, reason=reason, status="failed")
+            return entry
+
+        # البيانات قد تتغير أثناء الحساب - لا نربط نتيجة قديمة بالمصدر
+        current = self.sources.get(self._source_key(kind, source["department"]))
+        if current is not None and current["input_hash"] == digest:
+            current["latest"][str(level)] = self._result_key(kind, level, digest)
+        self.regenerated += 1
+        regenerations_total.inc(kind=kind, reason=reason, status="ok")
+        regeneration_seconds.observe(entry["seconds"], kind=kind)
+        return entry
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            reason = self._pending.pop(key, "refresh")
+            pending_gauge.set(len(self._pending))
+            source = self.sources.get(key)
+            if source is None:
+                continue
+
+            # مستخدم خاص حتى لا تزاحم إعادة الحساب حصة مستخدم حقيقي في المجدول العادل
+            set_request_context(route="precompute", user_id="precompute", department=source["department"])
+            for level in self.levels:
+                try:
+                    await self._regenerate(source, level, reason)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Precompute {key} (level {level}) failed: {e}")
+            await asyncio.to_thread(self.save)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.is_off_peak():
+                continue
+            stale = [s for s in self.sources.values() if self._needs_refresh(s)]
+            for source in stale:
+                self.schedule(source["kind"], source["department"], reason="schedule")
+            if stale:
+                logger.info(f"Off-peak precompute: {len(stale)} sources scheduled")
+
+    # ========== الحفظ ==========
+
+    def load(self):
+        """تحميل المصادر والنتائج من القرص"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not load precomputed results from {self.path}: {e}")
+            return
+
+        self.sources = data.get("sources", {})
+        for key, entry in data.get("results", []):
+            if not self._expired(entry):
+                self.results[key] = entry
+
+    def save(self):
+        """حفظ المصادر والنتائج (كتابة ذرية)"""
+        if not self.path:
+            return
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"sources": self.sources, "results": list(self.results.items())},
+                    f, ensure_ascii=False, default=str
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save precomputed results to {self.path}: {e}")
+
+    # ========== الإحصائيات ==========
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        sources = []
+        for source in self.sources.values():
+            ages = [
+                int(self._age(self.results[key]))
+                for key in source["latest"].values() if key in self.results
+            ]
+            sources.append({
+                "kind": source["kind"],
+                "department": source["department"],
+                "input_hash": source["input_hash"][:16],
+                "updated_at": source["updated_at"],
+                "levels_ready": len(ages),
+                "oldest_seconds": max(ages) if ages else None,
+                "pending": self._source_key(source["kind"], source["department"]) in self._pending,
+            })
+
+        return {
+            "levels": self.levels,
+            "off_peak_hours": sorted(self.off_peak_hours),
+            "off_peak_now": self.is_off_peak(),
+            "refresh_after": self.refresh_after,
+            "max_age": self.max_age,
+            "results": len(self.results),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "regenerated": self.regenerated,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "adhoc_max_age": self.adhoc_max_age,
+            "sources": sources
+        }
+
+
+# Singleton
+_precompute_service = None
+
+async def get_precompute_service() -> PrecomputeService:
+    global _precompute_service
+    if _precompute_service is None:
+        _precompute_service = PrecomputeService(
+            levels=settings.PRECOMPUTE_SECURITY_LEVELS,
+            refresh_after=settings.PRECOMPUTE_REFRESH_AFTER,
+            max_age=settings.PRECOMPUTE_MAX_AGE,
+            off_peak_hours=settings.PRECOMPUTE_OFF_PEAK_HOURS,
+            interval=settings.PRECOMPUTE_CHECK_INTERVAL,
+            max_entries=settings.PRECOMPUTE_MAX_ENTRIES,
+            path=settings.PRECOMPUTE_PATH,
+            on_change=settings.PRECOMPUTE_ON_CHANGE,
+            enabled=settings.PRECOMPUTE_ENABLED,
+            adhoc_max_age=settings.PRECOMPUTE_ADHOC_MAX_AGE
+        )
+        if settings.PRECOMPUTE_ENABLED:
+            _precompute_service.start()
+    return _precompute_service
+
+
+async def close_precompute_service():
+    global _precompute_service
+    if _precompute_service is not None:
+        await _precompute_service.stop()
+        _precompute_service = None
@@ -0,0 +1,189 @@
+"""
+BI Management AI Engine - Quick Replies
+ردود جاهزة للأسئلة البسيطة (تحية، طريقة طلب إجازة، تسجيل الحضور) بدون استدعاء النموذج
+"""
+
+from typing import Dict, List, Optional
+import re
+
+from ..utils.security import SecurityService
+from ..utils.helpers import normalize_arabic, get_greeting
+from ..utils.metrics import get_metrics
+from ..config import get_settings
+
+settings = get_settings()
+
+_metrics = get_metrics()
+quick_reply_total = _metrics.counter(
+    "ai_chat_quick_reply_total",
+    "Chat messages checked against the quick-reply table by intent and outcome",
+    ("intent", "outcome")
+)
+
+# كلمات لا تغير معنى السؤال (بعد التطبيع)
+FILLER_WORDS = {
+    "انا", "ممكن", "لو", "سمحت", "من", "في", "على", "عن", "الى", "هل", "يا", "و",
+    "شكرا", "اريد", "ابي", "اعرف", "لي", "استطيع", "يمكنني", "عندي", "اخي", "استاذ",
+    "please", "can", "i", "do", "does", "the", "a", "an", "to", "my", "me", "is",
+    "what", "should", "there", "you", "tell", "thanks",
+}
+
+HOW_WORDS = {"كيف", "كيفيه", "طريقه", "شلون", "خطوات", "how", "steps", "way"}
+
+# الجدول: كلمات تفعيل (واحدة على الأقل)، كلمات مسموحة، والرد.
+# intents: ما يسمح به analyze_query_intent - أي نية أخرى (مهمة، شكوى...) تعني أن
+# السؤال أوسع من الرد الجاهز.
+QUICK_REPLIES = {
+    "greeting": {
+        "intents": {"greeting", "question", "help"},
+        "triggers": {
+            "مرحبا", "اهلا", "هلا", "السلام", "صباح", "مساء",
+            "hello", "hi", "hey", "morning", "evening",
+        },
+        "words": {"عليكم", "الخير", "النور", "وسهلا", "حالك", "الحال", "good", "there", "are"},
+        "requires_how": False,
+        "max_words": 5,
+        "min_confidence": 0.8,
+        "response": "{greeting} {name}! أنا Bi Assistant، كيف يمكنني مساعدتك اليوم؟",
+    },
+    "leave_howto": {
+        "intents": {"vacation", "help", "question", "greeting"},
+        "triggers": {"اجازه", "اجازات", "اجازتي", "عطله", "leave", "vacation"},
+        "words": {
+            "اتقدم", "اقدم", "تقديم", "اطلب", "طلب", "بطلب", "اسوي", "اعمل", "اخذ",
+            "request", "apply", "submit", "take", "for", "get", "ask",
+        },
+        "requires_how": True,
+        "max_words": 10,
+        "min_confidence": 0.75,
+        "response": (
+            "لتقديم طلب إجازة:\n"
+            "1. افتح صفحة الإجازات من القائمة الجانبية\n"
+            "2. اضغط \"طلب إجازة\"\n"
+            "3. اختر نوع الإجازة وحدد تاريخ البداية والنهاية واكتب السبب\n"
+            "4. أرسل الطلب - يبقى \"قيد الانتظار\" حتى يوافق عليه مديرك أو الموارد البشرية"
+        ),
+    },
+    "attendance_howto": {
+        "intents": {"attendance", "help", "question", "greeting"},
+        "triggers": {"حضور", "حضوري", "الحضور", "انصراف", "الانصراف", "بصمه", "attendance"},
+        "phrases": {"check in", "check out", "clock in", "clock out"},
+        "words": {
+            "اسجل", "تسجيل", "سجل", "اثبت", "ابصم", "check", "clock", "in", "out",
+            "register", "record", "mark",
+        },
+        "requires_how": True,
+        "max_words": 8,
+        "min_confidence": 0.75,
+        "response": (
+            "لتسجيل الحضور والانصراف:\n"
+            "1. افتح صفحة \"الحضور والانصراف\" من القائمة\n"
+            "2. سجّل حضورك عند بداية الدوام وانصرافك عند نهايته\n"
+            "3. تابع سجلك من تبويب \"حضوري\"\n"
+            "إذا نسيت التسجيل أو ظهر خطأ في سجلك تواصل مع الموارد البشرية."
+        ),
+    },
+}
+
+
+class QuickReplyRouter:
+    """
+    يقرر إذا كانت الرسالة بسيطة بما يكفي لرد جاهز
+
+    الثقة = نسبة كلمات الرسالة المفهومة من جدول النية (كلمات التفعيل +
+    الكلمات المسموحة + كلمات الحشو). أي كلمة غير معروفة تعني أن السؤال
+    قد يحتاج للنموذج.
+    """
+
+    def __init__(self, security: SecurityService, table: Dict = None):
+        self.security = security
+        self.table = table or QUICK_REPLIES
+        self.checked = 0
+        self.hits: Dict[str, int] = {}
+        self.candidates: Dict[str, int] = {}
+
+    @staticmethod
+    def _words(message: str) -> List[str]:
+        return re.findall(r"\w+", normalize_arabic(message.lower()))
+
+    def classify(self, message: str) -> Optional[Dict]:
+        """أفضل نية مرشحة مع درجة الثقة (أو None)"""
+        words = self._words(message)
+        if not words:
+            return None
+
+        detected = set(self.security.analyze_query_intent(message)["intents"])
+        best = None
+
+        for intent, entry in self.table.items():
+            if len(words) > entry["max_words"]:
+                continue
+            if detected - entry["intents"]:
+                continue
+
+            text = " ".join(words)
+            triggered = (
+                any(w in entry["triggers"] for w in words)
+                or any(p in text for p in entry.get("phrases", ()))
+            )
+            if not triggered:
+                continue
+            if entry["requires_how"] and not any(w in HOW_WORDS for w in words):
+                continue
+
+            known = entry["triggers"] | entry["words"] | FILLER_WORDS | HOW_WORDS
+            confidence = sum(1 for w in words if w in known) / len(words)
+
+            if best is None or confidence > best["confidence"]:
+                best = {"intent": intent, "confidence": round(confidence, 3)}
+
+        return best
+
+    def reply(self, message: str, user_info: Dict) -> Optional[Dict]:
+        """الرد الجاهز إذا كانت الثقة كافية - وإلا None (يذهب للنموذج)"""
+        self.checked += 1
+        match = self.classify(message)
+        if match is None:
+            return None
+
+        intent = match["intent"]
+        entry = self.table[intent]
+        self.candidates[intent] = self.candidates.get(intent, 0) + 1
+
+        threshold = max(entry["min_confidence"], settings.CHAT_QUICK_REPLY_MIN_CONFIDENCE)
+        if match["confidence"] < threshold:
+            quick_reply_total.inc(intent=intent, outcome="low_confidence")
+            return None
+
+        self.hits[intent] = self.hits.get(intent, 0) + 1
+        quick_reply_total.inc(intent=intent, outcome="hit")
+
+        response = entry["response"].format(
+            greeting=get_greeting(),
+            name=user_info.get("full_name", "")
+        ).replace(" !", "!")
+
+        return {**match, "response": response}
+
+    def get_stats(self) -> Dict:
+        hits = sum(self.hits.values())
+        return {
+            "checked": self.checked,
+            "hits": hits,
+            "hit_rate": round(hits / self.checked, 4) if self.checked else 0.0,
+            "intents": {
+                intent: {
+                    "candidates": self.candidates.get(intent, 0),
+                    "hits": self.hits.get(intent, 0),
+                    # نسبة المرشحين الذين تجاوزوا حد الثقة
+                    "hit_rate": round(
+                        self.hits.get(intent, 0) / self.candidates[intent], 4
+                    ) if self.candidates.get(intent) else 0.0,
+                    # نسبة كل الرسائل التي أجيبت بهذه النية
+                    "share": round(
+                        self.hits.get(intent, 0) / self.checked, 4
+                    ) if self.checked else 0.0,
+                }
+                for intent in self.table
+            }
+        }
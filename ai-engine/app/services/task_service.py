@@ -10,6 +10,7 @@ from loguru import logger
 
 from ..models.llm import get_llm
 from ..utils.helpers import generate_id, extract_json_from_text
+from ..utils.tracing import traced
 from ..config import get_settings
 
 settings = get_settings()
@@ -56,13 +57,16 @@ class TaskService:
         Returns:
             Task object with suggested values
         """
-        prompt = self.prompt_template.format(
-            task_description=description,
-            context=json.dumps(context or {}, ensure_ascii=False)
-        )
+        prompt = self._build_prompt(description, context)
         
         llm = await get_llm()
-        response = await llm.generate(prompt, temperature=0.3)
+        response = await llm.generate(
+            prompt,
+            temperature=0.3,
+            priority="task",
+            service="TaskService",
+            operation="TaskService.create_task"
+        )
         
         # استخراج JSON من الرد
         task = extract_json_from_text(response)
@@ -81,6 +85,17 @@ class TaskService:
         
         return task
     
+    @traced("task.build_prompt")
+    def _build_prompt(self, description: str, context: Dict = None) -> str:
+        """
+        بناء الـ prompt - القالب يضع الوصف والسياق في النهاية
+        حتى تبقى بدايته مشتركة بين كل الطلبات
+        """
+        return self.prompt_template.format(
+            task_description=description,
+            context=json.dumps(context or {}, ensure_ascii=False)
+        )
+    
     def _parse_task_manually(self, description: str, response: str) -> Dict:
         """تحليل يدوي للمهمة إذا فشل JSON"""
         # تحليل بسيط
@@ -0,0 +1,29 @@
+"""
+BI Management AI Engine - Request Context
+معلومات الطلب الحالي (المستخدم والقسم) متاحة لكل الطبقات
+"""
+
+from contextvars import ContextVar, Token
+from typing import Dict, Optional
+
+_request_context: ContextVar[Dict] = ContextVar("request_context", default={})
+
+
+def set_request_context(**values) -> Token:
+    """تعيين معلومات الطلب الحالي (تُدمج مع الموجود) - يرجع token للإرجاع"""
+    return _request_context.set({**_request_context.get(), **values})
+
+
+def reset_request_context(token: Token) -> None:
+    """إرجاع معلومات الطلب لما كانت عليه قبل set_request_context"""
+    _request_context.reset(token)
+
+
+def get_request_context() -> Dict:
+    """معلومات الطلب الحالي"""
+    return _request_context.get()
+
+
+def get_context_value(key: str, default: Optional[str] = None) -> Optional[str]:
+    """قيمة واحدة من معلومات الطلب الحالي"""
+    return _request_context.get().get(key, default)
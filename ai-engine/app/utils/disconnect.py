@@ -0,0 +1,82 @@
+"""
+BI Management AI Engine - Client Disconnect
+إلغاء معالجة الطلب عندما يقطع العميل الاتصال (بدل إكمال توليد لن يقرأه أحد)
+"""
+
+import asyncio
+from loguru import logger
+
+from .metrics import get_metrics
+
+client_disconnects = get_metrics().counter(
+    "ai_client_disconnects_total",
+    "Requests cancelled because the client disconnected before the response finished",
+    ("route",)
+)
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware: يراقب http.disconnect بعد استلام جسم الطلب ويلغي مهمة
+    المعالجة. الإلغاء يصل حتى طلب httpx نحو Ollama فيُغلق الاتصال ويتوقف
+    التوليد.
+
+    المسارات المتدفقة تستلم http.disconnect كالمعتاد من receive.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/ai"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        body_done = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_done = False
+
+        async def wrapped_receive():
+            if body_done.is_set():
+                # الجسم انتهى - المراقب هو من يقرأ receive الآن
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_done.set()
+            return message
+
+        async def wrapped_send(message):
+            nonlocal response_done
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        app_task = asyncio.ensure_future(self.app(scope, wrapped_receive, wrapped_send))
+
+        async def watch():
+            await body_done.wait()
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    if not response_done and not app_task.done():
+                        client_disconnects.inc(route=scope["path"])
+                        logger.info(f"Client disconnected - cancelling {scope['path']}")
+                        app_task.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            # ألغيناه نحن (العميل غادر) - لا أحد ينتظر الرد
+            if not disconnected.is_set():
+                app_task.cancel()
+                raise
+        finally:
+            watcher.cancel()
@@ -164,6 +164,24 @@ def get_greeting() -> str:
         return "مرحباً"
 
 
+def percentile(values: List[float], q: float) -> float:
+    """النسبة المئوية q (0-100) من قائمة قيم (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    تقدير عدد التوكنات بدون tokenizer: ~4 أحرف لاتينية/أرقام للتوكن
+    و~2 حرف عربي للتوكن (تقدير متحفظ لنماذج Llama/Qwen)
+    """
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii // 2 + 1
+
+
 def estimate_reading_time(text: str) -> int:
     """تقدير وقت القراءة بالثواني"""
     words = len(text.split())
@@ -0,0 +1,66 @@
+"""
+BI Management AI Engine - Load Shedding
+رد 503 فوري مع Retry-After بدل انتظار طابور لن ينتهي قبل المهلة
+"""
+
+from loguru import logger
+from starlette.responses import JSONResponse
+
+DEADLINE_HEADER = b"x-request-deadline"
+
+
+class LoadShedMiddleware:
+    """
+    ASGI middleware: يسأل controller قبل تمرير طلب POST
+
+    controller.admit(path, deadline) يرجع None (مسار لا يصل للنموذج) أو
+    قراراً فيه admitted و retry_after، و controller.release(priority) يُستدعى
+    عند انتهاء الطلب المقبول. المهلة من هيدر x-request-deadline (ثوانٍ)
+    إن أرسلها الـ backend.
+    """
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    @staticmethod
+    def _deadline(scope) -> float:
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER:
+                try:
+                    return max(0.0, float(value.decode()))
+                except ValueError:
+                    return 0.0
+        return 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        decision = self.controller.admit(scope["path"], self._deadline(scope) or None)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not decision["admitted"]:
+            logger.warning(
+                f"Shedding {scope['path']}: expected {decision['expected_seconds']:.1f}s "
+                f"> deadline {decision['deadline']:.0f}s"
+            )
+            response = JSONResponse(
+                status_code=503,
+                content={
+                    "detail": "الخدمة مشغولة حالياً، يرجى المحاولة بعد قليل",
+                    "retry_after": decision["retry_after"],
+                    "expected_seconds": decision["expected_seconds"],
+                },
+                headers={"Retry-After": str(decision["retry_after"])}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(decision["priority"])
@@ -0,0 +1,271 @@
+"""
+BI Management AI Engine - Prompt Data Serializer
+تحويل البيانات لنص مختصر داخل الـ prompt مع احترام حد التوكنات
+"""
+
+from typing import Any, Dict, List, Tuple
+import json
+import math
+
+from .helpers import estimate_tokens
+
+REDACTED = "[محجوب]"
+
+# أحرف قصيرة للمفاتيح المتكررة (a, b, ..., z, aa, ab, ...)
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+# أقصر نص يُقصر إليه عنصر ضخم قبل حذف العنصر نفسه
+_MIN_TEXT = 16
+
+
+def _alias(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = _ALPHABET[rem] + name
+    return name
+
+
+def drop_redacted(data: Any) -> Tuple[Any, int]:
+    """حذف الحقول المحجوبة (لا فائدة منها للنموذج) - يرجع (البيانات، عدد المحذوف)"""
+    if isinstance(data, dict):
+        result, dropped = {}, 0
+        for key, value in data.items():
+            if value == REDACTED:
+                dropped += 1
+                continue
+            result[key], n = drop_redacted(value)
+            dropped += n
+        return result, dropped
+    if isinstance(data, list):
+        result, dropped = [], 0
+        for item in data:
+            item, n = drop_redacted(item)
+            result.append(item)
+            dropped += n
+        return result, dropped
+    return data, 0
+
+
+def _count_keys(data: Any, counts: Dict[str, int]):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            counts[key] = counts.get(key, 0) + 1
+            _count_keys(value, counts)
+    elif isinstance(data, list):
+        for item in data:
+            _count_keys(item, counts)
+
+
+def key_aliases(data: Any) -> Dict[str, str]:
+    """
+    اختصار المفاتيح المتكررة عندما يوفر الاختصار أكثر من كلفة تعريفه
+
+    Returns:
+        {المفتاح الأصلي: الاختصار}
+    """
+    counts: Dict[str, int] = {}
+    _count_keys(data, counts)
+
+    aliases = {}
+    # الأكثر توفيراً يأخذ أقصر اختصار
+    for key, count in sorted(counts.items(), key=lambda kv: -len(kv[0]) * kv[1]):
+        alias = _alias(len(aliases))
+        # تعريف الاختصار في المفتاح: "a":"key",
+        saved = (len(key) - len(alias)) * count - (len(key) + len(alias) + 6)
+        if count > 1 and saved > 0:
+            aliases[key] = alias
+    return aliases
+
+
+def apply_aliases(data: Any, aliases: Dict[str, str]) -> Any:
+    if isinstance(data, dict):
+        return {aliases.get(k, k): apply_aliases(v, aliases) for k, v in data.items()}
+    if isinstance(data, list):
+        return [apply_aliases(item, aliases) for item in data]
+    return data
+
+
+def _is_rows(data: Dict) -> bool:
+    """
+    قاموس صفوف (مثل {موظف: {...}}) يُعامل كقائمة عند العد والعينة
+
+    فقط إذا كانت كل القيم سجلات بنفس المفاتيح - قاموس أقسام مثل
+    {"employees": [...], "tasks": [...]} ليس صفوفاً وتُقلص كل قائمة داخله.
+    """
+    if len(data) < 2:
+        return False
+    values = list(data.values())
+    if not all(isinstance(v, dict) for v in values):
+        return False
+    keys = set(values[0])
+    return bool(keys) and all(set(v) == keys for v in values[1:])
+
+
+def count_items(data: Any) -> int:
+    """عدد الصفوف (عناصر القوائم وقواميس الصفوف) في كل المستويات"""
+    if isinstance(data, dict):
+        rows = len(data) if _is_rows(data) else 0
+        return rows + sum(count_items(v) for v in data.values())
+    if isinstance(data, list):
+        return len(data) + sum(count_items(v) for v in data)
+    return 0
+
+
+def _evenly(items: List, keep: int) -> List:
+    """عينة موزعة بالتساوي (تشمل الأول والأخير) - تحافظ على الترتيب الزمني"""
+    if keep >= len(items):
+        return items
+    if keep <= 1:
+        return items[:1]
+    step = (len(items) - 1) / (keep - 1)
+    return [items[round(i * step)] for i in range(keep)]
+
+
+def sample(data: Any, ratio: float) -> Any:
+    """تقليص كل قائمة (وكل قاموس صفوف) لنسبة ratio من عناصره"""
+    if isinstance(data, list):
+        kept = _evenly(data, max(1, math.ceil(len(data) * ratio)))
+        return [sample(item, ratio) for item in kept]
+    if isinstance(data, dict):
+        # قاموس الصفوف يُقلص كالقائمة، أما الحقول البسيطة فتبقى
+        if _is_rows(data):
+            keys = _evenly(list(data), max(1, math.ceil(len(data) * ratio)))
+            return {k: sample(data[k], ratio) for k in keys}
+        return {k: sample(v, ratio) for k, v in data.items()}
+    return data
+
+
+def _drop_one(data: Any, keep: int) -> bool:
+    """حذف عنصر من وسط أكبر قائمة (بحجم النص) فيها أكثر من keep عنصر"""
+    found = []
+
+    def collect(node: Any):
+        if isinstance(node, list):
+            if len(node) > keep:
+                found.append(node)
+            for item in node:
+                collect(item)
+        elif isinstance(node, dict):
+            if _is_rows(node) and len(node) > keep:
+                found.append(node)
+            for value in node.values():
+                collect(value)
+
+    collect(data)
+    if not found:
+        return False
+    largest = max(found, key=lambda node: len(_dumps(node)))
+    middle = len(largest) // 2
+    if isinstance(largest, list):
+        del largest[middle]
+    else:
+        del largest[list(largest)[middle]]
+    return True
+
+
+def _longest_text(data: Any) -> int:
+    if isinstance(data, str):
+        return len(data)
+    if isinstance(data, dict):
+        return max((_longest_text(v) for v in data.values()), default=0)
+    if isinstance(data, list):
+        return max((_longest_text(v) for v in data), default=0)
+    return 0
+
+
+def _cut_texts(data: Any, limit: int) -> Any:
+    """تقصير كل نص أطول من limit حرف"""
+    if isinstance(data, str):
+        return data[:limit] + "…" if len(data) > limit else data
+    if isinstance(data, dict):
+        return {k: _cut_texts(v, limit) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_cut_texts(item, limit) for item in data]
+    return data
+
+
+def _fit(data: Any, prefix: str, budget: int) -> Tuple[Any, str]:
+    """
+    تقليص العينة حتى يتسع النص (يبقى JSON صالحاً): حذف عناصر مع إبقاء عنصر
+    من كل قائمة، ثم تقصير النصوص الطويلة، ثم حذف ما تبقى
+    """
+    def fits(candidate: Any) -> bool:
+        return estimate_tokens(prefix + _dumps(candidate)) <= budget
+
+    while not fits(data) and _drop_one(data, keep=1):
+        pass
+
+    limit = _longest_text(data)
+    while not fits(data) and limit > _MIN_TEXT:
+        limit //= 2
+        data = _cut_texts(data, limit)
+
+    while not fits(data) and _drop_one(data, keep=0):
+        pass
+
+    return data, _dumps(data)
+
+
+def _sample_note(kept: int, total: int) -> str:
+    return f"(عينة موزعة: {kept} من {total} صف)\n"
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def serialize_for_prompt(data: Any, token_budget: int) -> Tuple[str, Dict]:
+    """
+    نص البيانات للـ prompt: JSON مضغوط، مفاتيح مختصرة، بدون الحقول المحجوبة،
+    ومقلص بعينة موزعة إذا تجاوز token_budget
+
+    Returns:
+        (النص، معلومات: truncated, items, kept_items, estimated_tokens, ...)
+    """
+    data, dropped = drop_redacted(data)
+    aliases = key_aliases(data)
+    legend = ""
+    if aliases:
+        legend = "مفاتيح مختصرة: " + _dumps({a: k for k, a in aliases.items()}) + "\n"
+    data = apply_aliases(data, aliases)
+
+    text = _dumps(data)
+    items = count_items(data)
+    kept = data
+
+    if estimate_tokens(legend + text) > token_budget:
+        # بحث ثنائي عن أكبر نسبة عينة ضمن الحد (مع حجز مكان ملاحظة العينة)
+        budget = token_budget - estimate_tokens(_sample_note(items, items))
+        low, high = 0.0, 1.0
+        kept, text = sample(data, 0.0), _dumps(sample(data, 0.0))
+        for _ in range(12):
+            ratio = (low + high) / 2
+            candidate = sample(data, ratio)
+            candidate_text = _dumps(candidate)
+            if estimate_tokens(legend + candidate_text) <= budget:
+                low, kept, text = ratio, candidate, candidate_text
+            else:
+                high = ratio
+
+        # حتى أصغر عينة لا تتسع (عناصر ضخمة أو نصوص طويلة)
+        if estimate_tokens(legend + text) > budget:
+            kept, text = _fit(kept, legend, budget)
+
+    kept_items = count_items(kept)
+    truncated = kept is not data
+
+    if truncated:
+        legend = _sample_note(kept_items, items) + legend
+
+    result = legend + text
+    return result, {
+        "truncated": truncated,
+        "items": items,
+        "kept_items": kept_items,
+        "redacted_fields_dropped": dropped,
+        "key_aliases": len(aliases),
+        "estimated_tokens": estimate_tokens(result),
+        "token_budget": token_budget
+    }
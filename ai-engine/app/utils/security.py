@@ -8,10 +8,24 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from loguru import logger
 
+from .tracing import traced
 from ..config import get_settings, SECURITY_PERMISSIONS, SENSITIVE_KEYWORDS
 
 settings = get_settings()
 
+# أنماط الحجب في الردود: (الصلاحية التي تسمح بالقيمة، النمط، البديل).
+# كل نمط محدود الطول (أقصى تطابق أقل من StreamSanitizer.HOLDBACK)
+RESPONSE_PATTERNS = [
+    # أنماط الرواتب (مبالغ بالدينار)
+    ("can_view_others_salary", re.compile(r'\b\d{3,15},?\d{3}?\s{0,8}(دينار|IQD|د\.ع)'), '[مبلغ محجوب]'),
+    # أسعار الشراء
+    (
+        "can_view_purchase_prices",
+        re.compile(r'(سعر الشراء|تكلفة|cost|purchase price)[:\s]{0,8}[\d,\.]{1,24}', re.IGNORECASE),
+        '[معلومات سرية]'
+    ),
+]
+
 
 class SecurityService:
     """
@@ -30,6 +44,7 @@ class SecurityService:
             security_level = 5
         return SECURITY_PERMISSIONS.get(security_level, SECURITY_PERMISSIONS[1])
     
+    @traced("security.detect_sensitive_query")
     def detect_sensitive_query(self, query: str) -> Tuple[bool, str, str]:
         """
         الكشف عن الأسئلة الحساسة
@@ -62,6 +77,7 @@ class SecurityService:
         
         return False, "", ""
     
+    @traced("security.check_query_permission")
     def check_query_permission(
         self, 
         user_id: str,
@@ -123,28 +139,19 @@ class SecurityService:
         """
         تنظيف الرد من أي معلومات حساسة قد تتسرب
         """
-        permissions = self.get_user_permissions(user_level)
-        
-        # إزالة أرقام تشبه الرواتب إذا لم يكن مصرحاً
-        if not permissions["can_view_others_salary"]:
-            # إزالة أنماط الرواتب (مبالغ بالدينار)
-            response = re.sub(
-                r'\b\d{3,},?\d{3}?\s*(دينار|IQD|د\.ع)', 
-                '[مبلغ محجوب]', 
-                response
-            )
-        
-        # إزالة أسعار الشراء
-        if not permissions["can_view_purchase_prices"]:
-            response = re.sub(
-                r'(سعر الشراء|تكلفة|cost|purchase price)[:\s]*[\d,\.]+',
-                '[معلومات سرية]',
-                response,
-                flags=re.IGNORECASE
-            )
-        
+        for pattern, replacement in self.response_patterns(user_level):
+            response = pattern.sub(replacement, response)
         return response
     
+    def response_patterns(self, user_level: int) -> List[Tuple[re.Pattern, str]]:
+        """أنماط الحجب التي تنطبق على مستوى المستخدم"""
+        permissions = self.get_user_permissions(user_level)
+        return [
+            (pattern, replacement)
+            for permission, pattern, replacement in RESPONSE_PATTERNS
+            if not permissions[permission]
+        ]
+    
     def log_security_event(
         self, 
         user_id: str, 
@@ -219,6 +226,62 @@ class SecurityService:
         }
 
 
+class StreamSanitizer:
+    """
+    تنظيف رد متدفق جزءاً بجزء
+    
+    أنماط الحجب قد تمتد عبر عدة أجزاء، لذلك نحتفظ بآخر HOLDBACK حرف
+    (أطول من أي تطابق في RESPONSE_PATTERNS) ولا نرسلها حتى يتضح أنها لن
+    تتغير. يُنظف الجزء غير المرسل فقط، فكلفة كل جزء لا تنمو مع طول الرد.
+    """
+    
+    HOLDBACK = 64
+    
+    def __init__(self, security: SecurityService, user_level: int):
+        self.security = security
+        self.user_level = user_level
+        self._patterns = security.response_patterns(user_level)
+        self._pending = ""  # نص خام لم يُرسل بعد
+        self._sent: List[str] = []  # الأجزاء المرسلة بعد التنظيف
+    
+    def _safe_end(self) -> int:
+        """آخر موضع يمكن إرساله: قبل HOLDBACK، عند مسافة، وليس داخل تطابق"""
+        spans = [m.span() for pattern, _ in self._patterns for m in pattern.finditer(self._pending)]
+        end = len(self._pending) - self.HOLDBACK
+        moved = True
+        while moved and end > 0:
+            moved = False
+            # لا نقطع في منتصف كلمة
+            while end > 0 and not self._pending[end - 1].isspace():
+                end -= 1
+            for start, stop in spans:
+                if start < end < stop:
+                    end, moved = start, True
+        return max(end, 0)
+    
+    def _emit(self, end: int) -> str:
+        text = self.security.sanitize_response(self._pending[:end], self.user_level)
+        self._pending = self._pending[end:]
+        if text:
+            self._sent.append(text)
+        return text
+    
+    def feed(self, chunk: str) -> str:
+        """إضافة جزء جديد وإرجاع النص الآمن للإرسال"""
+        self._pending += chunk
+        end = self._safe_end()
+        return self._emit(end) if end > 0 else ""
+    
+    def flush(self) -> str:
+        """ما تبقى بعد انتهاء التدفق"""
+        return self._emit(len(self._pending))
+    
+    @property
+    def text(self) -> str:
+        """الرد الكامل بعد التنظيف"""
+        return "".join(self._sent) + self.security.sanitize_response(self._pending, self.user_level)
+
+
 # Singleton instance
 _security_service = None
 
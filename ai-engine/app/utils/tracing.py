@@ -0,0 +1,370 @@
+"""
+BI Management AI Engine - Tracing
+تتبع خفيف للطلبات: spans متداخلة (المسار، فحوص الأمان، بناء الـ prompt،
+انتظار الطابور، استدعاء النموذج، التنظيف) تُصدّر بصيغة OTLP JSON
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import random
+import secrets
+import time
+
+import httpx
+from loguru import logger
+
+from ..config import get_settings
+
+settings = get_settings()
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    عملية واحدة ضمن trace
+
+    span غير مُعاين (sampled=False) يحمل trace_id فقط للتمرير ولا يُصدّر.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        sampled: bool = True,
+        attributes: Dict = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {}) if sampled else {}
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        if self.sampled:
+            self.attributes.update(attributes)
+
+    def child(self, name: str, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, self.sampled, attributes)
+
+    def end(self, error: BaseException = None):
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if isinstance(error, asyncio.CancelledError):
+            # العميل قطع الاتصال - ليس خطأ
+            self.set(cancelled=True)
+        elif error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.sampled:
+            get_exporter().export(self)
+
+    @property
+    def traceparent(self) -> str:
+        """هيدر W3C traceparent لهذا الـ span"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_UNSAMPLED = Span("unsampled", "0" * 32, sampled=False)
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and all(c in "0123456789abcdef" for c in value)
+
+
+def _parse_traceparent(header: str) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) من traceparent - أو None إذا كان غير صالح"""
+    parts = header.strip().lower().split("-")
+    if len(parts) < 4 or not _is_hex(parts[1], 32) or not _is_hex(parts[2], 16):
+        return None
+    if parts[1] == "0" * 32:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _normalize_trace_id(value: str) -> str:
+    """x-trace-id من الـ backend: يُستخدم كما هو إن كان 32 hex وإلا يُشتق منه"""
+    value = value.strip().lower()
+    if _is_hex(value, 32):
+        return value
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+
+def start_trace(name: str, traceparent: str = None, trace_id: str = None, **attributes) -> Span:
+    """
+    span جذر لطلب وارد
+
+    traceparent (W3C) يحدد الأب وقرار المعاينة، و x-trace-id يحدد المعرف فقط؛
+    بدونهما يُنشأ معرف جديد ويُعاين الطلب بنسبة TRACING_SAMPLE_RATE.
+    """
+    parent = _parse_traceparent(traceparent) if traceparent else None
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id = _normalize_trace_id(trace_id) if trace_id else secrets.token_hex(16)
+        parent_id = None
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+
+    sampled = sampled and settings.TRACING_ENABLED
+    return Span(name, trace_id, parent_id, sampled, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def get_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+@contextmanager
+def activate(span_: Span):
+    """جعل span هو الحالي (للأبناء) وإنهاؤه عند الخروج"""
+    token = _current.set(span_)
+    try:
+        yield span_
+    except BaseException as e:
+        span_.end(e)
+        raise
+    finally:
+        _current.reset(token)
+        span_.end()
+
+
+@contextmanager
+def span(name: str, parent: Span = None, **attributes):
+    """
+    span فرعي من الحالي (أو من parent)
+
+    بدون trace حالي أو في trace غير مُعاين يُرجع الأب (أو span فارغ) بدون
+    إنشاء span جديد - الاستدعاء رخيص عند إيقاف التتبع.
+    """
+    parent = parent or _current.get()
+    if parent is None or not parent.sampled:
+        yield parent or _UNSAMPLED
+        return
+    with activate(parent.child(name, **attributes)) as child:
+        yield child
+
+
+def start_span(name: str, **attributes) -> Span:
+    """
+    span فرعي من الحالي بدون جعله الحالي - للتدفقات (async generators) التي
+    تعمل في سياق من يقرأها. يجب استدعاء end() عليه.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return Span(name, parent.trace_id if parent else "0" * 32, sampled=False)
+    return parent.child(name, **attributes)
+
+
+def annotate(target: Span = None, **attributes):
+    """إضافة خصائص للـ span المحدد (أو الحالي إن وُجد)"""
+    target = target or _current.get()
+    if target is not None:
+        target.set(**attributes)
+
+
+def traced(name: str):
+    """decorator: الدالة (عادية أو async) داخل span باسم name"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ========== التصدير ==========
+
+def _attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_span(s: Span) -> Dict:
+    data = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+        data["parentSpanId"] = s.parent_id
+    return data
+
+
+class SpanExporter:
+    """
+    يجمع الـ spans المنتهية ويكتبها دورياً:
+
+    - ملف JSON lines: كل سطر ExportTraceServiceRequest (صيغة OTLP JSON،
+      يقرأها otlpjsonfile receiver في OpenTelemetry Collector)، يُدوّر عند
+      max_bytes ويُحفظ منه backups ملفات
+    - و/أو OTLP/HTTP (مثلاً http://collector:4318/v1/traces)
+    """
+
+    def __init__(
+        self,
+        path: str = "",
+        endpoint: str = "",
+        service_name: str = "ai-engine",
+        flush_interval: float = 5.0,
+        max_buffer: int = 10000,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 3
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.exported = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def export(self, s: Span):
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(s)
+
+    def _payload(self, spans: List[Span]) -> Dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "ai-engine.tracing"},
+                    "spans": [_otlp_span(s) for s in spans],
+                }],
+            }]
+        }
+
+    def _rotate(self):
+        """traces.jsonl -> traces.jsonl.1 -> ... (الأقدم من backups يُحذف)"""
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        spans, self._buffer = self._buffer, []
+        payload = self._payload(spans)
+
+        try:
+            if self.path:
+                await asyncio.to_thread(self._write, json.dumps(payload, ensure_ascii=False))
+            if self.endpoint:
+                if self._client is None:
+                    self._client = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+                response = await self._client.post(self.endpoint, json=payload)
+                response.raise_for_status()
+            self.exported += len(spans)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Trace export failed ({len(spans)} spans): {e}")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None and (self.path or self.endpoint):
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": settings.TRACING_ENABLED,
+            "sample_rate": settings.TRACING_SAMPLE_RATE,
+            "buffered": len(self._buffer),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = SpanExporter(
+            path=settings.TRACING_FILE,
+            endpoint=settings.TRACING_OTLP_ENDPOINT,
+            service_name=settings.TRACING_SERVICE_NAME,
+            flush_interval=settings.TRACING_FLUSH_INTERVAL,
+            max_buffer=settings.TRACING_MAX_BUFFER,
+            max_bytes=settings.TRACING_FILE_MAX_BYTES,
+            backups=settings.TRACING_FILE_BACKUPS
+        )
+    return _exporter
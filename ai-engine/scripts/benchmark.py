@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+"""
+BI Management AI Engine - Microbenchmarks
+قياس زمن الدوال التي تعمل في كل طلب (فحوص الأمان، تنظيف البيانات، استخراج
+JSON، تطبيع العربي، البحث الدلالي وفهرس ANN) على عينات عربية/إنجليزية وبيانات متداخلة كبيرة
+
+الاستخدام (من مجلد ai-engine):
+    python scripts/benchmark.py
+    python scripts/benchmark.py --only security helpers
+    python scripts/benchmark.py --only index --index-documents 200000
+    python scripts/benchmark.py --only index --index-quantization int8
+    python scripts/benchmark.py --json > bench-main.json
+    python scripts/benchmark.py --compare bench-main.json --fail-threshold 0.15
+
+النتيجة بصيغة JSON: {"meta": {...commit, python, numpy...}, "results": [...]}؛ مع
+--compare تُقارن الوسيطات (median) بملف سابق وتُعلَّم التراجعات، وينتهي البرنامج
+برمز 1 إذا تجاوز أي تراجع --fail-threshold.
+
+البحث الدلالي يستخدم مُرمِّزاً حتمياً (hashing) بدل sentence-transformers حتى
+يقيس الكود المحيط بالنموذج لا النموذج نفسه؛ --real-model يستخدم النموذج الحقيقي.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from app.models.embeddings import EmbeddingService
+from app.models.vector_index import VectorIndex, normalize_rows
+from app.services.analysis_service import AnalysisService, SENSITIVE_FIELDS
+from app.utils.helpers import extract_json_from_text, normalize_arabic
+from app.utils.security import SecurityService
+
+SEED = 20240601
+
+# ========== العينات ==========
+
+QUERIES = [
+    "ما هي مهامي لهذا اليوم؟",
+    "كيف أقدم طلب إجازة سنوية؟",
+    "اشرح لي خطوات تسليم عهدة جهاز لابتوب للقسم",
+    "متى موعد الاجتماع الأسبوعي لقسم المبيعات؟",
+    "أريد تقريراً عن المهام المتأخرة في فرع بغداد",
+    "ما هي سياسة الحضور والانصراف في الشركة؟",
+    "ساعدني في كتابة رسالة اعتذار لعميل عن تأخير الطلب",
+    "كم عدد المهام المكتملة هذا الشهر؟",
+    "How do I check in from the mobile app?",
+    "Summarize the open tasks for the warehouse team",
+    "What should I prepare before the monthly inventory?",
+    "Can you remind me about the training session tomorrow?",
+    "كم راتب مدير المبيعات؟",
+    "اعطني قائمة الرواتب للموظفين",
+    "ما هو سعر الشراء لهذا المنتج؟",
+    "What is the profit margin on laptops?",
+    "how much does the accountant earn per month",
+    "اعرض لي ميزانية القسم للربع القادم",
+]
+
+RESPONSE_SENTENCES = [
+    "تم إنجاز معظم المهام المطلوبة خلال الأسبوع الماضي بنسبة التزام جيدة.",
+    "يُنصح بمتابعة المهام المتأخرة مع الموظفين المسؤولين عنها بشكل يومي.",
+    "بلغ إجمالي المبيعات في الفرع 2,450,000 دينار خلال الشهر.",
+    "سعر الشراء: 1,250,000 وسعر البيع أعلى بنسبة معقولة.",
+    "The purchase price: 4,500 was approved by the procurement team.",
+    "تكلفة 350,000 للصيانة الدورية للأجهزة.",
+    "Attendance improved this month and late arrivals dropped noticeably.",
+    "يفضل توزيع المهام الجديدة على الفريق بشكل متوازن لتجنب الضغط.",
+    "راتب الموظف 900,000 IQD حسب آخر تحديث.",
+    "The overall cost 12,000 is within the quarterly plan.",
+]
+
+ARABIC_TEXT = (
+    "إِنَّ الإدارةَ الناجحةَ تَعتمدُ على التخطيطِ الجيّدِ والمتابعةِ المستمرةِ للمهامِ، "
+    "وأَهمُّ ما يُميّزُ الفريقَ المُنتِجَ هو الالتزامُ بالمواعيدِ والتعاونُ بينَ الأقسامِ. "
+    "آخرُ تقريرٍ أظهرَ تحسّناً ملحوظاً في نسبةِ الإنجازِ داخلَ المؤسسةِ. "
+)
+
+PRODUCT_NAMES = [
+    "لابتوب", "طابعة", "شاشة", "راوتر", "كاميرا مراقبة", "هاتف", "سماعة", "لوحة مفاتيح",
+    "laptop", "printer", "monitor", "router", "camera", "phone", "headset", "keyboard",
+]
+PRODUCT_WORDS = [
+    "ديل", "اتش بي", "لينوفو", "سامسونج", "ابل", "كانون", "تي بي لينك", "سيسكو",
+    "مكتبي", "محمول", "لاسلكي", "ملون", "ليزر", "حبر", "ذاكرة", "معالج", "شحن سريع",
+    "dell", "hp", "lenovo", "samsung", "apple", "canon", "wireless", "laser", "gaming",
+    "16GB", "512GB", "4K", "27 inch", "USB-C", "bluetooth", "office", "warranty",
+]
+SEARCH_QUERIES = [
+    "لابتوب ديل ذاكرة 16GB", "طابعة ليزر ملونة", "wireless headset bluetooth",
+    "شاشة 27 inch 4K", "router cisco office", "هاتف سامسونج شحن سريع",
+]
+
+
+def build_responses(rng: random.Random, count: int = 40) -> list:
+    """ردود نموذج بطول 5-25 جملة (بعضها فيه مبالغ وأسعار شراء)"""
+    return [" ".join(rng.choice(RESPONSE_SENTENCES) for _ in range(rng.randint(5, 25)))
+            for _ in range(count)]
+
+
+def build_payload(rng: random.Random, employees: int = 300) -> dict:
+    """بيانات قسم متداخلة كما يرسلها الـ backend لـ /analysis/department"""
+    statuses = ["completed", "pending", "in_progress", "overdue"]
+    return {
+        "department": "المبيعات",
+        "period": "2025-01",
+        "summary": {"tasks_completed": 412, "tasks_pending": 57, "budget": 25000000,
+                    "profit_margin": 0.18, "cost_center": "SALES-01"},
+        "employees": [
+            {
+                "id": i,
+                "full_name": f"موظف {i}",
+                "salary": rng.randint(600, 3000) * 1000,
+                "contact": {"phone": f"0770{rng.randint(1000000, 9999999)}", "email": f"user{i}@example.com"},
+                "attendance": {"present": rng.randint(15, 22), "late": rng.randint(0, 6), "absent": rng.randint(0, 3)},
+                "tasks": [
+                    {
+                        "title": f"مهمة {i}-{t}",
+                        "status": rng.choice(statuses),
+                        "cost": rng.randint(10, 500) * 1000,
+                        "tags": ["عاجل", "زبون"] if t % 3 == 0 else [],
+                        "subtasks": [{"title": f"خطوة {s}", "done": s % 2 == 0} for s in range(3)],
+                    }
+                    for t in range(rng.randint(2, 8))
+                ],
+            }
+            for i in range(employees)
+        ],
+        "products": [
+            {"sku": f"P{p:05d}", "name": rng.choice(PRODUCT_NAMES), "purchase_price": rng.randint(50, 900) * 1000,
+             "sale_price": rng.randint(60, 1000) * 1000, "stock": rng.randint(0, 40)}
+            for p in range(200)
+        ],
+    }
+
+
+def build_llm_outputs(rng: random.Random, count: int = 40) -> list:
+    """ردود نموذج فيها JSON بين نص عادي (كما في إنشاء المهام)"""
+    outputs = []
+    for i in range(count):
+        task = {"title": f"مهمة رقم {i}", "priority": rng.choice(["low", "medium", "high", "urgent"]),
+                "estimated_hours": rng.randint(1, 40), "department": "المبيعات"}
+        before = " ".join(rng.choice(RESPONSE_SENTENCES) for _ in range(rng.randint(0, 12)))
+        after = " ".join(rng.choice(RESPONSE_SENTENCES) for _ in range(rng.randint(0, 4)))
+        outputs.append(f"{before}\n```json\n{json.dumps(task, ensure_ascii=False, indent=2)}\n```\n{after}")
+    return outputs
+
+
+def build_documents(rng: random.Random, count: int) -> list:
+    """كتالوج منتجات للبحث الدلالي"""
+    documents = []
+    for i in range(count):
+        words = " ".join(rng.sample(PRODUCT_WORDS, rng.randint(3, 7)))
+        documents.append({"id": i, "text": f"{rng.choice(PRODUCT_NAMES)} {words}", "stock": rng.randint(0, 40)})
+    return documents
+
+
+class HashingEncoder:
+    """
+    بديل حتمي لـ SentenceTransformer.encode: مجموع متجهات عشوائية ثابتة لكل كلمة
+
+    نصوص تشترك بكلمات تكون متشابهة، وزمن الترميز صغير حتى لا يطغى على البحث.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._tokens = {}
+
+    def _token(self, token: str) -> np.ndarray:
+        vector = self._tokens.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            vector = self._tokens[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            vector += self._token(token)
+        return vector
+
+    def encode(self, sentences, convert_to_numpy: bool = True, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(s) for s in sentences]) if sentences else np.zeros((0, self.dim), np.float32)
+
+
+# ========== الحالات ==========
+
+def embedding_service(real_model: bool) -> EmbeddingService:
+    service = EmbeddingService()
+    if not real_model:
+        service.model = HashingEncoder()
+    return service
+
+
+def bench_cases(args) -> list:
+    """[(المجموعة، الاسم، عدد العناصر لكل استدعاء، الدالة)]"""
+    rng = random.Random(SEED)
+    security = SecurityService()
+    analysis = AnalysisService.__new__(AnalysisService)  # بدون تحميل القالب والخدمات
+
+    responses = build_responses(rng)
+    payload = build_payload(rng, args.employees)
+    llm_outputs = build_llm_outputs(rng)
+    arabic = [ARABIC_TEXT * n for n in (1, 4, 16)]
+
+    cases = [
+        ("security", "detect_sensitive_query", len(QUERIES),
+         lambda: [security.detect_sensitive_query(q) for q in QUERIES]),
+        ("security", "sanitize_response[level=1]", len(responses),
+         lambda: [security.sanitize_response(r, 1) for r in responses]),
+        ("security", "sanitize_response[level=5]", len(responses),
+         lambda: [security.sanitize_response(r, 5) for r in responses]),
+        ("analysis", f"_clean_dict[employees={args.employees}]", 1,
+         lambda: analysis._clean_dict(payload, SENSITIVE_FIELDS, 2)),
+        ("helpers", "extract_json_from_text", len(llm_outputs),
+         lambda: [extract_json_from_text(t) for t in llm_outputs]),
+        ("helpers", "normalize_arabic", len(arabic),
+         lambda: [normalize_arabic(t) for t in arabic]),
+    ]
+
+    documents = build_documents(rng, args.documents)
+    corpus = [d["text"] for d in documents]
+    service = embedding_service(args.real_model)
+    cases += [
+        ("embeddings", f"find_similar[docs={args.documents}]", len(SEARCH_QUERIES),
+         lambda: [service.find_similar(q, documents, top_k=5, threshold=0.3) for q in SEARCH_QUERIES]),
+        ("embeddings", f"semantic_search[docs={args.documents}]", len(SEARCH_QUERIES),
+         lambda: [service.semantic_search(q, corpus, top_k=5) for q in SEARCH_QUERIES]),
+    ]
+
+    # بناء فهرس 100k يأخذ ثوانٍ - فقط إذا طُلبت مجموعته
+    if args.index_documents and (not args.only or any(o.startswith("index") for o in args.only)):
+        index, queries = build_index(args.index_documents, args.index_quantization)
+        storage = "" if index.quantization == "float32" else f"{index.quantization},"
+        cases += [
+            ("index", f"search[{index.backend_name},{storage}docs={args.index_documents}]", len(queries),
+             lambda: [index.search(q, 10) for q in queries]),
+            ("index", f"exact_search[docs={args.index_documents}]", len(queries),
+             lambda: [index.exact_search(q, 10) for q in queries]),
+        ]
+    return cases
+
+
+def build_index(documents: int, quantization: str = "float32", dim: int = 384, queries: int = 20) -> tuple:
+    """فهرس ANN على vectors حول مراكز عشوائية + استعلامات قريبة من مستندات"""
+    rng = np.random.default_rng(SEED)
+    centers = rng.standard_normal((max(1, documents // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), documents)]
+    vectors += 0.6 * rng.standard_normal((documents, dim)).astype(np.float32)
+    index = VectorIndex(dim, quantization=quantization)
+    index.upsert([str(i) for i in range(documents)], vectors)
+    picks = rng.integers(0, documents, queries)
+    return index, normalize_rows(vectors[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32))
+
+
+# ========== القياس ==========
+
+def measure(func, min_time: float, rounds: int) -> dict:
+    """مثل timeit: عدد تكرارات يكفي min_time لكل جولة، ثم rounds جولات"""
+    func()  # تسخين (الـ cache، الـ regex المترجمة)
+
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    per_call = [elapsed / number]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_call.append((time.perf_counter() - started) / number)
+
+    return {"number": number, "rounds": rounds, "per_call": per_call}
+
+
+def summarize(group: str, name: str, items: int, sample: dict) -> dict:
+    per_call = sample["per_call"]
+    median = statistics.median(per_call)
+    return {
+        "group": group,
+        "name": f"{group}.{name}",
+        "items": items,
+        "number": sample["number"],
+        "rounds": sample["rounds"],
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "mean_us": round(statistics.fmean(per_call) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(per_call) * 1e6, 3) if len(per_call) > 1 else 0.0,
+        "per_item_us": round(median / items * 1e6, 3),
+        "ops_per_sec": round(1 / median, 2) if median else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def metadata(args) -> dict:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "encoder": "sentence-transformers" if args.real_model else "hashing",
+        "min_time": args.min_time,
+        "rounds": args.rounds,
+    }
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """نسبة median الحالي إلى السابق لكل حالة موجودة في الملفين"""
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    comparison = []
+    for result in results:
+        old = previous.get(result["name"])
+        if not old or not old["median_us"]:
+            continue
+        ratio = result["median_us"] / old["median_us"]
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        else:
+            status = "same"
+        comparison.append({
+            "name": result["name"],
+            "baseline_us": old["median_us"],
+            "current_us": result["median_us"],
+            "ratio": round(ratio, 3),
+            "status": status,
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ai-engine microbenchmarks")
+    parser.add_argument("--only", nargs="+", help="groups or name prefixes to run (security, analysis, ...)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--employees", type=int, default=300, help="size of the nested department payload")
+    parser.add_argument("--documents", type=int, default=1000, help="documents for semantic search")
+    parser.add_argument("--index-documents", type=int, default=100000,
+                        help="vectors in the ANN index benchmark (0 = skip)")
+    parser.add_argument("--index-quantization", choices=["float32", "float16", "int8"], default="float32",
+                        help="storage mode of the ANN index vectors")
+    parser.add_argument("--real-model", action="store_true", help="use sentence-transformers instead of the hashing encoder")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="previous --json output to compare against")
+    parser.add_argument("--fail-threshold", type=float, default=0.2,
+                        help="relative slowdown counted as a regression (exit code 1)")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    # detect_sensitive_query يسجل تحذيراً لكل سؤال حساس
+    logger.remove()
+
+    results = []
+    if not args.json:
+        print(f"{'benchmark':<48} {'median':>12} {'per item':>12} {'stdev':>10} {'loops':>8}")
+
+    for group, name, items, func in bench_cases(args):
+        full_name = f"{group}.{name}"
+        if args.only and not any(group == o or full_name.startswith(o) for o in args.only):
+            continue
+        result = summarize(group, name, items, measure(func, args.min_time, args.rounds))
+        results.append(result)
+        if not args.json:
+            print(
+                f"{full_name:<48} {result['median_us']:>10.1f}us {result['per_item_us']:>10.1f}us "
+                f"{result['stdev_us']:>8.1f}us {result['number']:>8}",
+                flush=True
+            )
+
+    report = {"meta": metadata(args), "results": results}
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline.get("meta", {})
+        report["comparison"] = compare(results, baseline, args.fail_threshold)
+        regressions = [c for c in report["comparison"] if c["status"] == "regression"]
+
+        if not args.json:
+            print(f"\ncompared with {report['baseline'].get('commit', args.compare)}:")
+            for c in report["comparison"]:
+                print(f"{c['name']:<48} {c['baseline_us']:>10.1f}us -> {c['current_us']:>10.1f}us "
+                      f"x{c['ratio']:<6} {c['status']}")
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+BI Management AI Engine - Load Test
+قياس الإنتاجية وزمن الاستجابة (p50/p95/p99) لمسارات ai-engine عند مستويات تزامن مختلفة
+
+الاستخدام (من مجلد ai-engine، مع خادم Ollama البديل):
+    python scripts/mock_ollama.py --port 11500 &
+    OLLAMA_HOST=http://localhost:11500 python run.py &
+    python scripts/load_test.py --concurrency 1 4 8 --requests 20
+    python scripts/load_test.py --routes chat --concurrency 2 --json > chat.json
+    python scripts/load_test.py --routes task --llm-model qwen3:8b   # مقارنة مع جدول التوجيه
+
+كل مستوى تزامن: عدد ثابت من العملاء، كل عميل يرسل طلباً تلو الآخر حتى
+يكتمل --requests طلب لكل مسار.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings
+from app.utils.helpers import percentile
+
+MESSAGES = [
+    "ما أفضل طريقة لتنظيم مهامي هذا الأسبوع؟",
+    "اشرح لي خطوات تسليم عهدة جهاز لابتوب",
+    "كيف أكتب تقريراً أسبوعياً عن عملي؟",
+    "What should I prepare before the monthly inventory?",
+]
+
+TASKS = [
+    "جرد مخزن الفرع الرئيسي قبل نهاية الشهر",
+    "اصلاح طابعة قسم المحاسبة بشكل عاجل",
+    "تحديث أسعار قائمة المنتجات في النظام",
+    "تجهيز عرض تقديمي للاجتماع الفصلي",
+]
+
+
+def analysis_requests(n: int):
+    """مسارات /analysis/* بالتناوب"""
+    yield "/api/ai/analysis/general", {
+        "analysis_type": "department",
+        "data": {"tasks_completed": 40 + n, "tasks_pending": 7, "late_count": n % 5},
+    }
+    yield "/api/ai/analysis/performance", {
+        "employee_data": {"name": f"موظف {n}", "tasks_completed": 12, "tasks_pending": 3,
+                          "on_time_rate": 0.8, "attendance_rate": 0.95, "late_count": n % 4},
+        "period": "month",
+    }
+    yield "/api/ai/analysis/attendance", {
+        "attendance_data": [{"day": f"2025-01-{d:02d}", "status": ["present", "late", "absent"][(d + n) % 3]}
+                            for d in range(1, 29)],
+    }
+    yield "/api/ai/analysis/workload", {
+        "tasks_data": [{"assigned_to": f"e{i % 6}", "status": "completed" if i % 3 else "pending",
+                        "is_overdue": i % 7 == 0} for i in range(40 + n)],
+    }
+    yield "/api/ai/analysis/insights", {
+        "data_type": "tasks",
+        "data": {"open": 30 + n, "overdue": 4, "completed_this_week": 22},
+    }
+
+
+def request_factory(route: str, unique: bool, llm_model: str = None):
+    """مولد طلبات (المسار، الجسم، الهيدر) - unique يمنع الـ cache من تجميل النتائج"""
+    counter = itertools.count()
+
+    def build():
+        n = next(counter)
+        suffix = f" (#{n})" if unique else ""
+        headers = {"x-user-id": str(n % 20), "x-security-level": "3"}
+        if llm_model:
+            headers["x-llm-model"] = llm_model
+
+        if route == "chat":
+            user = {"id": str(n % 20), "full_name": f"موظف {n % 20}", "department_name": "المبيعات",
+                    "security_level": 2}
+            # الهيدر يجب أن يكون ASCII - json.loads يفك الترميز في الخادم
+            headers["x-user-info"] = json.dumps(user)
+            return "/api/ai/chat", {"user_id": str(n % 20), "message": MESSAGES[n % len(MESSAGES)] + suffix}, headers
+
+        if route == "task":
+            return "/api/ai/tasks/create", {"description": TASKS[n % len(TASKS)] + suffix}, headers
+
+        # بيانات التحليل تتغير مع n أصلاً
+        routes = list(analysis_requests(n))
+        path, body = routes[n % len(routes)]
+        return path, body, headers
+
+    return build
+
+
+async def run_level(client: httpx.AsyncClient, route: str, concurrency: int, total: int,
+                    unique: bool, llm_model: str = None) -> dict:
+    build = request_factory(route, unique, llm_model)
+    latencies, statuses = [], {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            path, body, headers = build()
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body, headers=headers)
+                status = str(response.status_code)
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": total - len(latencies),
+        "statuses": statuses,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "max": round(max(latencies), 3) if latencies else 0.0,
+    }
+
+
+async def main_async(args) -> list:
+    results = []
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        timeout=httpx.Timeout(args.timeout),
+        limits=httpx.Limits(max_connections=max(args.concurrency) * 2)
+    ) as client:
+        health = await client.get("/health")
+        health.raise_for_status()
+        ollama = health.json().get("ollama")
+        if ollama != "connected":
+            print(f"warning: ai-engine reports ollama={ollama} - results measure the fallback", file=sys.stderr)
+
+        for route in args.routes:
+            for concurrency in args.concurrency:
+                result = await run_level(
+                    client, route, concurrency, args.requests, args.unique, args.llm_model
+                )
+                results.append(result)
+                if not args.json:
+                    print_row(result)
+    return results
+
+
+def print_row(r: dict):
+    print(
+        f"{r['route']:<9} {r['concurrency']:>4} {r['ok']:>5}/{r['requests']:<5} "
+        f"{r['throughput_rps']:>8.2f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.2f}",
+        flush=True
+    )
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="ai-engine load test")
+    parser.add_argument("--base-url", default=f"http://localhost:{settings.PORT}")
+    parser.add_argument("--routes", nargs="+", choices=["chat", "task", "analysis"],
+                        default=["chat", "task", "analysis"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=20, help="requests per route and level")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--no-unique", dest="unique", action="store_false",
+                        help="repeat identical requests (measures cache / single-flight)")
+    parser.add_argument("--llm-model", help="override the model routing table (x-llm-model header; needs "
+                             "LLM_ROUTE_REQUEST_OVERRIDES=true and a routed or allowed model)")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{'route':<9} {'conc':>4} {'ok':>11} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+
+    results = asyncio.run(main_async(args))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+BI Management AI Engine - Mock Ollama
+خادم بديل لـ Ollama للاختبار وقياس الحمل بدون نموذج حقيقي
+
+يطبق /api/tags و /api/generate و /api/chat (متدفق وغير متدفق) مع زمن
+تحميل وسرعة تقييم وتوليد قابلة للضبط. القيم الافتراضية تقارب نموذج 8B
+على CPU (تقييم ~60 توكن/ث، توليد ~8 توكن/ث، طلب واحد في كل مرة).
+
+الاستخدام (من مجلد ai-engine):
+    python scripts/mock_ollama.py                        # المنفذ 11434
+    python scripts/mock_ollama.py --port 11500 --eval-tps 20 --parallel 2
+    OLLAMA_HOST=http://localhost:11500 python run.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings
+from app.utils.helpers import estimate_tokens
+
+NS = 1_000_000_000
+
+FILLER_WORDS = [
+    "بناءً", "على", "البيانات", "المتوفرة", "يظهر", "أن", "الأداء", "مستقر",
+    "مع", "تحسن", "ملحوظ", "في", "الالتزام", "بالمواعيد", "ويُنصح", "بمتابعة",
+    "المهام", "المتأخرة", "وتوزيع", "العمل", "بشكل", "أكثر", "توازناً", "-",
+]
+
+
+class MockModel:
+    """حالة الخادم: النماذج المحملة وعدد الطلبات المتوازية"""
+
+    def __init__(self, args):
+        self.args = args
+        self.models = args.models
+        self.loaded = {}  # model -> آخر استخدام
+        self.slots = asyncio.Semaphore(args.parallel)
+
+    def _jitter(self, seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - self.args.jitter, 1 + self.args.jitter))
+
+    def plan(self, model: str, prompt_text: str, options: dict, context: list = None) -> dict:
+        """حساب أزمنة الطلب بنفس حقول Ollama (بالنانوثانية)"""
+        load = 0.0
+        if model not in self.loaded:
+            load = self.args.load_seconds
+        self.loaded[model] = time.time()
+
+        # مع context يصل النص الجديد فقط ويُعاد استخدام الباقي
+        evaluated = estimate_tokens(prompt_text)
+        eval_tokens = min(
+            options.get("num_predict") or self.args.max_tokens,
+            self.args.max_tokens
+        )
+        if eval_tokens < 0:
+            eval_tokens = self.args.max_tokens
+
+        return {
+            "load": self._jitter(load),
+            "prompt_count": evaluated,
+            "prompt_seconds": self._jitter(evaluated / self.args.prompt_tps),
+            "eval_count": eval_tokens,
+            "token_seconds": 1 / self.args.eval_tps,
+            "context": (context or []) + list(range(evaluated + eval_tokens)),
+        }
+
+    @staticmethod
+    def text_for(prompt_text: str, tokens: int) -> list:
+        """نص الرد مقسماً لتوكنات - JSON صالح إذا طُلب JSON (إنشاء المهام)"""
+        if "JSON" in prompt_text:
+            task = {
+                "title": "مهمة تجريبية",
+                "description": "مهمة أنشأها خادم Ollama البديل",
+                "priority": "medium",
+                "estimated_minutes": 60,
+                "suggested_department": "it",
+                "tags": ["mock"],
+                "steps": ["الخطوة الأولى", "الخطوة الثانية"],
+            }
+            text = json.dumps(task, ensure_ascii=False)
+            size = max(1, len(text) // max(1, tokens))
+            return [text[i:i + size] for i in range(0, len(text), size)]
+        return [random.choice(FILLER_WORDS) + " " for _ in range(tokens)]
+
+    @staticmethod
+    def timings(plan: dict, generated: int, elapsed_eval: float) -> dict:
+        total = plan["load"] + plan["prompt_seconds"] + elapsed_eval
+        return {
+            "total_duration": int(total * NS),
+            "load_duration": int(plan["load"] * NS),
+            "prompt_eval_count": plan["prompt_count"],
+            "prompt_eval_duration": int(plan["prompt_seconds"] * NS),
+            "eval_count": generated,
+            "eval_duration": int(elapsed_eval * NS),
+        }
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Mock Ollama")
+    mock = MockModel(args)
+
+    def now_iso() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    async def run(request: Request, body: dict, prompt_text: str, wrap):
+        """
+        تنفيذ طلب generate/chat - wrap(text, done) يبني كل سطر رد
+        يتوقف التوليد إذا قطع العميل الاتصال (مثل Ollama)
+        """
+        model = body.get("model") or mock.models[0]
+        if model not in mock.models:
+            return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+
+        plan = mock.plan(model, prompt_text, body.get("options") or {}, body.get("context"))
+        tokens = mock.text_for(prompt_text, plan["eval_count"])
+
+        if body.get("stream", True):
+            async def lines():
+                async with mock.slots:
+                    await asyncio.sleep(plan["load"] + plan["prompt_seconds"])
+                    started = time.monotonic()
+                    for token in tokens:
+                        await asyncio.sleep(plan["token_seconds"])
+                        yield json.dumps(wrap(token, False), ensure_ascii=False) + "\n"
+                    final = {**wrap("", True), **mock.timings(plan, len(tokens), time.monotonic() - started)}
+                    if "prompt" in body:
+                        final["context"] = plan["context"]
+                    yield json.dumps(final, ensure_ascii=False) + "\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        async with mock.slots:
+            await asyncio.sleep(plan["load"] + plan["prompt_seconds"])
+            started = time.monotonic()
+            remaining = plan["token_seconds"] * len(tokens)
+            while remaining > 0:
+                await asyncio.sleep(min(0.25, remaining))
+                remaining -= 0.25
+                if await request.is_disconnected():
+                    return JSONResponse({}, status_code=499)
+            elapsed = time.monotonic() - started
+
+        data = {**wrap("".join(tokens), True), **mock.timings(plan, len(tokens), elapsed)}
+        if "prompt" in body:
+            data["context"] = plan["context"]
+        return JSONResponse(data)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": m, "model": m, "modified_at": now_iso()} for m in mock.models]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "mock"}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt_text = (body.get("system") or "") + body.get("prompt", "")
+        model = body.get("model") or mock.models[0]
+
+        def wrap(text: str, done: bool) -> dict:
+            return {"model": model, "created_at": now_iso(), "response": text, "done": done}
+
+        return await run(request, body, prompt_text, wrap)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt_text = "".join(m.get("content", "") for m in body.get("messages", []))
+        model = body.get("model") or mock.models[0]
+
+        def wrap(text: str, done: bool) -> dict:
+            return {
+                "model": model,
+                "created_at": now_iso(),
+                "message": {"role": "assistant", "content": text},
+                "done": done,
+            }
+
+        return await run(request, body, prompt_text, wrap)
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="+", help="served models (default: OLLAMA_MODEL + OLLAMA_DEGRADED_MODEL)")
+    parser.add_argument("--load-seconds", type=float, default=3.0, help="model load time (first request)")
+    parser.add_argument("--prompt-tps", type=float, default=60.0, help="prompt eval tokens/sec")
+    parser.add_argument("--eval-tps", type=float, default=8.0, help="generated tokens/sec")
+    parser.add_argument("--max-tokens", type=int, default=64, help="tokens per response (capped by num_predict)")
+    parser.add_argument("--parallel", type=int, default=1, help="concurrent requests (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="random +/- fraction on timings")
+    args = parser.parse_args(argv)
+    if not args.models:
+        settings = get_settings()
+        args.models = [m for m in (settings.OLLAMA_MODEL, settings.OLLAMA_DEGRADED_MODEL) if m]
+    return args
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
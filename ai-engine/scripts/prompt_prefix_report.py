@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+BI Management AI Engine - Prompt Prefix Report
+تقرير طول البداية المشتركة بين الـ prompts (لقياس فاعلية prompt cache في Ollama)
+
+الاستخدام (من مجلد ai-engine):
+    python scripts/prompt_prefix_report.py                 # عينة مدمجة
+    python scripts/prompt_prefix_report.py requests.jsonl  # عينة حقيقية
+    python scripts/prompt_prefix_report.py requests.jsonl --json
+
+كل سطر في الملف طلب API كما يرسله الـ backend:
+    {"route": "/api/ai/chat", "body": {...}, "headers": {"x-user-info": "..."}}
+    {"route": "/api/ai/tasks/create", "body": {...}}
+    {"route": "/api/ai/analysis/general", "body": {...}, "headers": {"x-security-level": "3"}}
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chat_service import ChatService
+from app.services.task_service import TaskService
+from app.services.analysis_service import AnalysisService
+from app.routes.chat import parse_user_info
+
+
+SAMPLE_REQUESTS = [
+    {"route": "/api/ai/chat", "body": {"user_id": "1", "message": "كيف أتقدم بطلب إجازة؟"},
+     "headers": {"x-user-info": json.dumps({"full_name": "أحمد علي", "department_name": "المبيعات", "security_level": 1})}},
+    {"route": "/api/ai/chat", "body": {"user_id": "2", "message": "ما هي مهامي اليوم؟"},
+     "headers": {"x-user-info": json.dumps({"full_name": "سارة حسن", "department_name": "المحاسبة", "security_level": 3})}},
+    {"route": "/api/ai/chat", "body": {"user_id": "3", "message": "How do I check in?"},
+     "headers": {"x-user-info": json.dumps({"full_name": "Omar", "department_name": "IT", "security_level": 2})}},
+    {"route": "/api/ai/tasks/create", "body": {"description": "جرد مخزن الفرع الرئيسي قبل نهاية الشهر"}},
+    {"route": "/api/ai/tasks/create", "body": {"description": "اصلاح طابعة قسم المحاسبة", "context": {"branch": "بغداد"}}},
+    {"route": "/api/ai/analysis/general", "headers": {"x-security-level": "4"},
+     "body": {"analysis_type": "department", "data": {"tasks_completed": 40, "tasks_pending": 7}}},
+    {"route": "/api/ai/analysis/general", "headers": {"x-security-level": "2"},
+     "body": {"analysis_type": "attendance_trends", "data": [{"day": "2025-01-01", "status": "late"}]}},
+]
+
+
+def render_prompt(request: dict, chat: ChatService, tasks: TaskService, analysis: AnalysisService):
+    """بناء النص الذي يصل لـ Ollama بنفس دوال الخدمات - يرجع (المجموعة، النص)"""
+    route = request.get("route", "")
+    body = request.get("body", {})
+    headers = {k.lower(): v for k, v in request.get("headers", {}).items()}
+
+    if route.startswith("/api/ai/chat"):
+        user_info = parse_user_info(headers.get("x-user-info"), body.get("user_id", ""))
+        # Ollama يضع تعليمات النظام أولاً ثم رسالة المستخدم
+        return "chat", chat._get_system_prompt(user_info) + "\n" + body.get("message", "")
+
+    if route == "/api/ai/tasks/create":
+        return "task", tasks._build_prompt(body.get("description", ""), body.get("context"))
+
+    if route.startswith("/api/ai/analysis/"):
+        level = max(1, min(5, int(headers.get("x-security-level", 1))))
+        analysis_type = body.get("analysis_type") or f"insights_{body.get('data_type', '')}"
+        cleaned = analysis._sanitize_data(body.get("data"), level, analysis_type)
+        prompt, _ = analysis._build_prompt(cleaned, analysis_type, level, body.get("context"))
+        return "analysis", prompt
+
+    return None, None
+
+
+def common_prefix_report(prompts: list) -> dict:
+    prefix = os.path.commonprefix(prompts)
+    lengths = [len(p) for p in prompts]
+    avg_len = sum(lengths) / len(lengths)
+    return {
+        "samples": len(prompts),
+        "shared_prefix_chars": len(prefix),
+        "shared_prefix_bytes": len(prefix.encode("utf-8")),
+        "avg_prompt_chars": round(avg_len),
+        "shared_ratio": round(len(prefix) / avg_len, 3) if avg_len else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared prompt prefix report")
+    parser.add_argument("input", nargs="?", help="JSONL file of API requests")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+    else:
+        requests = SAMPLE_REQUESTS
+
+    chat, tasks, analysis = ChatService(), TaskService(), AnalysisService()
+
+    groups = {}
+    for request in requests:
+        group, prompt = render_prompt(request, chat, tasks, analysis)
+        if group:
+            groups.setdefault(group, []).append(prompt)
+
+    report = {group: common_prefix_report(prompts) for group, prompts in groups.items()}
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'group':<10} {'samples':>7} {'prefix chars':>13} {'prefix bytes':>13} {'avg chars':>10} {'shared':>7}")
+    for group, r in report.items():
+        print(
+            f"{group:<10} {r['samples']:>7} {r['shared_prefix_chars']:>13} "
+            f"{r['shared_prefix_bytes']:>13} {r['avg_prompt_chars']:>10} {r['shared_ratio']:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
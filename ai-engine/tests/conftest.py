@@ -0,0 +1,8 @@
+"""
+إعداد الاختبارات: تشغيلها من مجلد ai-engine بـ python -m pytest
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+"""
+اختبارات التحكم بالقبول (load shedding) والحد التكيفي AIMD
+"""
+
+import asyncio
+
+from app.models.admission import AdmissionController
+from app.models.scheduler import AIMDLimit, LLMScheduler
+
+
+def make_controller(service=10.0, slots=2, samples=5, deadline=30.0, **kwargs):
+    limit = AIMDLimit(slots, min_limit=slots, max_limit=slots, adaptive=False)
+    for _ in range(samples):
+        limit.record(service, ok=True)
+    return AdmissionController(LLMScheduler(limit=limit), deadline=deadline, **kwargs)
+
+
+def test_route_priorities():
+    assert AdmissionController.priority_for("/api/ai/chat") == "chat"
+    assert AdmissionController.priority_for("/api/ai/chat/stream") == "chat"
+    assert AdmissionController.priority_for("/api/ai/tasks/create") == "task"
+    assert AdmissionController.priority_for("/api/ai/analysis/insights") == "analysis"
+    assert AdmissionController.priority_for("/api/ai/chatter") is None
+    assert AdmissionController.priority_for("/api/ai/search/products") is None
+
+
+def test_not_llm_route_is_ignored():
+    controller = make_controller()
+    assert controller.admit("/api/ai/embeddings/stats") is None
+
+
+def test_no_samples_admits_everything():
+    controller = make_controller(samples=0)
+    decisions = [controller.admit("/api/ai/analysis/insights") for _ in range(50)]
+
+    assert all(d["admitted"] for d in decisions)
+    assert decisions[0]["expected_seconds"] is None
+
+
+def test_sheds_when_queue_exceeds_deadline():
+    # حدان متزامنان، 10 ثوان لكل طلب، مهلة 30 ثانية
+    controller = make_controller()
+    decisions = [controller.admit("/api/ai/analysis/insights") for _ in range(7)]
+
+    assert [d["admitted"] for d in decisions] == [True] * 6 + [False]
+    assert [d["expected_seconds"] for d in decisions] == [10.0, 10.0, 15.0, 20.0, 25.0, 30.0, 35.0]
+    assert decisions[6]["retry_after"] == 5
+    assert controller.get_stats()["classes"]["analysis"]["shed"] == 1
+
+
+def test_release_frees_capacity():
+    controller = make_controller()
+    for _ in range(6):
+        controller.admit("/api/ai/analysis/insights")
+    assert not controller.admit("/api/ai/analysis/insights")["admitted"]
+
+    controller.release("analysis")
+    assert controller.admit("/api/ai/analysis/insights")["admitted"]
+
+
+def test_lower_priority_queue_does_not_shed_chat():
+    controller = make_controller()
+    for _ in range(6):
+        controller.admit("/api/ai/analysis/insights")
+
+    decision = controller.admit("/api/ai/chat")
+    assert decision["admitted"]
+    assert decision["expected_seconds"] == 10.0
+
+
+def test_per_priority_deadline():
+    controller = make_controller(deadlines={"chat": 10.0})
+    controller.admit("/api/ai/chat")
+    controller.admit("/api/ai/chat")
+
+    assert not controller.admit("/api/ai/chat")["admitted"]
+
+
+def test_disabled_admits_everything():
+    controller = make_controller(enabled=False)
+    assert all(controller.admit("/api/ai/analysis")["admitted"] for _ in range(20))
+
+
+def test_counts_queued_scheduler_requests():
+    controller = make_controller(deadline=15.0)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def request():
+            async with controller.scheduler.slot("analysis"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(request()) for _ in range(3)]
+        await asyncio.sleep(0)
+        decision = controller.admit("/api/ai/analysis")
+        release.set()
+        await asyncio.gather(*tasks)
+        return decision
+
+    # طلبان جاريان وواحد منتظر: الجديد ينتظر طلبين = 10 + 10 ثوان
+    decision = asyncio.run(run())
+    assert not decision["admitted"]
+    assert decision["expected_seconds"] == 20.0
+
+
+def test_aimd_increase_and_decrease():
+    limit = AIMDLimit(4, min_limit=1, max_limit=8, target=1.0, backoff=0.5)
+    for _ in range(8):
+        limit.record(0.1, ok=True, inflight=limit.limit)
+    assert limit.limit >= 5
+
+    before = limit.limit
+    limit.record(5.0, ok=True, inflight=before)
+    assert limit.limit == int(limit.value) < before
+    assert limit.decreases == 1
+
+    # انخفاض واحد فقط خلال زمن الخدمة
+    limit.record(5.0, ok=False)
+    assert limit.decreases == 1
+
+
+def test_aimd_does_not_grow_unused_limit():
+    limit = AIMDLimit(4, min_limit=1, max_limit=8, target=1.0)
+    for _ in range(20):
+        limit.record(0.1, ok=True, inflight=1)
+    assert limit.limit == 4
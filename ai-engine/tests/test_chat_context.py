@@ -0,0 +1,65 @@
+"""
+اختبارات إعادة استخدام سياق Ollama بين أدوار المحادثة
+"""
+
+import asyncio
+
+from app.services import chat_service
+from app.services.chat_service import ChatService
+
+USER = {"full_name": "أحمد", "department_name": "المبيعات", "security_level": 1}
+QUESTION = "ما هي حالة المشروع الحالي وما المهام المتأخرة؟"
+
+
+class FakeLLM:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def generate(self, prompt, **kwargs):
+        self.calls.append(("generate", kwargs))
+        if kwargs.get("on_context"):
+            kwargs["on_context"]([1, 2, 3], "main-model")
+        return self.responses.pop(0)
+
+    async def chat(self, messages, **kwargs):
+        self.calls.append(("chat", kwargs))
+        return self.responses.pop(0)
+
+
+def run_turns(monkeypatch, responses, messages):
+    llm = FakeLLM(responses)
+
+    async def get_llm():
+        return llm
+
+    monkeypatch.setattr(chat_service, "get_llm", get_llm)
+    monkeypatch.setattr(chat_service.settings, "LLM_CHAT_REUSE_CONTEXT", True)
+    service = ChatService()
+
+    async def turns():
+        conversation_id = None
+        for message in messages:
+            result = await service.chat("u1", message, USER, conversation_id)
+            conversation_id = result["conversation_id"]
+        return service.conversations[conversation_id]
+
+    return asyncio.run(turns()), llm
+
+
+def test_context_is_reused_on_next_turn(monkeypatch):
+    conversation, llm = run_turns(monkeypatch, ["الرد الأول", "الرد الثاني"], [QUESTION, QUESTION])
+
+    assert [method for method, _ in llm.calls] == ["generate", "generate"]
+    assert llm.calls[1][1]["context"] == [1, 2, 3]
+    assert llm.calls[1][1]["system_prompt"] is None
+
+
+def test_sanitized_reply_drops_context(monkeypatch):
+    conversation, llm = run_turns(
+        monkeypatch, ["راتب المدير 2,500,000 دينار", "الرد الثاني"], [QUESTION, QUESTION]
+    )
+
+    # الدور الثاني يعيد بناء السجل المنظف بدل سياق يحمل الرقم
+    assert [method for method, _ in llm.calls] == ["generate", "chat"]
+    assert "2,500,000" not in conversation["messages"][1]["content"]
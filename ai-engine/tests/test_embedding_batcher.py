@@ -0,0 +1,112 @@
+"""
+اختبارات تجميع طلبات الترميز في دفعات
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.models.embedding_batcher import EmbeddingBatcher
+
+
+class FakeModel:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.threads = set()
+
+    def encode(self, texts):
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+
+def test_rows_go_back_to_their_request():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model.encode, max_items=64, max_wait=0.05)
+    try:
+        first = batcher.submit(["a", "bb"])
+        second = batcher.submit(["ccc"])
+
+        assert first.result(timeout=5)[:, 0].tolist() == [1, 2]
+        assert second.result(timeout=5)[:, 0].tolist() == [3]
+    finally:
+        batcher.close()
+
+
+def test_concurrent_requests_share_a_batch():
+    model = FakeModel(delay=0.02)
+    batcher = EmbeddingBatcher(model.encode, max_items=64, max_wait=0.02)
+    try:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda i: batcher.encode([f"text {i:03d}"]), range(32)))
+    finally:
+        batcher.close()
+
+    assert all(r.shape == (1, 2) for r in results)
+    assert len(model.batches) < 32
+    assert sum(len(b) for b in model.batches) == 32
+    assert model.threads == {"embedding-batcher"}
+    assert batcher.get_stats()["largest_batch"] > 1
+
+
+def test_batches_respect_max_items():
+    model = FakeModel(delay=0.01)
+    batcher = EmbeddingBatcher(model.encode, max_items=4, max_wait=0.05)
+    try:
+        futures = [batcher.submit(["a", "b", "c"]) for _ in range(5)]
+        for future in futures:
+            assert future.result(timeout=5).shape == (3, 2)
+    finally:
+        batcher.close()
+
+    assert all(len(batch) <= 4 for batch in model.batches)
+    assert len(model.batches) == 5
+
+
+def test_failure_is_raised_to_every_request():
+    def broken(texts):
+        raise RuntimeError("model crashed")
+
+    batcher = EmbeddingBatcher(broken, max_wait=0.05)
+    try:
+        futures = [batcher.submit(["a"]), batcher.submit(["b"])]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+    assert batcher.get_stats()["failed_batches"] >= 1
+
+
+def test_cancelled_request_is_not_encoded():
+    model = FakeModel()
+    release = threading.Event()
+
+    def slow(texts):
+        release.wait(5)
+        return model.encode(texts)
+
+    batcher = EmbeddingBatcher(slow, max_items=1, max_wait=0)
+    try:
+        running = batcher.submit(["first"])
+        time.sleep(0.05)
+        cancelled = batcher.submit(["skipped"])
+        assert cancelled.cancel()
+        release.set()
+        running.result(timeout=5)
+        assert batcher.submit(["last"]).result(timeout=5).shape == (1, 2)
+    finally:
+        batcher.close()
+
+    assert ["skipped"] not in model.batches
+
+
+def test_empty_request():
+    batcher = EmbeddingBatcher(FakeModel().encode)
+    assert batcher.submit([]).result().shape[0] == 0
+    assert batcher.get_stats()["batches"] == 0
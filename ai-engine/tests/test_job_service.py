@@ -0,0 +1,41 @@
+"""
+اختبارات طابور المهام في الخلفية
+"""
+
+import asyncio
+import contextvars
+
+from app.services.job_service import JobService
+from app.utils.context import get_request_context, set_request_context
+
+
+def submit_as(service, **context):
+    """إرسال مهمة من طلب بسياق معين"""
+    def submit():
+        set_request_context(**context)
+        return service.submit("analysis", {"data": [], "analysis_type": "general"})
+    return contextvars.copy_context().run(submit)
+
+
+def test_job_context_does_not_leak_to_next_job():
+    service = JobService()
+    seen = []
+
+    async def execute(kind, payload, security_level):
+        seen.append(dict(get_request_context()))
+        return {"analysis": "ok"}
+
+    service.execute = execute
+    submit_as(service, route="/jobs", user_id="u1", department="sales")
+    submit_as(service, route="/jobs")
+
+    async def run_all():
+        while not service.queue.empty():
+            await service._run(service.queue.get_nowait())
+        return dict(get_request_context())
+
+    after = asyncio.run(run_all())
+
+    assert seen[0]["user_id"] == "u1" and seen[0]["department"] == "sales"
+    assert "user_id" not in seen[1] and "department" not in seen[1]
+    assert after == {}
@@ -0,0 +1,136 @@
+"""
+اختبارات ResponseCache و CachedLLM: LRU والحد بالبايت وانتهاء الصلاحية والحفظ وإعادة السياق
+"""
+
+import asyncio
+import os
+import time
+
+from app.models.llm_cache import CachedLLM, ResponseCache
+
+
+def test_hit_and_miss():
+    cache = ResponseCache(max_entries=10)
+    cache.set("a", "1")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.evictions == 1
+
+
+def test_evicts_by_bytes():
+    cache = ResponseCache(max_entries=100, max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    cache.set("c", "z" * 10)
+
+    assert cache.get_stats()["bytes"] <= 25
+    assert cache.get("a") is None
+    assert cache.get("c") == "z" * 10
+
+
+def test_oversized_value_is_not_stored():
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", "x" * 100)
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_expired_entry_is_removed():
+    cache = ResponseCache(ttl=3600)
+    cache.set("old", "1", expires_at=time.time() - 1)
+    cache.set("new", "2")
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "2"
+    stats = cache.get_stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 1
+
+
+def test_save_and_load_skip_expired(tmp_path):
+    path = str(tmp_path / "llm_cache.json")
+    cache = ResponseCache(path=path)
+    cache.set("a", "1")
+    cache.set("b", "2", expires_at=time.time() - 1)
+    cache.save()
+
+    loaded = ResponseCache(path=path)
+    assert loaded.get("a") == "1"
+    assert loaded.get("b") is None
+    assert loaded.get_stats()["entries"] == 1
+
+
+def test_save_due_after_interval(tmp_path):
+    path = str(tmp_path / "llm_cache.json")
+    cache = ResponseCache(path=path, save_interval=0)
+    assert not cache.save_due()
+
+    cache.set("a", {"response": "1", "context": [1, 2], "model": "m"})
+    assert cache.save_due()
+    cache.save()
+    assert not cache.save_due()
+
+    assert ResponseCache(path=path).get("a")["context"] == [1, 2]
+
+
+class FakeOllama:
+    def __init__(self):
+        self.calls = 0
+
+    def fingerprint(self, method, *args, **kwargs):
+        return f"{method}:{args[0]}"
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        if kwargs.get("on_context"):
+            kwargs["on_context"]([7, 8, 9], "main-model")
+        return f"رد على {prompt}"
+
+
+def test_cache_hit_replays_context(tmp_path):
+    inner = FakeOllama()
+    llm = CachedLLM(inner, cache=ResponseCache(path=str(tmp_path / "c.json"), save_interval=0))
+    contexts = []
+
+    async def ask():
+        return await llm.generate(
+            "سؤال", temperature=0.1, on_context=lambda context, model: contexts.append((context, model))
+        )
+
+    first = asyncio.run(ask())
+    second = asyncio.run(ask())
+
+    assert first == second == "رد على سؤال"
+    assert inner.calls == 1
+    assert contexts == [([7, 8, 9], "main-model")] * 2
+    # الحفظ الدوري كتب الملف قبل الإغلاق
+    assert os.path.exists(str(tmp_path / "c.json"))
+
+
+def test_entry_without_context_is_refreshed_for_context_callers():
+    inner = FakeOllama()
+    llm = CachedLLM(inner, cache=ResponseCache())
+    contexts = []
+
+    asyncio.run(llm.generate("سؤال", temperature=0.1))
+    asyncio.run(llm.generate("سؤال", temperature=0.1, on_context=lambda c, m: contexts.append(c)))
+    asyncio.run(llm.generate("سؤال", temperature=0.1, on_context=lambda c, m: contexts.append(c)))
+
+    assert inner.calls == 2
+    assert contexts == [[7, 8, 9], [7, 8, 9]]
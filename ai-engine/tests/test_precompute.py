@@ -0,0 +1,119 @@
+"""
+اختبارات مخزن التحليلات المحسوبة مسبقاً
+"""
+
+import asyncio
+
+from app.models import resilience
+from app.services import precompute_service
+from app.services.precompute_service import PrecomputeService
+
+PAYLOAD = {"department_data": {"name": "sales", "employees": 12}}
+
+
+class FakeJobService:
+    """يحاكي job_service.execute ويسجل مصدر الرد كما يفعل ResilientLLM"""
+
+    def __init__(self, level="primary", analysis="تحليل القسم"):
+        self.level = level
+        self.analysis = analysis
+        self.calls = 0
+
+    async def execute(self, kind, payload, level):
+        self.calls += 1
+        if self.level is not None:
+            resilience._record_served(self.level)
+        return {"analysis": self.analysis, "analysis_type": kind}
+
+
+def make_service(monkeypatch, jobs, **kwargs):
+    async def get_job_service():
+        return jobs
+
+    monkeypatch.setattr(precompute_service, "get_job_service", get_job_service)
+    return PrecomputeService(levels=[1], adhoc_max_age=60, **kwargs)
+
+
+def get(service, payload=PAYLOAD):
+    return asyncio.run(service.get_or_compute("department", payload, 1))
+
+
+def test_primary_result_is_stored(monkeypatch):
+    jobs = FakeJobService()
+    service = make_service(monkeypatch, jobs)
+
+    first = get(service)
+    second = get(service)
+
+    assert first["precomputed"]["hit"] is False
+    assert second["precomputed"]["hit"] is True
+    assert second["analysis"] == "تحليل القسم"
+    assert jobs.calls == 1
+
+
+def test_fallback_and_degraded_results_are_not_stored(monkeypatch):
+    for level in ("fallback", "degraded", "failed"):
+        jobs = FakeJobService(level=level)
+        service = make_service(monkeypatch, jobs)
+
+        assert get(service)["analysis"] == "تحليل القسم"
+        get(service)
+
+        assert jobs.calls == 2
+        assert not service.results
+        assert service.rejected == 2
+
+
+def test_empty_or_response_cache_result_is_not_stored(monkeypatch):
+    service = make_service(monkeypatch, FakeJobService(analysis=""))
+    get(service)
+    assert not service.results
+
+    # levels فارغة = الرد من cache الردود ولا نعرف مصدره
+    service = make_service(monkeypatch, FakeJobService(level=None))
+    get(service)
+    assert not service.results
+
+
+def test_adhoc_input_expires_quickly(monkeypatch):
+    jobs = FakeJobService()
+    service = make_service(monkeypatch, jobs, max_age=3600)
+    get(service)
+
+    entry = next(iter(service.results.values()))
+    assert entry["max_age"] == 60
+    entry["_generated"] -= 120
+
+    get(service)
+    assert jobs.calls == 2
+
+
+def test_registered_source_keeps_full_max_age(monkeypatch):
+    jobs = FakeJobService()
+    service = make_service(monkeypatch, jobs, max_age=3600)
+    service.set_source("department", "sales", PAYLOAD)
+    get(service)
+
+    entry = next(iter(service.results.values()))
+    assert "max_age" not in entry
+    entry["_generated"] -= 120
+
+    assert get(service)["precomputed"]["hit"] is True
+    assert jobs.calls == 1
+
+
+def test_failed_regeneration_keeps_previous_result(monkeypatch):
+    jobs = FakeJobService()
+    service = make_service(monkeypatch, jobs)
+    service.set_source("department", "sales", PAYLOAD)
+    source = service.sources["department:sales"]
+
+    asyncio.run(service._regenerate(source, 1, "refresh"))
+    latest = source["latest"]["1"]
+
+    jobs.level = "fallback"
+    asyncio.run(service._regenerate(source, 1, "refresh"))
+
+    assert source["latest"]["1"] == latest
+    assert service.regenerated == 1
+    assert service.failures == 1
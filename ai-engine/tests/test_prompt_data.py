@@ -0,0 +1,58 @@
+"""
+اختبارات تحويل البيانات لنص الـ prompt ضمن حد التوكنات
+"""
+
+import json
+
+from app.utils.helpers import estimate_tokens
+from app.utils.prompt_data import REDACTED, count_items, sample, serialize_for_prompt
+
+
+def _payload(text: str):
+    """JSON البيانات بعد سطور الملاحظات (مفاتيح مختصرة / عينة)"""
+    return json.loads(text.splitlines()[-1])
+
+
+def test_small_data_is_kept_whole():
+    data = [{"name": "أحمد", "salary": REDACTED, "score": 90}]
+    text, info = serialize_for_prompt(data, 1000)
+
+    assert not info["truncated"]
+    assert info["redacted_fields_dropped"] == 1
+    assert _payload(text) == [{"name": "أحمد", "score": 90}]
+
+
+def test_record_dict_is_sampled_like_rows():
+    data = {f"emp{i}": {"score": i, "late": i % 3} for i in range(50)}
+    kept = sample(data, 0.1)
+
+    assert len(kept) == 5
+    assert "emp0" in kept and "emp49" in kept
+    assert count_items(data) == 50
+
+
+def test_sections_are_sampled_proportionally():
+    data = {
+        "employees": [{"id": i, "dept": "sales"} for i in range(2000)],
+        "tasks": [{"task": i, "done": i % 2 == 0} for i in range(2000)],
+    }
+    text, info = serialize_for_prompt(data, 1500)
+    payload = _payload(text)
+    sections = list(payload.values())
+
+    assert info["truncated"]
+    assert estimate_tokens(text) <= 1500
+    assert len(sections) == 2
+    assert all(len(rows) > 10 for rows in sections)
+    assert abs(len(sections[0]) - len(sections[1])) <= 1
+
+
+def test_huge_item_is_trimmed_to_valid_json():
+    data = {"report": [{"title": "تقرير", "body": "نص طويل جداً " * 2000}]}
+    text, info = serialize_for_prompt(data, 200)
+    payload = _payload(text)
+
+    assert info["truncated"]
+    assert estimate_tokens(text) <= 200
+    assert payload["report"][0]["title"] == "تقرير"
+    assert payload["report"][0]["body"].endswith("…")
@@ -0,0 +1,80 @@
+"""
+اختبارات quantization: الضغط وفك الضغط والضرب النقطي التقريبي
+"""
+
+import numpy as np
+import pytest
+
+from app.models.quantization import QuantizedMatrix, check_quantization, dequantize, quantize
+from app.models.vector_index import VectorIndex
+
+
+def unit_vectors(count=200, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("mode, tolerance", [("float32", 0.0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_round_trip(mode, tolerance):
+    vectors = unit_vectors()
+    codes, scales = quantize(vectors, mode)
+    restored = dequantize(codes, scales, mode)
+
+    assert restored.dtype == np.float32
+    assert np.abs(restored - vectors).max() <= tolerance
+
+
+def test_storage_size():
+    vectors = unit_vectors()
+    sizes = {mode: QuantizedMatrix.from_vectors(vectors, mode).nbytes for mode in ("float32", "float16", "int8")}
+
+    assert sizes["float16"] == sizes["float32"] // 2
+    assert sizes["int8"] < sizes["float32"] // 3
+
+
+def test_int8_zero_vector():
+    codes, scales = quantize(np.zeros((1, 4), dtype=np.float32), "int8")
+    assert np.all(dequantize(codes, scales, "int8") == 0)
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8"])
+def test_scores_match_float32(mode):
+    vectors = unit_vectors()
+    query = vectors[7]
+    matrix = QuantizedMatrix.from_vectors(vectors, mode)
+
+    scores = matrix.scores(query, size=len(vectors), block=64)
+    assert np.abs(scores - vectors @ query).max() < 0.02
+    assert np.allclose(matrix.scores(query, rows=np.array([3, 7])), scores[[3, 7]])
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8"])
+def test_quantized_index_ranks_like_float32(mode):
+    vectors = unit_vectors()
+    ids = [str(i) for i in range(len(vectors))]
+    exact = VectorIndex(32, backend="flat")
+    exact.upsert(ids, vectors)
+    quantized = VectorIndex(32, backend="flat", quantization=mode, rescore=4)
+    quantized.upsert(ids, vectors)
+
+    for query in vectors[:10]:
+        expected = exact.search(query, k=5)
+        results = quantized.search(query, k=5)
+        assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+        assert np.allclose([s for _, s in results], [s for _, s in expected], atol=1e-5)
+
+
+def test_save_and_load_quantized(tmp_path):
+    vectors = unit_vectors()
+    index = VectorIndex(32, backend="flat", quantization="int8", rescore=0)
+    index.upsert([str(i) for i in range(len(vectors))], vectors)
+    index.save(str(tmp_path))
+
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.quantization == "int8"
+    assert loaded.search(vectors[5], k=1)[0][0] == "5"
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        check_quantization("int4")
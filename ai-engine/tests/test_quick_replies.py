@@ -0,0 +1,63 @@
+"""
+اختبارات الردود الجاهزة: تصنيف الرسائل البسيطة وترك الباقي للنموذج
+"""
+
+import pytest
+
+from app.services.quick_replies import QuickReplyRouter
+from app.utils.security import SecurityService
+
+
+@pytest.fixture
+def router():
+    return QuickReplyRouter(SecurityService())
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("مرحبا", "greeting"),
+    ("السلام عليكم", "greeting"),
+    ("hello there", "greeting"),
+    ("كيف اقدم طلب اجازة؟", "leave_howto"),
+    ("how do I request leave", "leave_howto"),
+    ("كيف اسجل الحضور", "attendance_howto"),
+    ("how do I clock in", "attendance_howto"),
+])
+def test_classifies_simple_questions(router, message, intent):
+    match = router.classify(message)
+
+    assert match is not None
+    assert match["intent"] == intent
+    assert match["confidence"] >= 0.75
+
+
+@pytest.mark.parametrize("message", [
+    "",
+    "اجازة",  # بدون كيف: قد يسأل عن رصيده
+    "كم يوم اجازة باقي لي هذه السنة؟",
+    "مرحبا، حلل أداء قسم المبيعات لهذا الشهر",
+    "how do I request leave for my whole team next month and who approves it",
+])
+def test_leaves_other_messages_to_the_model(router, message):
+    match = router.classify(message)
+    assert match is None or router.reply(message, {"full_name": "Ali"}) is None
+
+
+def test_unknown_words_lower_confidence(router):
+    simple = router.classify("كيف اقدم طلب اجازة")
+    extended = router.classify("كيف اقدم طلب اجازة مرضية طويلة")
+
+    assert extended is None or extended["confidence"] < simple["confidence"]
+
+
+def test_reply_fills_template_and_counts(router):
+    result = router.reply("مرحبا", {"full_name": "Ali"})
+
+    assert result["intent"] == "greeting"
+    assert "Ali" in result["response"]
+    assert "{" not in result["response"]
+
+    router.reply("حلل مبيعات الشهر الماضي", {})
+    stats = router.get_stats()
+    assert stats["checked"] == 2
+    assert stats["hits"] == 1
+    assert stats["intents"]["greeting"]["hits"] == 1
@@ -0,0 +1,150 @@
+"""
+اختبارات Circuit Breaker: الانتقالات بين الحالات وتحرير الطلب التجريبي
+"""
+
+import asyncio
+
+import pytest
+
+from app.models.resilience import CircuitBreaker, ResilientLLM
+
+
+class FakeLLM:
+    def __init__(self):
+        self.response = "ok"
+        self.error = None
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.hold = False
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        self.started.set()
+        if self.hold:
+            await asyncio.sleep(3600)
+        if self.error:
+            raise self.error
+        return self.response
+
+
+class FakeFallback:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return "fallback"
+
+
+def make_llm(failures=2, reset=30):
+    inner, fallback = FakeLLM(), FakeFallback()
+    llm = ResilientLLM(inner, fallback=fallback)
+    llm.breaker = CircuitBreaker(failure_threshold=failures, reset_timeout=reset)
+    return llm, inner, fallback
+
+
+def expire(breaker):
+    breaker.opened_at -= breaker.reset_timeout
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+    assert not breaker.allow()
+
+
+def test_half_open_allows_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+
+def test_trial_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_trial_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    breaker.open()
+    expire(breaker)
+    breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_release_frees_trial_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_call_failures_open_and_use_fallback():
+    llm, inner, fallback = make_llm(failures=2)
+
+    async def run():
+        inner.response = ""
+        await llm.generate("a")
+        await llm.generate("a")
+        return await llm.generate("a")
+
+    assert asyncio.run(run()) == "fallback"
+    assert llm.breaker.state == "open"
+    assert inner.calls == 2 and fallback.calls == 1
+
+
+def test_call_exception_reopens_half_open():
+    llm, inner, _ = make_llm(failures=1)
+    llm.breaker.open()
+    expire(llm.breaker)
+    inner.error = RuntimeError("connection reset")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(llm.generate("a"))
+    assert llm.breaker.state == "open"
+
+
+def test_cancelled_trial_releases_slot():
+    llm, inner, fallback = make_llm(failures=1)
+    llm.breaker.open()
+    expire(llm.breaker)
+    inner.hold = True
+
+    async def run():
+        trial = asyncio.create_task(llm.generate("a"))
+        await inner.started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        # الخانة حُررت: الطلب التالي تجريبي ويصل للنموذج
+        inner.hold = False
+        return await llm.generate("b")
+
+    assert asyncio.run(run()) == "ok"
+    assert inner.calls == 2 and fallback.calls == 0
+    assert llm.breaker.state == "closed"
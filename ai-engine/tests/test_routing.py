@@ -0,0 +1,69 @@
+"""
+اختبارات جدول توجيه النماذج وتجاوزات الطلب
+"""
+
+import contextvars
+
+from app.models import routing
+from app.models.routing import RoutedLLM
+from app.utils.context import set_request_context
+
+ROUTES = {
+    "TaskService.create_task": {"model": "task-model", "max_tokens": 512},
+    "ChatService.chat": {"model": "", "max_tokens": None},
+}
+
+
+def routed(monkeypatch, headers=None, enabled=True, allowed=(), operation="TaskService.create_task"):
+    """kwargs التي تصل للنموذج بعد التوجيه مع هيدرات الطلب"""
+    monkeypatch.setattr(routing.settings, "LLM_ROUTE_REQUEST_OVERRIDES", enabled)
+    monkeypatch.setattr(routing.settings, "LLM_ROUTE_ALLOWED_MODELS", list(allowed))
+    llm = RoutedLLM(inner=None, routes=ROUTES)
+
+    def apply():
+        set_request_context(**(headers or {}))
+        return llm._apply({"operation": operation})
+
+    return contextvars.copy_context().run(apply)
+
+
+def test_route_fills_model_and_tokens(monkeypatch):
+    kwargs, source = routed(monkeypatch)
+    assert kwargs["model"] == "task-model"
+    assert kwargs["max_tokens"] == 512
+    assert source == "route"
+
+
+def test_chat_route_has_no_token_limit(monkeypatch):
+    monkeypatch.setattr(routing.settings, "LLM_ROUTES", {})
+    llm = RoutedLLM(inner=None)
+    assert llm.resolve("ChatService.chat")["max_tokens"] is None
+
+
+def test_overrides_ignored_when_disabled(monkeypatch):
+    kwargs, source = routed(monkeypatch, {"llm_model": "task-model", "llm_max_tokens": "64"}, enabled=False)
+    assert kwargs["max_tokens"] == 512
+    assert source == "route"
+
+
+def test_unknown_model_override_is_ignored(monkeypatch):
+    kwargs, _ = routed(monkeypatch, {"llm_model": "attacker-model-123"})
+    assert kwargs["model"] == "task-model"
+
+
+def test_allowed_model_override(monkeypatch):
+    kwargs, source = routed(monkeypatch, {"llm_model": "extra-model"}, allowed=["extra-model"])
+    assert kwargs["model"] == "extra-model"
+    assert source == "request"
+
+
+def test_max_tokens_override_is_clamped_to_route(monkeypatch):
+    kwargs, _ = routed(monkeypatch, {"llm_max_tokens": "100000"})
+    assert kwargs["max_tokens"] == 512
+
+    kwargs, _ = routed(monkeypatch, {"llm_max_tokens": "64"})
+    assert kwargs["max_tokens"] == 64
+
+    # عملية بلا حد تقبل القيمة المطلوبة
+    kwargs, _ = routed(monkeypatch, {"llm_max_tokens": "2000"}, operation="ChatService.chat")
+    assert kwargs["max_tokens"] == 2000
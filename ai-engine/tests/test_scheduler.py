@@ -0,0 +1,124 @@
+"""
+اختبارات المجدول: الأولوية بين الفئات والتناوب بين المستخدمين
+"""
+
+import asyncio
+
+import pytest
+
+from app.models.scheduler import LLMScheduler
+
+
+async def run_queued(scheduler, requests):
+    """
+    يشغل الطلبات وهي كلها في الطابور (الخانة الوحيدة مشغولة)،
+    ويرجع ترتيب حصولها على الخانة
+    """
+    order = []
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("chat", "holder"):
+            await release.wait()
+
+    async def request(name, priority, tenant):
+        async with scheduler.slot(priority, tenant):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    held = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, priority, tenant in requests:
+        tasks.append(asyncio.create_task(request(name, priority, tenant)))
+        await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(held, *tasks)
+    return order
+
+
+def test_higher_priority_served_first():
+    scheduler = LLMScheduler(slots=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("analysis", "analysis", "a"),
+        ("task", "task", "a"),
+        ("chat", "chat", "a"),
+    ]))
+
+    assert order == ["chat", "task", "analysis"]
+
+
+def test_round_robin_between_tenants():
+    scheduler = LLMScheduler(slots=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("a1", "analysis", "a"),
+        ("a2", "analysis", "a"),
+        ("a3", "analysis", "a"),
+        ("b1", "analysis", "b"),
+        ("c1", "analysis", "c"),
+    ]))
+
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_unknown_priority_uses_default():
+    scheduler = LLMScheduler(slots=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("other", "bulk", "a"),
+        ("task", "task", "a"),
+    ]))
+
+    assert order == ["task", "other"]
+    assert scheduler.get_stats()["classes"]["analysis"]["served"] == 1
+
+
+def test_concurrency_limit():
+    scheduler = LLMScheduler(slots=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with scheduler.slot("chat"):
+            peak = max(peak, scheduler.running)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(6)])
+
+    asyncio.run(run())
+    assert peak == 2
+    assert scheduler.running == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    scheduler = LLMScheduler(slots=1)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("chat"):
+                await release.wait()
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+
+        async def waiter():
+            async with scheduler.slot("analysis", "a"):
+                pass
+
+        queued = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()["classes"]["analysis"]["queued"] == 1
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert scheduler.get_stats()["classes"]["analysis"]["queued"] == 0
+
+        release.set()
+        await held
+
+    asyncio.run(run())
+    assert scheduler.running == 0
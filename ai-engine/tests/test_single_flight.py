@@ -0,0 +1,115 @@
+"""
+اختبارات Single-flight: دمج الطلبات المتطابقة والإلغاء
+"""
+
+import asyncio
+
+import pytest
+
+from app.models.single_flight import SingleFlightLLM
+
+
+class FakeLLM:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    def fingerprint(self, method, first_arg, **kwargs):
+        return f"{method}:{first_arg}:{kwargs.get('temperature', 0.7)}"
+
+    async def generate(self, prompt, **hints):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if hints.get("on_context"):
+            hints["on_context"]([1, 2, 3], "model")
+        return f"reply to {prompt}"
+
+
+def test_identical_requests_collapse():
+    inner = FakeLLM()
+    llm = SingleFlightLLM(inner)
+
+    async def run():
+        return await asyncio.gather(*[llm.generate("hello") for _ in range(5)])
+
+    assert asyncio.run(run()) == ["reply to hello"] * 5
+    assert inner.calls == 1
+    stats = llm.get_stats()["single_flight"]
+    assert stats["upstream_calls"] == 1
+    assert stats["collapsed"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_different_requests_do_not_collapse():
+    inner = FakeLLM()
+    llm = SingleFlightLLM(inner)
+
+    async def run():
+        return await asyncio.gather(
+            llm.generate("hello"),
+            llm.generate("hello", temperature=0.1),
+            llm.generate("hello", conversation_id="a"),
+            llm.generate("hello", conversation_id="b"),
+        )
+
+    asyncio.run(run())
+    assert inner.calls == 4
+
+
+def test_joiners_receive_context():
+    inner = FakeLLM()
+    llm = SingleFlightLLM(inner)
+    received = []
+
+    async def run():
+        await asyncio.gather(*[
+            llm.generate("hello", on_context=lambda context, model, i=i: received.append(i))
+            for i in range(3)
+        ])
+
+    asyncio.run(run())
+    assert inner.calls == 1
+    assert sorted(received) == [0, 1, 2]
+
+
+def test_one_waiter_cancel_keeps_request():
+    inner = FakeLLM()
+    llm = SingleFlightLLM(inner)
+
+    async def run():
+        first = asyncio.create_task(llm.generate("hello"))
+        second = asyncio.create_task(llm.generate("hello"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "reply to hello"
+    assert inner.calls == 1 and inner.cancelled == 0
+
+
+def test_last_waiter_cancel_cancels_request():
+    inner = FakeLLM(delay=1)
+    llm = SingleFlightLLM(inner)
+
+    async def run():
+        waiters = [asyncio.create_task(llm.generate("hello")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        # طلب جديد بنفس البصمة لا ينضم للطلب الملغى
+        inner.delay = 0
+        return await llm.generate("hello")
+
+    assert asyncio.run(run()) == "reply to hello"
+    assert inner.cancelled == 1
+    assert inner.calls == 2
@@ -0,0 +1,48 @@
+"""
+اختبارات تنظيف الرد المتدفق
+"""
+
+import random
+
+from app.utils.security import SecurityService, StreamSanitizer
+
+RESPONSE = (
+    "مرحباً، راتب أحمد هو 1,250,000 دينار شهرياً وسعر الشراء: 45,000 للقطعة. "
+    "أما الموظف الآخر فيتقاضى 900000   IQD مع بدل نقل. " * 6
+)
+
+
+def stream(text, sizes, user_level=1):
+    security = SecurityService()
+    sanitizer = StreamSanitizer(security, user_level)
+    sent, position = [], 0
+    for size in sizes:
+        sent.append(sanitizer.feed(text[position:position + size]))
+        position += size
+    sent.append(sanitizer.feed(text[position:]))
+    sent.append(sanitizer.flush())
+    return "".join(sent), sanitizer, security
+
+
+def test_chunked_stream_matches_full_sanitize():
+    rng = random.Random(7)
+    for _ in range(50):
+        sizes = [rng.randint(1, 12) for _ in range(len(RESPONSE) // 6)]
+        sent, sanitizer, security = stream(RESPONSE, sizes)
+
+        expected = security.sanitize_response(RESPONSE, 1)
+        assert sent == expected
+        assert sanitizer.text == expected
+        assert "1,250,000" not in sent and "45,000" not in sent
+
+
+def test_allowed_level_is_unchanged():
+    sent, _, _ = stream(RESPONSE, [5] * 100, user_level=5)
+    assert sent == RESPONSE
+
+
+def test_pending_text_stays_bounded():
+    sanitizer = StreamSanitizer(SecurityService(), 1)
+    for _ in range(2000):
+        sanitizer.feed("كلمة ")
+        assert len(sanitizer._pending) <= StreamSanitizer.HOLDBACK + 5
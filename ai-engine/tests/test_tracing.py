@@ -0,0 +1,23 @@
+"""
+اختبارات تصدير الـ spans إلى ملف
+"""
+
+import os
+
+from app.utils.tracing import SpanExporter
+
+
+def test_trace_file_rotates_and_keeps_backups(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = SpanExporter(path=path, max_bytes=100, backups=2)
+
+    for i in range(10):
+        exporter._write(f'{{"line": {i}, "padding": "{"x" * 60}"}}')
+
+    assert os.path.getsize(path) < 200
+    assert os.path.exists(path + ".1")
+    assert os.path.exists(path + ".2")
+    assert not os.path.exists(path + ".3")
+    # آخر سطر في الملف الحالي
+    with open(path, encoding="utf-8") as f:
+        assert '"line": 9' in f.read()
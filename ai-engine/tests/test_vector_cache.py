@@ -0,0 +1,50 @@
+"""
+اختبارات cache الـ vectors: LRU بالبايت وطبقة القرص
+"""
+
+import numpy as np
+
+from app.models.vector_cache import DiskVectorStore, VectorCache, text_key
+
+
+def test_memory_lru_by_bytes():
+    vector_bytes = 8 * 4 + 16
+    cache = VectorCache(max_bytes=2 * vector_bytes)
+    keys = [cache.key(t) for t in ("a", "b", "c")]
+    cache.put_many(keys, np.ones((3, 8), dtype=np.float32))
+
+    oldest, *rest = cache.get_many(keys)
+    assert oldest is None
+    assert all(np.array_equal(vector, np.ones(8)) for vector in rest)
+    stats = cache.get_stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+
+def test_disk_tier_survives_new_cache(tmp_path):
+    vectors = np.arange(16, dtype=np.float32).reshape(2, 8)
+    first = VectorCache(directory=str(tmp_path), disk_slots=64, model="m")
+    keys = [first.key("x"), first.key("y")]
+    first.put_many(keys, vectors)
+    first.close()
+
+    second = VectorCache(directory=str(tmp_path), disk_slots=64, model="m")
+    second.set_dimension(8)
+    found = second.get_many(keys)
+    assert np.array_equal(found[1], vectors[1])
+    assert second.get_stats()["disk_hits"] == 2
+    assert second.get_stats()["disk"]["used_slots"] == 2
+
+
+def test_disk_used_slots_counter(tmp_path):
+    store = DiskVectorStore(str(tmp_path), dim=4, slots=16, probes=4)
+    for text in ("a", "b", "c", "a"):
+        store.put(text_key(text), np.ones(4, dtype=np.float32))
+
+    assert store.used_slots() == 3
+    assert store.used_slots() == store._scan_used()
+    store.close()
+
+    # ملف القفل يحتفظ بالعدد لعملية أخرى
+    reopened = DiskVectorStore(str(tmp_path), dim=4, slots=16, probes=4)
+    assert reopened.used_slots() == 3
+    reopened.close()
@@ -0,0 +1,125 @@
+"""
+اختبارات SemanticIndex: الإضافة والتحديث والحذف والبحث وإعادة المحاولة بعد فشل الترميز
+"""
+
+import zlib
+
+import numpy as np
+import pytest
+
+from app.models.vector_index import SemanticIndex, VectorIndex
+
+
+class FakeEmbeddings:
+    """ترميز حتمي بدون نموذج: مجموع vectors ثابتة لكل كلمة"""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.encoded = []
+        self.fail = False
+
+    def _token(self, token):
+        rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def encode_normalized(self, texts):
+        if self.fail:
+            return None
+        self.encoded.extend(texts)
+        vectors = np.stack([sum(self._token(t) for t in text.lower().split()) for text in texts])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+DOCUMENTS = [
+    {"id": 1, "text": "laptop repair service"},
+    {"id": 2, "text": "printer ink cartridge"},
+    {"id": 3, "text": "office chair delivery"},
+]
+
+
+def make_index(**params):
+    service = FakeEmbeddings()
+    return SemanticIndex("products", service, backend="flat", **params), service
+
+
+def test_upsert_and_search():
+    index, _ = make_index()
+    counts = index.upsert(DOCUMENTS)
+
+    assert counts == {"added": 3, "updated": 0, "unchanged": 0, "removed": 0}
+    assert len(index) == 3
+
+    results = index.search("printer ink", top_k=1, threshold=0.0)
+    assert results[0]["id"] == 2
+    assert results[0]["_similarity_score"] > 0.5
+
+
+def test_unchanged_documents_are_not_reencoded():
+    index, service = make_index()
+    index.upsert(DOCUMENTS)
+    service.encoded.clear()
+
+    counts = index.upsert([
+        DOCUMENTS[0],
+        {"id": 2, "text": "printer toner"},
+        {"id": 4, "text": "desk lamp"},
+    ])
+
+    assert counts == {"added": 1, "updated": 1, "unchanged": 1, "removed": 0}
+    assert service.encoded == ["printer toner", "desk lamp"]
+    assert index.search("printer toner", top_k=1, threshold=0.0)[0]["text"] == "printer toner"
+
+
+def test_delete_and_empty_text_remove_documents():
+    index, _ = make_index()
+    index.upsert(DOCUMENTS)
+
+    assert index.delete(["1"]) == 1
+    counts = index.upsert([{"id": 2, "text": ""}])
+
+    assert counts["removed"] == 1
+    assert len(index) == 1
+    assert [r["id"] for r in index.search("laptop printer office", top_k=5, threshold=-1.0)] == [3]
+
+
+def test_failed_encode_changes_nothing_and_retry_indexes():
+    index, service = make_index()
+    index.upsert(DOCUMENTS[:1])
+
+    service.fail = True
+    with pytest.raises(RuntimeError):
+        index.upsert(DOCUMENTS[1:])
+    assert len(index) == 1
+    assert set(index.documents) == {"1"}
+
+    service.fail = False
+    counts = index.upsert(DOCUMENTS[1:])
+    assert counts["added"] == 2
+    assert len(index) == 3
+    assert index.search("office chair", top_k=1, threshold=0.0)[0]["id"] == 3
+
+
+def test_save_and_load(tmp_path):
+    index, service = make_index()
+    index.path = str(tmp_path)
+    index.upsert(DOCUMENTS)
+    index.save()
+
+    loaded = SemanticIndex("products", service, path=str(tmp_path), backend="flat")
+    assert len(loaded) == 3
+    assert loaded.search("laptop repair", top_k=1, threshold=0.0)[0]["id"] == 1
+
+
+def test_vector_index_upsert_replaces_vector():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = VectorIndex(8, backend="flat")
+    index.upsert(["a", "b", "c"], vectors)
+    index.upsert(["a"], vectors[1:2])
+
+    assert len(index) == 3
+    assert np.allclose(index.get_vector("a"), vectors[1])
+    assert index.delete(["b", "missing"]) == 1
+    assert "b" not in index